@@ -0,0 +1,439 @@
+"""FileImportAdapter — 流式解析银行/券商导出的 CSV、OFX/QFX 文件"""
+
+import csv
+import hashlib
+import html
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Iterator, TextIO
+
+from .base import DataSourceAdapter
+
+_DEFAULT_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%Y.%m.%d", "%m/%d/%Y")
+_CURRENCY_CHARS = str.maketrans("", "", ",¥￥$€£  ")
+_OFX_ELEMENT = re.compile(r"<(/?)([A-Za-z0-9_.]+)>([^<]*)")
+_OFX_READ_SIZE = 64 * 1024
+_OFX_MAX_VALUE = 1024 * 1024
+_EXTERNAL_ID_MAX = 128
+_OPTIONAL_COLUMNS = ("description", "counterparty", "external_id", "balance")
+
+
+class FileImportError(ValueError):
+    def __init__(self, detail: str, line_no: int | None = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.line_no = line_no
+
+
+@dataclass
+class FileImportConfig:
+    """
+    DataSource.config 中的导入配置（均可省略）：
+
+    {
+      "format": "csv" | "ofx",           # 省略时按文件扩展名/内容判断
+      "encoding": "utf-8-sig",            # 国内银行导出常为 gbk
+      "delimiter": ",",
+      "skip_rows": 0,                     # 表头之前的说明行数
+      "has_header": true,
+      "date_format": "%Y-%m-%d",          # 省略时依次尝试常见格式
+      "columns": {                        # 列名或从 0 开始的列序号；可选字段默认取同名列
+        "date": "date", "amount": "amount",
+        "inflow": "收入", "outflow": "支出",   # 收支分两列时代替 amount
+        "description": "description", "counterparty": "counterparty",
+        "external_id": "流水号", "balance": "余额"
+      },
+      "negate": false,                    # 金额整体取反
+      "skip_invalid_rows": false          # 跳过日期无法解析的行（如合计行）
+    }
+
+    金额约定与外部交易表一致：科目余额方向上的变动（资产流入为正，负债增加为正）。
+    """
+
+    format: str | None = None
+    encoding: str = "utf-8-sig"
+    delimiter: str = ","
+    skip_rows: int = 0
+    has_header: bool = True
+    date_format: str | None = None
+    columns: dict[str, str | int] = field(default_factory=lambda: {
+        "date": "date",
+        "amount": "amount",
+    })
+    negate: bool = False
+    skip_invalid_rows: bool = False
+
+    @classmethod
+    def from_dict(cls, config: dict | None) -> "FileImportConfig":
+        config = dict(config or {})
+        known = {k: config[k] for k in cls.__dataclass_fields__ if k in config}
+        result = cls(**known)
+        result.validate()
+        return result
+
+    def validate(self) -> None:
+        if self.format not in (None, "csv", "ofx"):
+            raise FileImportError(f"不支持的文件格式: {self.format}")
+        if not isinstance(self.columns, dict) or not all(
+            isinstance(v, (str, int)) for v in self.columns.values()
+        ):
+            raise FileImportError("columns 必须是 {字段: 列名或列序号} 的映射")
+        if not isinstance(self.skip_rows, int) or self.skip_rows < 0:
+            raise FileImportError("skip_rows 必须是非负整数")
+        if not isinstance(self.delimiter, str) or len(self.delimiter) != 1:
+            raise FileImportError("delimiter 必须是单个字符")
+        if "date" not in self.columns:
+            raise FileImportError("columns 缺少 date 列")
+        if "amount" not in self.columns and not (
+            "inflow" in self.columns or "outflow" in self.columns
+        ):
+            raise FileImportError("columns 需要配置 amount，或 inflow / outflow")
+        if not self.has_header and any(
+            not isinstance(v, int) for v in self.columns.values()
+        ):
+            raise FileImportError("无表头时 columns 必须使用列序号")
+        try:
+            "".encode(self.encoding)
+        except (LookupError, TypeError):
+            raise FileImportError(f"不支持的编码: {self.encoding}")
+
+
+def parse_amount(value: str) -> Decimal | None:
+    """解析金额字符串：去掉千分位和货币符号，括号或结尾负号表示负数；空值返回 None"""
+    raw = (value or "").strip()
+    if "," in raw and "." in raw and raw.rfind(",") > raw.rfind("."):
+        # 1.234,56 这类以逗号为小数点的格式不做猜测
+        raise ValueError(f"无法解析金额: {value}")
+    text = raw.translate(_CURRENCY_CHARS)
+    if not text or text in ("-", "--"):
+        return None
+    negative = False
+    if text.startswith("(") and text.endswith(")"):
+        negative, text = True, text[1:-1]
+    elif text.endswith("-"):
+        negative, text = True, text[:-1]
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"无法解析金额: {value}")
+    return -amount if negative else amount
+
+
+def parse_date(value: str, date_format: str | None = None) -> date:
+    text = (value or "").strip()
+    if date_format:
+        return datetime.strptime(text, date_format).date()
+    token = text.replace("T", " ").split(" ", 1)[0]
+    if len(token) == 10 and token[4] == "-":
+        try:
+            return date.fromisoformat(token)
+        except ValueError:
+            pass
+    for fmt in _DEFAULT_DATE_FORMATS:
+        try:
+            return datetime.strptime(token, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析日期: {value}")
+
+
+def _row_id(position: int, *parts) -> str:
+    """文件未提供唯一标识时，用位置 + 内容摘要生成，重复上传同一文件可据此去重"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:16]
+    return f"{position}:{digest}"
+
+
+def _clip_id(value: str) -> str:
+    if len(value) <= _EXTERNAL_ID_MAX:
+        return value
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+# ─────────────────────── CSV ───────────────────────
+
+
+def _resolve_columns(header: list[str] | None, columns: dict[str, str | int]) -> dict[str, int]:
+    resolved = {}
+    lookup = {name.strip(): i for i, name in enumerate(header)} if header is not None else {}
+    for key, ref in columns.items():
+        if isinstance(ref, int):
+            resolved[key] = ref
+        elif ref in lookup:
+            resolved[key] = lookup[ref]
+        else:
+            raise FileImportError(f"CSV 缺少列: {ref}", 1)
+    # 未配置的可选字段，表头中有同名列时自动使用
+    for key in _OPTIONAL_COLUMNS:
+        if key not in columns and key in lookup:
+            resolved[key] = lookup[key]
+    return resolved
+
+
+def iter_csv_rows(stream: TextIO, config: FileImportConfig) -> Iterator[dict]:
+    """
+    逐行产出交易 dict：{date, amount, description, counterparty, external_id, balance, line_no}。
+    只持有当前行，内存占用与文件大小无关。
+    """
+    reader = csv.reader(stream, delimiter=config.delimiter)
+    for _ in range(config.skip_rows):
+        next(reader, None)
+    header = None
+    if config.has_header:
+        header = next(reader, None)
+        if header is None:
+            return
+    cols = _resolve_columns(header, config.columns)
+    width = max(cols.values()) + 1
+    sign = -1 if config.negate else 1
+
+    def cell(row, key):
+        index = cols.get(key)
+        return row[index].strip() if index is not None else ""
+
+    for row in reader:
+        line_no = reader.line_num
+        if not any(c.strip() for c in row):
+            continue
+        if len(row) < width:
+            if config.skip_invalid_rows:
+                continue
+            raise FileImportError(f"第 {line_no} 行列数不足", line_no)
+        try:
+            day = parse_date(cell(row, "date"), config.date_format)
+        except ValueError as e:
+            if config.skip_invalid_rows:
+                continue
+            raise FileImportError(f"第 {line_no} 行: {e}", line_no)
+        try:
+            if "amount" in cols:
+                amount = parse_amount(cell(row, "amount")) or Decimal("0")
+            else:
+                amount = (parse_amount(cell(row, "inflow")) or Decimal("0")) - abs(
+                    parse_amount(cell(row, "outflow")) or Decimal("0")
+                )
+            balance = parse_amount(cell(row, "balance")) if "balance" in cols else None
+        except ValueError as e:
+            raise FileImportError(f"第 {line_no} 行: {e}", line_no)
+
+        description = cell(row, "description") or None
+        counterparty = cell(row, "counterparty") or None
+        external_id = cell(row, "external_id")
+        yield {
+            "date": day,
+            "amount": amount * sign,
+            "description": description,
+            "counterparty": counterparty[:200] if counterparty else None,
+            "external_id": _clip_id(external_id) if external_id
+            else _row_id(line_no, day, amount, description, counterparty),
+            "balance": balance * sign if balance is not None else None,
+            "line_no": line_no,
+        }
+
+
+# ─────────────────────── OFX / QFX ───────────────────────
+
+
+def iter_ofx_elements(stream: TextIO) -> Iterator[tuple[bool, str, str]]:
+    """
+    按块读取 OFX（SGML 1.x 与 XML 2.x 均可），产出 (是否结束标签, 标签名, 文本值)。
+    每次只在内存中保留一个读取块和最后一个未闭合的元素。
+    """
+    buffer = ""
+    while True:
+        chunk = stream.read(_OFX_READ_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        cut = buffer.rfind("<")
+        if cut < 0:
+            # 文件头（OFXHEADER:100 ...）或 XML 声明之前的内容
+            buffer = ""
+            continue
+        complete, buffer = buffer[:cut], buffer[cut:]
+        if len(buffer) > _OFX_MAX_VALUE:
+            raise FileImportError("OFX 元素过长，文件可能已损坏")
+        for m in _OFX_ELEMENT.finditer(complete):
+            yield m.group(1) == "/", m.group(2).upper(), html.unescape(m.group(3).strip())
+    for m in _OFX_ELEMENT.finditer(buffer):
+        yield m.group(1) == "/", m.group(2).upper(), html.unescape(m.group(3).strip())
+
+
+def _ofx_date(value: str) -> date:
+    # YYYYMMDD[HHMMSS[.XXX][[-5:EST]]]
+    return datetime.strptime(value[:8], "%Y%m%d").date()
+
+
+def _ofx_transaction(fields: dict, position: int, sign: int) -> dict:
+    try:
+        day = _ofx_date(fields.get("DTPOSTED", ""))
+        amount = Decimal(fields.get("TRNAMT", "").replace(",", "."))
+    except (ValueError, InvalidOperation):
+        raise FileImportError(f"第 {position} 笔交易的日期或金额无效")
+    name = fields.get("NAME") or fields.get("PAYEE") or None
+    memo = fields.get("MEMO") or None
+    fitid = fields.get("FITID")
+    return {
+        "date": day,
+        "amount": amount * sign,
+        "description": memo or name,
+        "counterparty": name[:200] if name else None,
+        "external_id": _clip_id(fitid) if fitid else _row_id(position, day, amount, name, memo),
+        "balance": None,
+        "line_no": position,
+    }
+
+
+def iter_ofx_rows(
+    stream: TextIO, config: FileImportConfig, ledger: dict | None = None
+) -> Iterator[dict]:
+    """
+    逐笔产出 <STMTTRN> 交易。信用卡对账单（CCSTMTRS）中消费为负数，
+    按负债增加为正的约定取反。ledger 传入 dict 时写入 LEDGERBAL 的 {balance, date}。
+    """
+    base_sign = -1 if config.negate else 1
+    sign = base_sign
+    txn: dict | None = None
+    in_ledger = False
+    position = 0
+    for closing, tag, value in iter_ofx_elements(stream):
+        if tag == "CCSTMTRS" and not closing:
+            sign = -base_sign
+        elif tag == "STMTTRN":
+            if txn is not None:
+                position += 1
+                yield _ofx_transaction(txn, position, sign)
+            txn = None if closing else {}
+        elif tag == "BANKTRANLIST" and closing and txn is not None:
+            # SGML 中省略了 </STMTTRN>
+            position += 1
+            yield _ofx_transaction(txn, position, sign)
+            txn = None
+        elif tag == "LEDGERBAL":
+            in_ledger = not closing
+        elif not closing:
+            if txn is not None:
+                txn[tag] = value
+            elif in_ledger and ledger is not None and tag in ("BALAMT", "DTASOF"):
+                try:
+                    if tag == "BALAMT":
+                        ledger["balance"] = Decimal(value.replace(",", ".")) * sign
+                    else:
+                        ledger["date"] = _ofx_date(value)
+                except (ValueError, InvalidOperation):
+                    raise FileImportError(f"LEDGERBAL 的 {tag} 无效")
+    if txn is not None:
+        position += 1
+        yield _ofx_transaction(txn, position, sign)
+
+
+# ─────────────────────── 适配器 ───────────────────────
+
+
+def detect_format(source: BinaryIO, filename: str | None = None) -> str:
+    if filename:
+        suffix = filename.lower().rsplit(".", 1)[-1]
+        if suffix in ("ofx", "qfx"):
+            return "ofx"
+        if suffix in ("csv", "txt"):
+            return "csv"
+    head = source.read(512)
+    source.seek(0)
+    text = head.lstrip(b"\xef\xbb\xbf").lstrip().upper()
+    if text.startswith(b"OFXHEADER") or b"<OFX>" in text or b"<?OFX" in text:
+        return "ofx"
+    return "csv"
+
+
+class FileImportAdapter(DataSourceAdapter):
+    """
+    文件导入适配器（csv_import 数据源）。
+    source 为可 seek 的二进制文件对象（如上传文件的临时文件），每次遍历从头流式读取，
+    不会把整个文件读入内存。
+    """
+
+    def __init__(
+        self,
+        source: BinaryIO,
+        config: dict | None = None,
+        filename: str | None = None,
+    ):
+        self._source = source
+        self.config = FileImportConfig.from_dict(config)
+        self.format = self.config.format or detect_format(source, filename)
+        self.ledger: dict = {}
+
+    def _open_text(self) -> TextIO:
+        self._source.seek(0)
+        return io.TextIOWrapper(
+            self._source,
+            encoding=self.config.encoding,
+            errors="strict" if self.format == "csv" else "replace",
+            newline="",
+        )
+
+    def iter_transactions(self) -> Iterator[dict]:
+        """逐笔产出交易，格式同 fetch_transactions，另含 external_id / balance / line_no"""
+        text = self._open_text()
+        try:
+            if self.format == "ofx":
+                self.ledger = {}
+                yield from iter_ofx_rows(text, self.config, self.ledger)
+            else:
+                yield from iter_csv_rows(text, self.config)
+        except UnicodeDecodeError:
+            raise FileImportError(
+                f"文件不是 {self.config.encoding} 编码，请在数据源配置中设置 encoding（如 gbk）"
+            )
+        except csv.Error as e:
+            raise FileImportError(f"CSV 格式错误: {e}")
+        finally:
+            # 不随包装对象关闭底层文件
+            text.detach()
+
+    def iter_chunks(self, size: int) -> Iterator[list[dict]]:
+        chunk = []
+        for txn in self.iter_transactions():
+            chunk.append(txn)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def fetch_balance(self, account_id: str, as_of_date: date) -> Decimal:
+        """OFX 取 LEDGERBAL；CSV 取余额列中日期不晚于 as_of_date 的最后一行"""
+        found: tuple[date, Decimal] | None = None
+        for txn in self.iter_transactions():
+            if txn["balance"] is not None and txn["date"] <= as_of_date:
+                if found is None or txn["date"] >= found[0]:
+                    found = (txn["date"], txn["balance"])
+        if self.format == "ofx" and "balance" in self.ledger:
+            return self.ledger["balance"]
+        if found is None:
+            raise FileImportError("文件中没有可用的余额信息")
+        return found[1]
+
+    async def fetch_transactions(
+        self, account_id: str, start_date: date, end_date: date
+    ) -> list[dict]:
+        return [
+            {
+                "date": txn["date"],
+                "amount": txn["amount"],
+                "description": txn["description"],
+                "counterparty": txn["counterparty"],
+            }
+            for txn in self.iter_transactions()
+            if start_date <= txn["date"] <= end_date
+        ]
+
+    async def validate_connection(self) -> bool:
+        """能读出首笔交易（或空文件）即视为有效"""
+        try:
+            next(self.iter_transactions(), None)
+        except FileImportError:
+            return False
+        return True
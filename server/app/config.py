@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -17,11 +18,37 @@ class Settings(BaseSettings):
         self.DATABASE_DIR.mkdir(parents=True, exist_ok=True)
         return f"sqlite+aiosqlite:///{self.DATABASE_DIR / self.DATABASE_NAME}"
 
+    # SQLite 存储配置：default 保持 SQLite 默认行为；production 启用 WAL 等调优，
+    # 并为报表等只读端点单独开只读连接池，读写互不阻塞。
+    # WAL 有额外的 CPU 开销，单核部署时读吞吐略低（见 app/tasks/bench_storage.py）
+    DATABASE_PROFILE: Literal["default", "production"] = "default"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+
     # JWT
     JWT_SECRET_KEY: str = "dev-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 天
 
+    # 报表缓存（进程内 LRU，按账本账务版本号失效）
+    REPORT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # 已验证 API Key 缓存（进程内）与 last_used_at 合并写回间隔
+    API_KEY_CACHE_SIZE: int = 4096
+    API_KEY_CACHE_TTL_SECONDS: float = 60.0
+    API_KEY_LAST_USED_FLUSH_SECONDS: float = 30.0
+
+    # 鉴权缓存：用户投影与账本成员角色（进程内，成员/用户变更提交后失效）
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 30.0
+
+    # 内置定时任务调度器（随应用启动；多 worker 部署时由 scheduled_jobs 表上的锁保证单执行）
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_POLL_SECONDS: float = 30.0
+    SCHEDULER_LEASE_SECONDS: int = 30 * 60
+    SCHEDULER_JITTER_SECONDS: int = 60
+
     # CORS
     CORS_ORIGINS: list[str] = ["http://localhost:8081", "http://localhost:19006", "http://localhost:3000"]
 
@@ -1,15 +1,79 @@
 """数据库初始化 - SQLite + async SQLAlchemy"""
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+
+def sqlite_pragmas(profile: str) -> list[tuple[str, object]]:
+    """存储配置对应的连接级 PRAGMA，按顺序在每个新连接上执行"""
+    if profile == "default":
+        return []
+    if profile == "production":
+        return [
+            # WAL：读者读快照，不再被写事务的排他锁阻塞
+            ("journal_mode", "WAL"),
+            # WAL 下 NORMAL 仍保证一致性，仅掉电时可能丢最后几个事务
+            ("synchronous", "NORMAL"),
+            ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+            ("mmap_size", settings.SQLITE_MMAP_SIZE),
+            # 负数表示以 KiB 为单位
+            ("cache_size", -settings.SQLITE_CACHE_SIZE_KB),
+            ("temp_store", "MEMORY"),
+        ]
+    raise ValueError(f"未知的数据库存储配置: {profile}")
+
+
+def install_pragmas(
+    engine: AsyncEngine, pragmas: list[tuple[str, object]], read_only: bool = False
+) -> None:
+    """注册 connect 事件，新建连接时执行 PRAGMA；read_only 时连接拒绝一切写入"""
+    if read_only:
+        pragmas = pragmas + [("query_only", "ON")]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_engines(url: str, profile: str) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    创建 (读写引擎, 只读引擎)。
+    default 配置下两者为同一引擎；production 配置下只读引擎独立连接池，
+    配合 WAL 使报表查询与记账写入互不等待。
+    """
+    pragmas = sqlite_pragmas(profile)
+    engine = create_async_engine(url, echo=False)
+    install_pragmas(engine, pragmas)
+    if profile == "default":
+        return engine, engine
+    read_engine = create_async_engine(url, echo=False)
+    install_pragmas(read_engine, pragmas, read_only=True)
+    return engine, read_engine
+
+
+engine, read_engine = create_engines(settings.DATABASE_URL, settings.DATABASE_PROFILE)
 
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
 class Base(DeclarativeBase):
@@ -26,6 +90,17 @@ async def get_db():
             raise
 
 
+async def get_read_db():
+    """只读会话依赖：报表等纯查询端点使用，不提交"""
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """会话工厂依赖：供需要在请求内自行管理多个事务的场景（如流式导入分块提交）"""
+    return AsyncSessionLocal
+
+
 async def init_db():
     """创建所有表，并对已有表进行增量迁移"""
     async with engine.begin() as conn:
@@ -34,6 +109,18 @@ async def init_db():
         await _migrate_budgets(conn)
         # v0.2.0: journal_entries 表新增 external_id 字段
         await _migrate_journal_external_id(conn)
+        # v0.3.0: 科目日发生额汇总表首次回填
+        await _migrate_account_daily_balances(conn)
+        # v0.3.0: 预算使用额计数器首次回填
+        await _migrate_budget_spend_counters(conn)
+        # v0.3.0: 折旧台账从历史折旧分录摘要回填
+        await _migrate_depreciation_records(conn)
+        # v0.3.0: 待处理队列按调节分录连接快照
+        await _migrate_snapshot_entry_index(conn)
+        # v0.3.0: 外部交易匹配按科目+日期、数据源+状态查询
+        await _migrate_external_transaction_indexes(conn)
+        # v0.3.0: 外部交易匹配的候选分录按账本+日期窗口检索
+        await _migrate_journal_candidate_index(conn)
 
 
 async def _migrate_budgets(conn):
@@ -72,3 +159,154 @@ async def _migrate_journal_external_id(conn):
             "ON journal_entries(book_id, external_id) "
             "WHERE external_id IS NOT NULL"
         ))
+
+
+async def _migrate_snapshot_entry_index(conn):
+    """为已有 balance_snapshots 表补建 reconciliation_entry_id 索引"""
+    from sqlalchemy import text
+
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_balance_snapshots_reconciliation_entry_id "
+        "ON balance_snapshots(reconciliation_entry_id)"
+    ))
+
+
+async def _migrate_external_transaction_indexes(conn):
+    """为已有 external_transactions 表补建匹配引擎使用的索引和 v0.3.0 新增的 external_id、matched_line_id 列"""
+    from sqlalchemy import text
+
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_external_transactions_account_date "
+        "ON external_transactions(account_id, transaction_date)"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_external_transactions_source_status "
+        "ON external_transactions(data_source_id, match_status)"
+    ))
+
+    result = await conn.execute(text("PRAGMA table_info(external_transactions)"))
+    columns = {row[1] for row in result.fetchall()}
+    if "external_id" not in columns:
+        await conn.execute(
+            text("ALTER TABLE external_transactions ADD COLUMN external_id VARCHAR(128)")
+        )
+    if "matched_line_id" not in columns:
+        await conn.execute(
+            text("ALTER TABLE external_transactions ADD COLUMN matched_line_id VARCHAR(36)")
+        )
+        # 已有配对回填为该分录在数据源科目上的分录行
+        await conn.execute(text(
+            "UPDATE external_transactions SET matched_line_id = ("
+            "  SELECT jl.id FROM journal_lines jl"
+            "  WHERE jl.entry_id = external_transactions.matched_entry_id"
+            "    AND jl.account_id = external_transactions.account_id"
+            "  ORDER BY jl.id LIMIT 1"
+            ") WHERE matched_entry_id IS NOT NULL"
+        ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_external_transactions_matched_line_id "
+        "ON external_transactions(matched_line_id)"
+    ))
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_external_transactions_source_external "
+        "ON external_transactions(data_source_id, external_id) "
+        "WHERE external_id IS NOT NULL"
+    ))
+
+
+async def _migrate_journal_candidate_index(conn):
+    """为已有 journal_entries 表补建匹配候选检索使用的覆盖索引"""
+    from sqlalchemy import text
+
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_journal_entries_book_date_type "
+        "ON journal_entries(book_id, entry_date, entry_type, id)"
+    ))
+
+
+async def _migrate_account_daily_balances(conn):
+    """account_daily_balances 为空而已有分录时，从 journal_lines 回填一次"""
+    from sqlalchemy import text
+
+    result = await conn.execute(text("SELECT 1 FROM account_daily_balances LIMIT 1"))
+    if result.first() is not None:
+        return
+    result = await conn.execute(text("SELECT 1 FROM journal_lines LIMIT 1"))
+    if result.first() is None:
+        return
+
+    await conn.execute(text(
+        "INSERT INTO account_daily_balances "
+        "(book_id, account_id, balance_date, debit_total, credit_total) "
+        "SELECT e.book_id, l.account_id, e.entry_date, "
+        "ROUND(COALESCE(SUM(l.debit_amount), 0), 2), "
+        "ROUND(COALESCE(SUM(l.credit_amount), 0), 2) "
+        "FROM journal_lines l JOIN journal_entries e ON e.id = l.entry_id "
+        "GROUP BY e.book_id, l.account_id, e.entry_date"
+    ))
+
+
+async def _migrate_budget_spend_counters(conn):
+    """budget_spend_counters 为空而已有分录时，从 journal_lines 回填一次"""
+    from sqlalchemy import text
+
+    result = await conn.execute(text("SELECT 1 FROM budget_spend_counters LIMIT 1"))
+    if result.first() is not None:
+        return
+    result = await conn.execute(text("SELECT 1 FROM journal_lines LIMIT 1"))
+    if result.first() is None:
+        return
+
+    await conn.execute(text(
+        "INSERT INTO budget_spend_counters (book_id, period, account_id, spent) "
+        "SELECT e.book_id, strftime('%Y-%m', e.entry_date), l.account_id, "
+        "ROUND(COALESCE(SUM(l.debit_amount), 0), 2) "
+        "FROM journal_lines l JOIN journal_entries e ON e.id = l.entry_id "
+        "GROUP BY e.book_id, strftime('%Y-%m', e.entry_date), l.account_id "
+        "HAVING ROUND(COALESCE(SUM(l.debit_amount), 0), 2) != 0"
+    ))
+
+
+async def _migrate_depreciation_records(conn):
+    """
+    depreciation_records 为空而已有折旧分录时，从分录摘要回填一次。
+    旧版摘要格式：「折旧 - {资产名} [{asset_id}] {period_label}」。
+    """
+    import re
+    import uuid
+    from sqlalchemy import text
+
+    result = await conn.execute(text("SELECT 1 FROM depreciation_records LIMIT 1"))
+    if result.first() is not None:
+        return
+
+    result = await conn.execute(text(
+        "SELECT e.id, e.book_id, e.entry_date, e.description, "
+        "COALESCE(SUM(l.debit_amount), 0) "
+        "FROM journal_entries e LEFT JOIN journal_lines l ON l.entry_id = e.id "
+        "WHERE e.entry_type = 'depreciation' "
+        "GROUP BY e.id ORDER BY e.entry_date, e.created_at"
+    ))
+    pattern = re.compile(r"\[([0-9a-fA-F-]{36})\]\s+(\S+)\s*$")
+    rows = []
+    for entry_id, book_id, entry_date, description, amount in result.fetchall():
+        match = pattern.search(description or "")
+        if not match:
+            continue
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "book_id": book_id,
+            "asset_id": match.group(1),
+            "period_label": match.group(2),
+            "entry_id": entry_id,
+            "entry_date": entry_date,
+            "amount": amount,
+        })
+    if rows:
+        # 历史数据中同一资产同一期若有重复分录，只保留最早一条
+        await conn.execute(text(
+            "INSERT OR IGNORE INTO depreciation_records "
+            "(id, book_id, asset_id, period_label, entry_id, entry_date, amount, created_at) "
+            "VALUES (:id, :book_id, :asset_id, :period_label, :entry_id, :entry_date, :amount, "
+            "CURRENT_TIMESTAMP)"
+        ), rows)
@@ -5,18 +5,36 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.config import settings
-from app.database import init_db
+from app.database import AsyncSessionLocal, init_db
+from app.services import auth_cache
+from app.services.api_key_cache import api_key_cache
+from app.services.report_cache import report_cache
+from app.services.scheduler import JobScheduler
+from app.tasks.jobs import register_default_jobs
 from app.routers import auth, books, accounts, entries, reports, sync, assets, loans, budgets, api_keys, plugins
 
 # 导入所有 model 使 SQLAlchemy 注册表结构
 import app.models  # noqa: F401
 
 
+scheduler = JobScheduler(
+    AsyncSessionLocal,
+    poll_seconds=settings.SCHEDULER_POLL_SECONDS,
+    lease_seconds=settings.SCHEDULER_LEASE_SECONDS,
+    jitter_seconds=settings.SCHEDULER_JITTER_SECONDS,
+)
+register_default_jobs(scheduler)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期：启动时建表"""
+    """应用生命周期：启动时建表并启动定时任务调度器"""
     await init_db()
+    if settings.SCHEDULER_ENABLED:
+        await scheduler.start()
     yield
+    await scheduler.stop()
+    await api_key_cache.close(AsyncSessionLocal)
 
 
 app = FastAPI(
@@ -68,4 +86,8 @@ async def health_check():
         "status": "ok",
         "app": settings.APP_NAME,
         "version": settings.APP_VERSION,
+        "report_cache": report_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "api_key_cache": api_key_cache.stats(),
+        "auth_cache": auth_cache.stats(),
     }
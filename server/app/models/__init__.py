@@ -2,12 +2,14 @@ from app.models.user import User
 from app.models.book import Book, BookMember
 from app.models.account import Account
 from app.models.journal import JournalEntry, JournalLine
-from app.models.asset import FixedAsset
+from app.models.balance import AccountDailyBalance, BudgetSpendCounter, LedgerVersion
+from app.models.asset import FixedAsset, DepreciationRecord
 from app.models.loan import Loan
 from app.models.budget import Budget
 from app.models.sync import DataSource, BalanceSnapshot, ExternalTransaction
 from app.models.api_key import ApiKey
 from app.models.plugin import Plugin
+from app.models.job import ScheduledJob
 
 __all__ = [
     "User",
@@ -16,7 +18,10 @@ __all__ = [
     "Account",
     "JournalEntry",
     "JournalLine",
+    "AccountDailyBalance",
+    "BudgetSpendCounter",
     "FixedAsset",
+    "DepreciationRecord",
     "Loan",
     "Budget",
     "DataSource",
@@ -24,4 +29,5 @@ __all__ = [
     "ExternalTransaction",
     "ApiKey",
     "Plugin",
+    "ScheduledJob",
 ]
@@ -1,7 +1,10 @@
 import uuid
 from datetime import datetime, date
 
-from sqlalchemy import String, DateTime, Date, ForeignKey, Numeric, Integer, Enum as SAEnum
+from sqlalchemy import (
+    String, DateTime, Date, ForeignKey, Numeric, Integer, Enum as SAEnum,
+    Index, UniqueConstraint,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -43,3 +46,34 @@ class FixedAsset(Base):
     # 关联
     book = relationship("Book")
     account = relationship("Account")
+    # 删除资产时一并删除折旧台账（折旧分录作为账务历史保留）
+    depreciation_records = relationship(
+        "DepreciationRecord", cascade="all, delete-orphan", lazy="raise_on_sql"
+    )
+
+
+class DepreciationRecord(Base):
+    """折旧台账：每项资产每期一条，关联生成的折旧分录（防重复计提 + 折旧历史）"""
+
+    __tablename__ = "depreciation_records"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "period_label", name="uq_depreciation_records_asset_period"),
+        Index("ix_depreciation_records_entry", "entry_id"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    book_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("books.id"), nullable=False
+    )
+    asset_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("fixed_assets.id"), nullable=False
+    )
+    period_label: Mapped[str] = mapped_column(String(20), nullable=False)
+    entry_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("journal_entries.id"), nullable=False
+    )
+    entry_date: Mapped[date] = mapped_column(Date, nullable=False)
+    amount: Mapped[float] = mapped_column(Numeric(15, 2), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,51 @@
+from datetime import date
+
+from sqlalchemy import String, Date, ForeignKey, Numeric, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class AccountDailyBalance(Base):
+    """科目日发生额汇总表（由 journal_lines 物化，随记账事务同步维护）"""
+
+    __tablename__ = "account_daily_balances"
+    __table_args__ = (
+        Index("ix_account_daily_balances_book_date", "book_id", "balance_date"),
+    )
+
+    book_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("books.id"), primary_key=True
+    )
+    account_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("accounts.id"), primary_key=True
+    )
+    balance_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    debit_total: Mapped[float] = mapped_column(Numeric(15, 2), default=0)
+    credit_total: Mapped[float] = mapped_column(Numeric(15, 2), default=0)
+
+
+class BudgetSpendCounter(Base):
+    """科目月度借方发生额计数器（预算使用额来源，随记账事务同步增减）"""
+
+    __tablename__ = "budget_spend_counters"
+
+    book_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("books.id"), primary_key=True
+    )
+    # 期间在前，按月读取整本账的计数器走主键前缀
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)  # YYYY-MM
+    account_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("accounts.id"), primary_key=True
+    )
+    spent: Mapped[float] = mapped_column(Numeric(15, 2), default=0)
+
+
+class LedgerVersion(Base):
+    """账本账务版本号（报表缓存 / ETag / 分录计数缓存的失效依据），随记账事务同步递增"""
+
+    __tablename__ = "ledger_versions"
+
+    # 账本 ID；"*" 为全部账本共用的版本（全量重建时递增）
+    book_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -16,6 +16,11 @@ class JournalEntry(Base):
         Index("ix_journal_entries_book_date", "book_id", "entry_date"),
         Index("ix_journal_entries_book_type", "book_id", "entry_type"),
         Index("ix_journal_entries_book_reconciliation", "book_id", "reconciliation_status"),
+        # 外部交易匹配的候选检索：按账本+日期窗口取分录，类型过滤和连接分录行只读索引
+        Index(
+            "ix_journal_entries_book_date_type",
+            "book_id", "entry_date", "entry_type", "id",
+        ),
     )
 
     id: Mapped[str] = mapped_column(
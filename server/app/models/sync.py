@@ -3,7 +3,7 @@ from datetime import datetime, date
 
 from sqlalchemy import (
     String, DateTime, Date, ForeignKey, Numeric, JSON,
-    Enum as SAEnum, Text,
+    Enum as SAEnum, Text, Index, text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -69,7 +69,7 @@ class BalanceSnapshot(Base):
         default="pending",
     )
     reconciliation_entry_id: Mapped[str | None] = mapped_column(
-        String(36), ForeignKey("journal_entries.id")
+        String(36), ForeignKey("journal_entries.id"), index=True
     )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -81,6 +81,16 @@ class BalanceSnapshot(Base):
 
 class ExternalTransaction(Base):
     __tablename__ = "external_transactions"
+    __table_args__ = (
+        Index("ix_external_transactions_account_date", "account_id", "transaction_date"),
+        Index("ix_external_transactions_source_status", "data_source_id", "match_status"),
+        Index(
+            "ix_external_transactions_source_external",
+            "data_source_id", "external_id",
+            unique=True,
+            sqlite_where=text("external_id IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -95,9 +105,16 @@ class ExternalTransaction(Base):
     amount: Mapped[float] = mapped_column(Numeric(15, 2), nullable=False)
     description: Mapped[str | None] = mapped_column(Text)
     counterparty: Mapped[str | None] = mapped_column(String(200))
+    external_id: Mapped[str | None] = mapped_column(
+        String(128), nullable=True, comment="文件流水号等外部唯一标识，重复导入时去重"
+    )
     matched_entry_id: Mapped[str | None] = mapped_column(
         String(36), ForeignKey("journal_entries.id")
     )
+    # 实际配对的分录行：同一分录在本科目之外的行（转账另一端、拆分行）仍可参与匹配
+    matched_line_id: Mapped[str | None] = mapped_column(
+        String(36), ForeignKey("journal_lines.id"), index=True
+    )
     match_status: Mapped[str] = mapped_column(
         SAEnum("unmatched", "matched", "reconciled", name="match_status"),
         default="unmatched",
@@ -1,5 +1,7 @@
 """固定资产 API 路由"""
 
+from datetime import date, timedelta
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,6 +17,7 @@ from app.schemas.asset import (
     AssetResponse,
     AssetDispose,
     AssetSummary,
+    DepreciationCatchUpResult,
     DepreciationRecord,
 )
 from app.services.depreciation_service import (
@@ -22,6 +25,7 @@ from app.services.depreciation_service import (
     can_depreciate,
     get_max_depreciation,
     depreciate_one_period,
+    depreciate_catch_up,
     dispose_asset,
     get_asset_with_account,
     get_depreciation_history,
@@ -270,6 +274,33 @@ async def depreciate_asset(
     }
 
 
+@router.post(
+    "/books/{book_id}/assets/depreciation/catch-up",
+    response_model=DepreciationCatchUpResult,
+    summary="补提缺失期间的折旧",
+)
+async def catch_up_depreciation(
+    book_id: str,
+    through: date | None = Query(None, description="补提截止日期，默认昨天"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """从购置日起补提截至 through 的所有未计提期间，已计提的期间自动跳过"""
+    await _check_book(current_user.id, book_id, db)
+    through = through or date.today() - timedelta(days=1)
+
+    result = await depreciate_catch_up(db, through, current_user.id, [book_id])
+    if book_id in result.failed_books:
+        raise HTTPException(status_code=400, detail=result.failed_books[book_id])
+    return DepreciationCatchUpResult(
+        through=result.through,
+        created=result.created,
+        assets=result.assets,
+        total_amount=round(result.total_amount, 2),
+        skipped_assets=result.skipped_assets,
+    )
+
+
 @router.post(
     "/assets/{asset_id}/dispose",
     summary="处置资产",
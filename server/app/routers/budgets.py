@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -12,13 +12,17 @@ from app.schemas.budget import (
     BudgetResponse,
     BudgetOverview,
     BudgetCheckResult,
+    BudgetHistoryResponse,
 )
 from app.services.budget_service import (
+    get_budget_history,
     get_budget_with_usage,
+    get_month_spend,
     get_overview,
     check_budget_after_expense,
 )
 from app.services.book_service import user_has_book_access
+from app.utils.api_key_auth import get_current_user_flexible
 from app.utils.deps import get_current_user
 
 router = APIRouter(tags=["预算"])
@@ -45,7 +49,8 @@ async def list_budgets(
         .order_by(Budget.created_at)
     )
     budgets = list(result.scalars().all())
-    return [await get_budget_with_usage(db, b) for b in budgets]
+    spend = await get_month_spend(db, book_id)
+    return [await get_budget_with_usage(db, b, spend) for b in budgets]
 
 
 # ───── 预算详情 ─────
@@ -174,6 +179,20 @@ async def budget_overview(
     return await get_overview(db, book_id)
 
 
+# ───── 预算执行历史 ─────
+
+@router.get("/books/{book_id}/budgets/history", response_model=BudgetHistoryResponse)
+async def budget_history(
+    book_id: str,
+    months: int = Query(12, ge=1, le=60, description="最近几个月（含当月）"),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user_flexible),
+):
+    """各预算最近 N 个月的实际支出、差额与使用率矩阵"""
+    await _check_book(user.id, book_id, db)
+    return await get_budget_history(db, book_id, months)
+
+
 # ───── 预算检查（记账后调用） ─────
 
 @router.post("/books/{book_id}/budgets/check", response_model=BudgetCheckResult)
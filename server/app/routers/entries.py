@@ -220,15 +220,23 @@ async def list_entries(
     start_date: date | None = None,
     end_date: date | None = None,
     account_id: str | None = None,
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor，传入后忽略 page"),
+    include_total: bool | None = Query(None, description="是否返回总数，默认页码分页返回、游标分页不返回"),
     current_user: User = Depends(get_current_user_flexible),
     db: AsyncSession = Depends(get_db),
 ):
-    """分录列表（分页，支持按日期/类型/科目筛选）"""
+    """分录列表（页码或游标分页，支持按日期/类型/科目筛选）"""
     await _check_book(current_user.id, book_id, db)
 
-    entries, total = await get_entries_paginated(
-        db, book_id, page, page_size, entry_type, start_date, end_date, account_id,
-    )
+    if include_total is None:
+        include_total = not cursor
+    try:
+        entries, total, next_cursor = await get_entries_paginated(
+            db, book_id, page, page_size, entry_type, start_date, end_date, account_id,
+            cursor=cursor, with_total=include_total,
+        )
+    except EntryError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     items = []
     for e in entries:
         resp = EntryResponse.model_validate(e)
@@ -239,6 +247,7 @@ async def list_entries(
         total=total,
         page=page,
         page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
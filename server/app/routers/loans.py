@@ -5,16 +5,18 @@ from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User
 from app.models.loan import Loan
 from app.schemas.loan import (
     LoanCreate, LoanUpdate, LoanResponse, LoanSummary,
     RepaymentScheduleItem, LoanRepayRequest, LoanPrepayRequest,
+    LoanSimulateRequest, LoanSimulateResponse,
 )
 from app.services.loan_service import (
     create_loan, get_loan_with_account, generate_schedule,
-    calc_total_interest, record_repayment, record_prepayment, LoanError,
+    calc_total_interest, calc_paid_interest, record_repayment, record_prepayment,
+    simulate_prepayments, LoanError,
 )
 from app.services.book_service import user_has_book_access
 from app.utils.deps import get_current_user
@@ -219,6 +221,25 @@ async def prepay_loan(
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
+@router.post("/loans/{loan_id}/simulate", response_model=LoanSimulateResponse)
+async def simulate_loan(
+    loan_id: str,
+    body: LoanSimulateRequest,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """提前还款方案模拟：一次请求比较多个方案，不产生任何记账"""
+    loan = await get_loan_with_account(db, loan_id)
+    if not loan:
+        raise HTTPException(status_code=404, detail="贷款不存在")
+    await _check_book(user.id, loan.book_id, db)
+
+    try:
+        return simulate_prepayments(loan, body.scenarios, body.include_schedule)
+    except LoanError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
 # ───── 汇总 ─────
 
 
@@ -240,17 +261,8 @@ async def get_loan_summary(
     total_paid_principal = total_principal - total_remaining
     active_count = sum(1 for l in loans if l.status == "active")
 
-    # 已付利息 = 已还期数中的利息累计
-    total_interest_paid = 0.0
-    for l in loans:
-        schedule = generate_schedule(
-            float(l.principal), float(l.annual_rate),
-            l.total_months, l.repayment_method, l.start_date,
-            l.repaid_months,
-        )
-        total_interest_paid += sum(
-            item["interest"] for item in schedule if item["is_paid"]
-        )
+    # 已付利息 = 已还期数中的利息累计（摊还表的累计利息列，每笔贷款 O(1)）
+    total_interest_paid = sum(calc_paid_interest(l) for l in loans)
 
     return LoanSummary(
         total_principal=round(total_principal, 2),
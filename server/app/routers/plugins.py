@@ -1,14 +1,19 @@
+import logging
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.database import get_db
+from app.database import get_db, get_session_factory
 from app.models.api_key import ApiKey
 from app.models.user import User
 from app.schemas.plugin import (
+    BatchEntryItem,
     BatchEntryRequest,
     BatchEntryResponse,
+    BatchStreamErrorLine,
+    BatchStreamSummaryLine,
     PluginCreateRequest,
     PluginResponse,
     PluginStatusUpdateRequest,
@@ -17,6 +22,9 @@ from app.services import plugin_service
 from app.services import batch_entry_service
 from app.utils.api_key_auth import get_api_user, get_current_user_flexible
 from app.utils.deps import get_current_user
+from app.utils.ndjson import NDJSONError, NDJSONStreamingResponse, dump_line, iter_ndjson_lines
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/plugins", tags=["Plugins"])
 
@@ -105,3 +113,107 @@ async def batch_entries(
     plugin.updated_at = datetime.utcnow()
 
     return result
+
+
+@router.post(
+    "/{plugin_id}/entries/batch/stream",
+    response_class=NDJSONStreamingResponse,
+    summary="流式批量记账（NDJSON）",
+)
+async def batch_entries_stream(
+    plugin_id: str,
+    request: Request,
+    book_id: str = Query(..., description="目标账本 ID"),
+    chunk_size: int = Query(default=200, ge=1, le=1000, description="每个分块的条数，每块单独提交"),
+    auth: tuple[User, ApiKey] = Depends(get_api_user),
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+):
+    """流式批量创建分录。需要 API Key 认证。
+
+    请求体为逐行的 BatchEntryItem JSON（NDJSON），边解析边按 chunk_size 分块写入，
+    每块单独提交；响应逐条返回 BatchEntryResultItem，最后一行为汇总（status=done）
+    或错误（status=error）。出错时此前已提交的分块保留，
+    重新提交整个文件即可续传（已导入的 external_id 会被跳过）。
+    """
+    user, _ = auth
+    await plugin_service.get_plugin(db, plugin_id, user.id)
+    await batch_entry_service.validate_book_access(db, book_id, user)
+
+    async def write_chunk(chunk: list[BatchEntryItem], start_index: int) -> BatchEntryResponse:
+        async with session_factory() as chunk_db:
+            try:
+                result = await batch_entry_service.batch_create_entries(
+                    chunk_db, user, book_id, chunk, start_index
+                )
+                await chunk_db.commit()
+            except Exception:
+                await chunk_db.rollback()
+                raise
+        return result
+
+    async def record_status(status: str, error_message: str | None = None) -> None:
+        async with session_factory() as status_db:
+            await plugin_service.update_plugin_status(
+                status_db, plugin_id, user.id,
+                PluginStatusUpdateRequest(status=status, error_message=error_message),
+            )
+            await status_db.commit()
+
+    async def stream():
+        total = created = skipped = chunks = 0
+        pending: list[BatchEntryItem] = []
+        error: BatchStreamErrorLine | None = None
+
+        async def flush():
+            nonlocal created, skipped, chunks, pending
+            result = await write_chunk(pending, total - len(pending))
+            pending = []
+            chunks += 1
+            created += result.created
+            skipped += result.skipped
+            for item in result.results:
+                yield dump_line(item)
+
+        def _error(detail: str, index: int | None = None) -> BatchStreamErrorLine:
+            return BatchStreamErrorLine(
+                index=index, detail=detail, created=created, skipped=skipped
+            )
+
+        try:
+            async for _, line in iter_ndjson_lines(request.stream()):
+                try:
+                    pending.append(BatchEntryItem.model_validate_json(line))
+                except ValidationError as e:
+                    first = e.errors()[0]
+                    field = ".".join(str(p) for p in first["loc"]) or "body"
+                    error = _error(f"第 {total + 1} 条记录格式错误: {field} {first['msg']}", total)
+                    break
+                total += 1
+                if len(pending) >= chunk_size:
+                    async for out in flush():
+                        yield out
+
+            if error is None and pending:
+                async for out in flush():
+                    yield out
+        except NDJSONError as e:
+            error = _error(e.detail)
+        except HTTPException as e:
+            error = _error(str(e.detail))
+        except Exception as e:
+            # 数据库错误等（如并发导入同一文件触发 external_id 唯一约束）：仍以错误行结束响应
+            logger.exception(f"[流式批量记账] 插件 {plugin_id} 写入失败")
+            error = _error(f"分录写入失败: {e.__class__.__name__}（已提交的分块保留，重新提交可续传）")
+
+        if error is not None:
+            await record_status("failed", error.detail)
+            yield dump_line(error)
+            return
+
+        await record_status("success")
+        yield dump_line(BatchStreamSummaryLine(
+            total=total, created=created, skipped=skipped, chunks=chunks
+        ))
+
+    return NDJSONStreamingResponse(stream())
@@ -1,9 +1,11 @@
 from datetime import date
+from typing import Awaitable, Callable
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_read_db
 from app.models.user import User
 from app.schemas.report import (
     BalanceSheetResponse,
@@ -13,7 +15,10 @@ from app.schemas.report import (
     BreakdownItem,
 )
 from app.services.book_service import user_has_book_access
+from app.services.ledger_service import get_ledger_version
+from app.services.report_cache import report_cache, make_etag, etag_matches
 from app.services.report_service import (
+    ReportError,
     get_balance_sheet,
     get_income_statement,
     get_dashboard,
@@ -32,22 +37,61 @@ async def _check_book(user_id: str, book_id: str, db: AsyncSession):
         raise HTTPException(status_code=403, detail="无权访问该账本")
 
 
+async def _cached_report(
+    request: Request,
+    db: AsyncSession,
+    book_id: str,
+    kind: str,
+    params: tuple,
+    response_type,
+    compute: Callable[[], Awaitable],
+) -> Response:
+    """
+    报表缓存：按 (book_id, kind, params + 今天) 缓存序列化结果，账务版本号变化即失效。
+    If-None-Match 命中当前 ETag 时直接返回 304，不生成报表。
+    """
+    version = await get_ledger_version(db, book_id)
+    # 默认日期依赖「今天」，跨日自动换键
+    key = (book_id, kind, params + (date.today().isoformat(),))
+    etag = make_etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        report_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    body = report_cache.get(key, version)
+    if body is None:
+        result = await compute()
+        body = TypeAdapter(response_type).dump_json(result)
+        report_cache.put(key, version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get(
     "/books/{book_id}/balance-sheet",
     response_model=BalanceSheetResponse,
     summary="资产负债表",
 )
 async def balance_sheet(
+    request: Request,
     book_id: str,
     as_of_date: date = Query(default=None, alias="date", description="截止日期，默认今天"),
+    depth: int | None = Query(default=None, ge=1, description="科目层级深度，更深的科目汇入上级"),
     current_user: User = Depends(get_current_user_flexible),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """获取截至指定日期的资产负债表"""
     await _check_book(current_user.id, book_id, db)
     target_date = as_of_date or date.today()
-    result = await get_balance_sheet(db, book_id, target_date)
-    return BalanceSheetResponse(**result)
+
+    async def compute():
+        result = await get_balance_sheet(db, book_id, target_date, depth)
+        return BalanceSheetResponse(**result)
+
+    return await _cached_report(
+        request, db, book_id, "balance-sheet", (target_date, depth), BalanceSheetResponse, compute
+    )
 
 
 @router.get(
@@ -56,18 +100,26 @@ async def balance_sheet(
     summary="损益表",
 )
 async def income_statement(
+    request: Request,
     book_id: str,
     start: date = Query(..., description="开始日期"),
     end: date = Query(..., description="结束日期"),
+    depth: int | None = Query(default=None, ge=1, description="科目层级深度，更深的科目汇入上级"),
     current_user: User = Depends(get_current_user_flexible),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """获取指定时间段的损益表"""
     await _check_book(current_user.id, book_id, db)
     if start > end:
         raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
-    result = await get_income_statement(db, book_id, start, end)
-    return IncomeStatementResponse(**result)
+
+    async def compute():
+        result = await get_income_statement(db, book_id, start, end, depth)
+        return IncomeStatementResponse(**result)
+
+    return await _cached_report(
+        request, db, book_id, "income-statement", (start, end, depth), IncomeStatementResponse, compute
+    )
 
 
 @router.get(
@@ -76,14 +128,21 @@ async def income_statement(
     summary="仪表盘",
 )
 async def dashboard(
+    request: Request,
     book_id: str,
     current_user: User = Depends(get_current_user_flexible),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """返回净资产、本月收入/费用/损益、较上月变化、近5条分录"""
     await _check_book(current_user.id, book_id, db)
-    result = await get_dashboard(db, book_id)
-    return DashboardResponse(**result)
+
+    async def compute():
+        result = await get_dashboard(db, book_id)
+        return DashboardResponse(**result)
+
+    return await _cached_report(
+        request, db, book_id, "dashboard", (), DashboardResponse, compute
+    )
 
 
 @router.get(
@@ -92,15 +151,33 @@ async def dashboard(
     summary="净资产趋势",
 )
 async def net_worth_trend(
+    request: Request,
     book_id: str,
-    months: int = Query(default=12, ge=1, le=60, description="月数"),
+    months: int = Query(default=12, ge=1, le=60, description="月数（未指定 start 时生效）"),
+    granularity: str = Query(
+        default="month", pattern="^(day|week|month|quarter)$", description="粒度"
+    ),
+    start: date | None = Query(default=None, description="开始日期"),
+    end: date | None = Query(default=None, description="结束日期，默认今天"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """近 N 个月净资产趋势数据"""
+    """净资产趋势数据（按日/周/月/季度，每个周期末一个点）"""
     await _check_book(current_user.id, book_id, db)
-    result = await get_net_worth_trend(db, book_id, months)
-    return [NetWorthTrendPoint(**p) for p in result]
+
+    async def compute():
+        try:
+            result = await get_net_worth_trend(
+                db, book_id, months, granularity, start, end
+            )
+        except ReportError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        return [NetWorthTrendPoint(**p) for p in result]
+
+    return await _cached_report(
+        request, db, book_id, "net-worth-trend", (months, granularity, start, end),
+        list[NetWorthTrendPoint], compute,
+    )
 
 
 @router.get(
@@ -109,18 +186,25 @@ async def net_worth_trend(
     summary="费用分类占比",
 )
 async def expense_breakdown(
+    request: Request,
     book_id: str,
     start: date = Query(..., description="开始日期"),
     end: date = Query(..., description="结束日期"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """费用分类占比"""
     await _check_book(current_user.id, book_id, db)
     if start > end:
         raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
-    result = await get_expense_breakdown(db, book_id, start, end)
-    return [BreakdownItem(**item) for item in result]
+
+    async def compute():
+        result = await get_expense_breakdown(db, book_id, start, end)
+        return [BreakdownItem(**item) for item in result]
+
+    return await _cached_report(
+        request, db, book_id, "expense-breakdown", (start, end), list[BreakdownItem], compute
+    )
 
 
 @router.get(
@@ -129,11 +213,18 @@ async def expense_breakdown(
     summary="资产配置占比",
 )
 async def asset_allocation(
+    request: Request,
     book_id: str,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """资产配置占比"""
     await _check_book(current_user.id, book_id, db)
-    result = await get_asset_allocation(db, book_id)
-    return [BreakdownItem(**item) for item in result]
+
+    async def compute():
+        result = await get_asset_allocation(db, book_id)
+        return [BreakdownItem(**item) for item in result]
+
+    return await _cached_report(
+        request, db, book_id, "asset-allocation", (), list[BreakdownItem], compute
+    )
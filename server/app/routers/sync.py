@@ -1,30 +1,61 @@
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
 
-from app.database import get_db
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import get_db, get_session_factory
+from app.models.journal import JournalEntry
 from app.models.user import User
 from app.schemas.sync import (
     SnapshotCreateRequest,
     SnapshotResponse,
+    SnapshotBatchRequest,
+    SnapshotBatchResponse,
     PendingReconcileItem,
     ConfirmRequest,
     ConfirmResponse,
     SplitRequest,
     SplitResponse,
     PendingCountResponse,
+    BulkConfirmRequest,
+    BulkConfirmResponse,
+    BulkSplitRequest,
+    BulkSplitResponse,
+    DataSourceCreate,
+    DataSourceUpdate,
+    DataSourceResponse,
+    FileImportResponse,
+    TransactionImportRequest,
+    MatchOptions,
+    MatchResultResponse,
+    ExternalTransactionResponse,
 )
 from app.services.reconciliation_service import (
     create_snapshot,
+    create_snapshots,
     get_pending_reconciliations,
     get_pending_count,
     confirm_reconciliation,
+    confirm_reconciliations,
     split_reconciliation,
+    split_reconciliations,
     ReconciliationError,
 )
+from app.services.matching_service import (
+    create_data_source,
+    list_data_sources,
+    get_data_source,
+    update_data_source,
+    list_external_transactions,
+    import_transactions,
+    match_transactions,
+    MatchingError,
+)
+from app.services.statement_import_service import import_statement, StatementImportError
 from app.services.book_service import user_has_book_access
-from app.services.entry_service import get_entry_detail
 from app.utils.api_key_auth import get_current_user_flexible
 from app.utils.deps import get_current_user
 
@@ -37,13 +68,15 @@ async def _check_book(user_id: str, book_id: str, db: AsyncSession):
 
 
 async def _check_entry_book(user_id: str, entry_id: str, db: AsyncSession) -> str:
-    """获取分录所属 book_id 并校验权限"""
-    entry = await get_entry_detail(db, entry_id)
-    if not entry:
+    """获取分录所属 book_id 并校验权限（只查 book_id，不加载分录行）"""
+    book_id = (await db.execute(
+        select(JournalEntry.book_id).where(JournalEntry.id == entry_id)
+    )).scalar_one_or_none()
+    if not book_id:
         raise HTTPException(status_code=404, detail="分录不存在")
-    if not await user_has_book_access(db, user_id, entry.book_id):
+    if not await user_has_book_access(db, user_id, book_id):
         raise HTTPException(status_code=403, detail="无权访问该账本")
-    return entry.book_id
+    return book_id
 
 
 @router.post(
@@ -83,6 +116,43 @@ async def submit_snapshot(
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
+@router.post(
+    "/books/{book_id}/snapshots/batch",
+    response_model=SnapshotBatchResponse,
+    status_code=201,
+    summary="批量提交余额快照",
+)
+async def submit_snapshots_batch(
+    book_id: str,
+    body: SnapshotBatchRequest,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    """一次提交多个科目的外部余额（多账户同步），任一条失败则全部不生效"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        items = await create_snapshots(
+            db,
+            book_id=book_id,
+            user_id=current_user.id,
+            items=[
+                {
+                    "account_id": i.account_id,
+                    "external_balance": Decimal(str(i.external_balance)),
+                    "snapshot_date": i.snapshot_date,
+                }
+                for i in body.items
+            ],
+        )
+    except ReconciliationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return SnapshotBatchResponse(
+        created=len(items),
+        pending=sum(1 for i in items if i["reconciliation_entry_id"]),
+        items=[SnapshotResponse(**i) for i in items],
+    )
+
+
 @router.get(
     "/books/{book_id}/pending-reconciliations",
     response_model=list[PendingReconcileItem],
@@ -90,12 +160,20 @@ async def submit_snapshot(
 )
 async def pending_reconciliations(
     book_id: str,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=500, description="每页条数，不传返回全部"),
+    cursor: str | None = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """获取待处理的调节分录列表"""
+    """获取待处理的调节分录列表；分页时下一页游标放在响应头 X-Next-Cursor"""
     await _check_book(current_user.id, book_id, db)
-    items = await get_pending_reconciliations(db, book_id)
+    try:
+        items, next_cursor = await get_pending_reconciliations(db, book_id, limit, cursor)
+    except ReconciliationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [PendingReconcileItem(**item) for item in items]
 
 
@@ -158,3 +236,275 @@ async def split_entry(
         return SplitResponse(**data)
     except ReconciliationError as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.post(
+    "/books/{book_id}/reconciliations/confirm",
+    response_model=BulkConfirmResponse,
+    summary="批量确认调节分录",
+)
+async def bulk_confirm(
+    book_id: str,
+    body: BulkConfirmRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """在一个事务内确认多条调节分录的分类，任一条失败则全部不生效"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        items = await confirm_reconciliations(
+            db, book_id, [i.model_dump() for i in body.items]
+        )
+    except ReconciliationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return BulkConfirmResponse(
+        confirmed=len(items), items=[ConfirmResponse(**i) for i in items]
+    )
+
+
+@router.post(
+    "/books/{book_id}/reconciliations/split",
+    response_model=BulkSplitResponse,
+    summary="批量拆分调节分录",
+)
+async def bulk_split(
+    book_id: str,
+    body: BulkSplitRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """在一个事务内拆分多条调节分录，任一条失败则全部不生效"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        items = await split_reconciliations(
+            db, book_id, [i.model_dump() for i in body.items]
+        )
+    except ReconciliationError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return BulkSplitResponse(
+        confirmed=len(items), items=[SplitResponse(**i) for i in items]
+    )
+
+
+# ─────────────────────── 数据源与外部交易匹配 ───────────────────────
+
+
+def _match_response(result) -> MatchResultResponse:
+    return MatchResultResponse(
+        imported=result.imported,
+        skipped=result.skipped,
+        matched=result.matched,
+        unmatched=result.unmatched,
+        unmatched_amount=result.unmatched_amount,
+        reconciliation_entries=result.reconciliation_entries,
+    )
+
+
+@router.post(
+    "/books/{book_id}/data-sources",
+    response_model=DataSourceResponse,
+    status_code=201,
+    summary="创建数据源",
+)
+async def create_source(
+    book_id: str,
+    body: DataSourceCreate,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    """为科目创建外部数据源（如银行流水导入）"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        source = await create_data_source(
+            db, book_id, body.account_id, body.source_type, body.provider_name, body.config
+        )
+    except MatchingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return DataSourceResponse.model_validate(source)
+
+
+@router.get(
+    "/books/{book_id}/data-sources",
+    response_model=list[DataSourceResponse],
+    summary="数据源列表",
+)
+async def list_sources(
+    book_id: str,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    await _check_book(current_user.id, book_id, db)
+    sources = await list_data_sources(db, book_id)
+    return [DataSourceResponse.model_validate(s) for s in sources]
+
+
+@router.put(
+    "/books/{book_id}/data-sources/{data_source_id}",
+    response_model=DataSourceResponse,
+    summary="更新数据源",
+)
+async def update_source(
+    book_id: str,
+    data_source_id: str,
+    body: DataSourceUpdate,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    """更新数据源名称、状态或导入配置（CSV 列映射、编码等）"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        source = await get_data_source(db, book_id, data_source_id)
+        source = await update_data_source(
+            db, source, body.provider_name, body.config, body.status
+        )
+    except MatchingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return DataSourceResponse.model_validate(source)
+
+
+@router.post(
+    "/books/{book_id}/data-sources/{data_source_id}/import",
+    response_model=FileImportResponse,
+    summary="上传对账单文件（CSV / OFX）流式导入",
+)
+async def import_source_file(
+    book_id: str,
+    data_source_id: str,
+    file: UploadFile = File(..., description="银行导出的 CSV、OFX 或 QFX 文件"),
+    target: Literal["transactions", "entries"] | None = Query(
+        None, description="写入外部交易表并匹配，或直接生成分录；默认取数据源 config.target"
+    ),
+    chunk_size: int = Query(1000, ge=1, le=5000, description="每个分块的条数，每块单独提交"),
+    date_tolerance_days: int = Query(3, ge=0, le=15),
+    min_score: float = Query(0.5, ge=0, le=1),
+    book_residuals: bool = Query(False),
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+):
+    """按数据源配置的列映射逐行解析上传文件，分块写入。
+
+    文件不会整体读入内存；出错时此前已提交的分块保留，
+    修正后重新上传同一文件即可续传（已导入的流水按 external_id 跳过）。
+    """
+    await _check_book(current_user.id, book_id, db)
+    try:
+        result = await import_statement(
+            session_factory,
+            current_user,
+            book_id,
+            data_source_id,
+            file.file,
+            file.filename,
+            target,
+            chunk_size,
+            date_tolerance_days,
+            min_score,
+            book_residuals,
+        )
+    except StatementImportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finally:
+        await file.close()
+
+    response = FileImportResponse(
+        format=result.format,
+        target=result.target,
+        total=result.total,
+        imported=result.imported,
+        skipped=result.skipped,
+        chunks=result.chunks,
+    )
+    if result.match is not None:
+        response.matched = result.match.matched
+        response.unmatched = result.match.unmatched
+        response.unmatched_amount = result.match.unmatched_amount
+        response.reconciliation_entries = result.match.reconciliation_entries
+    return response
+
+
+@router.post(
+    "/books/{book_id}/data-sources/{data_source_id}/transactions",
+    response_model=MatchResultResponse,
+    summary="导入外部交易并自动匹配",
+)
+async def import_source_transactions(
+    book_id: str,
+    data_source_id: str,
+    body: TransactionImportRequest,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    """导入外部交易流水，按金额、日期容差和摘要相似度与已记账分录配对"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        source = await get_data_source(db, book_id, data_source_id)
+        result = await import_transactions(
+            db,
+            source,
+            [
+                {
+                    "date": t.transaction_date,
+                    "amount": Decimal(str(t.amount)),
+                    "description": t.description,
+                    "counterparty": t.counterparty,
+                    "external_id": t.external_id,
+                }
+                for t in body.transactions
+            ],
+            current_user.id,
+            body.date_tolerance_days,
+            body.min_score,
+            body.book_residuals,
+        )
+    except MatchingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _match_response(result)
+
+
+@router.post(
+    "/books/{book_id}/data-sources/{data_source_id}/match",
+    response_model=MatchResultResponse,
+    summary="重新匹配未配对的外部交易",
+)
+async def rematch_source_transactions(
+    book_id: str,
+    data_source_id: str,
+    body: MatchOptions,
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    """补记分录后，对数据源下仍未配对的外部交易再匹配一次"""
+    await _check_book(current_user.id, book_id, db)
+    try:
+        source = await get_data_source(db, book_id, data_source_id)
+        result = await match_transactions(
+            db, source, current_user.id,
+            body.date_tolerance_days, body.min_score, body.book_residuals,
+        )
+    except MatchingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _match_response(result)
+
+
+@router.get(
+    "/books/{book_id}/data-sources/{data_source_id}/transactions",
+    response_model=list[ExternalTransactionResponse],
+    summary="外部交易列表",
+)
+async def list_source_transactions(
+    book_id: str,
+    data_source_id: str,
+    match_status: str | None = Query(None, description="unmatched / matched / reconciled"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user_flexible),
+    db: AsyncSession = Depends(get_db),
+):
+    await _check_book(current_user.id, book_id, db)
+    try:
+        source = await get_data_source(db, book_id, data_source_id)
+    except MatchingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    txns = await list_external_transactions(db, source, match_status, limit, offset)
+    return [ExternalTransactionResponse.model_validate(t) for t in txns]
@@ -66,3 +66,11 @@ class DepreciationRecord(BaseModel):
     accumulated: float
     net_value: float
     entry_id: str | None
+
+
+class DepreciationCatchUpResult(BaseModel):
+    through: date
+    created: int
+    assets: int
+    total_amount: float
+    skipped_assets: dict[str, str] = {}  # 累计折旧与台账对不上而未补提的资产 {asset_id: 原因}
@@ -56,3 +56,22 @@ class BudgetAlert(BaseModel):
 class BudgetCheckResult(BaseModel):
     triggered: bool = False
     alerts: list[BudgetAlert] = []
+
+
+class BudgetHistoryRow(BaseModel):
+    """单个预算的多期执行情况，各列表与 BudgetHistoryResponse.periods 一一对应"""
+    budget_id: str
+    account_id: str | None  # NULL = 总预算
+    account_name: str | None = None
+    amount: float  # 按当前预算金额与各期比较
+    alert_threshold: float
+    actual: list[float]
+    variance: list[float]  # 预算 - 实际，负数表示超支
+    usage_rate: list[float]
+    status: list[str]  # normal / warning / exceeded
+
+
+class BudgetHistoryResponse(BaseModel):
+    periods: list[str]  # YYYY-MM，按时间升序
+    total_expense: list[float]  # 各期全部费用
+    rows: list[BudgetHistoryRow] = []
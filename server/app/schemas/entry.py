@@ -144,9 +144,10 @@ class EntryDetailResponse(EntryResponse):
 
 class EntryListResponse(BaseModel):
     items: list[EntryResponse]
-    total: int
+    total: int | None = None  # 游标翻页默认不统计总数
     page: int
     page_size: int
+    next_cursor: str | None = None  # 传给下一次请求的 cursor；None 表示没有更多
 
 
 class EntryConvertRequest(BaseModel):
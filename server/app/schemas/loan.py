@@ -75,3 +75,58 @@ class LoanPrepayRequest(BaseModel):
     payment_account_id: str = Field(..., description="还款资产账户 ID")
     interest_account_id: str | None = Field(None, description="利息费用科目 ID")
     prepay_date: date | None = Field(None, description="还款日期，默认今天")
+
+
+class LoanPrepaymentEvent(BaseModel):
+    prepay_date: date = Field(..., description="提前还款日期，计入该日或之前最近一期还款之后")
+    amount: float = Field(..., gt=0, description="提前还款金额")
+
+
+class LoanScenario(BaseModel):
+    name: str | None = Field(None, max_length=100)
+    strategy: str = Field(
+        "shorten_term",
+        pattern=r"^(shorten_term|reduce_payment)$",
+        description="shorten_term 月供不变缩短期限 / reduce_payment 期限不变降低月供",
+    )
+    prepayments: list[LoanPrepaymentEvent] = Field(default_factory=list, max_length=120)
+    extra_monthly: float = Field(0, ge=0, description="每期额外偿还的本金")
+
+
+class LoanSimulateRequest(BaseModel):
+    scenarios: list[LoanScenario] = Field(..., min_length=1, max_length=50)
+    include_schedule: bool = Field(False, description="是否返回逐期与基准计划的差额")
+
+
+class ScenarioScheduleDelta(BaseModel):
+    period: int
+    payment_date: date
+    payment: float
+    payment_delta: float
+    interest: float
+    interest_delta: float
+    remaining: float
+    remaining_delta: float
+
+
+class LoanSimulationPlan(BaseModel):
+    total_interest: float
+    payoff_date: date | None
+    periods: int
+    first_payment: float
+    last_payment: float
+
+
+class LoanScenarioResult(LoanSimulationPlan):
+    name: str | None
+    strategy: str
+    interest_saved: float
+    periods_saved: int
+    schedule: list[ScenarioScheduleDelta] | None = None
+
+
+class LoanSimulateResponse(BaseModel):
+    loan_id: str
+    remaining_principal: float
+    baseline: LoanSimulationPlan
+    scenarios: list[LoanScenarioResult]
@@ -58,3 +58,24 @@ class BatchEntryResponse(BaseModel):
     created: int
     skipped: int
     results: list[BatchEntryResultItem]
+
+
+# ─── 流式批量记账（NDJSON）───────────────────
+
+
+class BatchStreamErrorLine(BaseModel):
+    """流式导入出错时的结束行；此前已提交的分块不受影响"""
+    status: Literal["error"] = "error"
+    index: int | None = None
+    detail: str
+    created: int
+    skipped: int
+
+
+class BatchStreamSummaryLine(BaseModel):
+    """流式导入完成时的汇总行"""
+    status: Literal["done"] = "done"
+    total: int
+    created: int
+    skipped: int
+    chunks: int
@@ -12,6 +12,12 @@ class AccountBalanceItem(BaseModel):
     debit_total: float
     credit_total: float
     balance: float
+    # 层级汇总：本科目及全部下级科目的合计（level 从 1 开始）
+    level: int | None = None
+    is_leaf: bool | None = None
+    rollup_debit_total: float | None = None
+    rollup_credit_total: float | None = None
+    rollup_balance: float | None = None
 
 
 class BalanceSheetResponse(BaseModel):
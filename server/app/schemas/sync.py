@@ -1,5 +1,6 @@
-from datetime import date
-from pydantic import BaseModel
+from datetime import date, datetime
+from typing import Literal
+from pydantic import BaseModel, Field
 
 
 class SnapshotCreateRequest(BaseModel):
@@ -20,6 +21,22 @@ class SnapshotResponse(BaseModel):
     reconciliation_entry_id: str | None
 
 
+class SnapshotBatchItem(BaseModel):
+    account_id: str
+    external_balance: float
+    snapshot_date: date | None = None
+
+
+class SnapshotBatchRequest(BaseModel):
+    items: list[SnapshotBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class SnapshotBatchResponse(BaseModel):
+    created: int
+    pending: int  # 生成了调节分录的快照数
+    items: list[SnapshotResponse]
+
+
 class ReconcileLineItem(BaseModel):
     id: str
     account_id: str
@@ -77,3 +94,110 @@ class SplitResponse(BaseModel):
 
 class PendingCountResponse(BaseModel):
     count: int
+
+
+class BulkConfirmItem(BaseModel):
+    entry_id: str
+    target_account_id: str
+
+
+class BulkConfirmRequest(BaseModel):
+    items: list[BulkConfirmItem] = Field(..., min_length=1, max_length=500)
+
+
+class BulkConfirmResponse(BaseModel):
+    confirmed: int
+    items: list[ConfirmResponse]
+
+
+class BulkSplitItem(BaseModel):
+    entry_id: str
+    splits: list[SplitItem] = Field(..., min_length=1)
+
+
+class BulkSplitRequest(BaseModel):
+    items: list[BulkSplitItem] = Field(..., min_length=1, max_length=500)
+
+
+class BulkSplitResponse(BaseModel):
+    confirmed: int
+    items: list[SplitResponse]
+
+
+class DataSourceCreate(BaseModel):
+    account_id: str
+    source_type: Literal["manual", "csv_import", "open_banking", "broker_api", "exchange_api"] = "csv_import"
+    provider_name: str | None = Field(None, max_length=200)
+    config: dict | None = None
+
+
+class DataSourceUpdate(BaseModel):
+    provider_name: str | None = Field(None, max_length=200)
+    config: dict | None = Field(None, description="导入配置，如 CSV 列映射；整体替换")
+    status: Literal["active", "disconnected", "error"] | None = None
+
+
+class DataSourceResponse(BaseModel):
+    id: str
+    account_id: str
+    source_type: str
+    provider_name: str | None
+    config: dict | None
+    status: str
+    last_sync_at: datetime | None
+
+    model_config = {"from_attributes": True}
+
+
+class ExternalTransactionIn(BaseModel):
+    transaction_date: date
+    amount: float = Field(..., description="科目余额方向上的变动：资产流入为正，负债增加为正")
+    description: str | None = None
+    counterparty: str | None = Field(None, max_length=200)
+    external_id: str | None = Field(None, max_length=128, description="流水号，同一数据源内去重")
+
+
+class MatchOptions(BaseModel):
+    date_tolerance_days: int = Field(3, ge=0, le=15, description="日期容差（天）")
+    min_score: float = Field(0.5, ge=0, le=1, description="最低匹配得分")
+    book_residuals: bool = Field(False, description="未匹配的交易逐笔生成待确认调节分录")
+
+
+class TransactionImportRequest(MatchOptions):
+    transactions: list[ExternalTransactionIn] = Field(..., min_length=1, max_length=50000)
+
+
+class MatchResultResponse(BaseModel):
+    imported: int
+    skipped: int = 0
+    matched: int
+    unmatched: int
+    unmatched_amount: float
+    reconciliation_entries: int
+
+
+class ExternalTransactionResponse(BaseModel):
+    id: str
+    transaction_date: date
+    amount: float
+    description: str | None
+    counterparty: str | None
+    external_id: str | None = None
+    match_status: str
+    matched_entry_id: str | None
+    matched_line_id: str | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class FileImportResponse(BaseModel):
+    format: str = Field(..., description="csv / ofx")
+    target: str = Field(..., description="transactions / entries")
+    total: int = Field(..., description="解析出的交易笔数")
+    imported: int
+    skipped: int = Field(..., description="按 external_id 跳过的已导入笔数")
+    chunks: int
+    matched: int = 0
+    unmatched: int = 0
+    unmatched_amount: float = 0.0
+    reconciliation_entries: int = 0
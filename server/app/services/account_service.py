@@ -1,9 +1,14 @@
-from sqlalchemy import select, func, update
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import select, func, update, event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from app.models.account import Account
 from app.models.journal import JournalLine
 from app.schemas.account import AccountTreeNode, AccountTreeResponse, MigrationInfo
+from app.services import ledger_service
 
 
 class AccountError(Exception):
@@ -12,6 +17,83 @@ class AccountError(Exception):
         self.status_code = status_code
 
 
+# ─────────────────── 科目表快照（会话级缓存） ───────────────────
+
+_CHART_SNAPSHOT_KEY = "chart_snapshots"
+
+
+@dataclass(frozen=True)
+class AccountMeta:
+    """科目元数据快照，用于记账时的科目校验"""
+    id: str
+    book_id: str
+    code: str
+    name: str
+    type: str
+    parent_id: str | None
+    balance_direction: str
+    is_active: bool
+    child_count: int  # 活跃子科目数
+
+    @property
+    def is_leaf(self) -> bool:
+        return self.child_count == 0
+
+
+async def get_chart_snapshot(db: AsyncSession, book_id: str) -> dict[str, AccountMeta]:
+    """
+    获取账本科目表快照 {account_id: AccountMeta}。
+    同一事务内只查询一次，缓存在 session.info 中，提交/回滚或科目变更时失效。
+    """
+    snapshots = db.info.setdefault(_CHART_SNAPSHOT_KEY, {})
+    snapshot = snapshots.get(book_id)
+    if snapshot is not None:
+        return snapshot
+
+    result = await db.execute(
+        select(
+            Account.id, Account.code, Account.name, Account.type, Account.parent_id,
+            Account.balance_direction, Account.is_active,
+        ).where(Account.book_id == book_id)
+    )
+    rows = result.all()
+    child_counts = Counter(row.parent_id for row in rows if row.parent_id and row.is_active)
+    snapshot = {
+        row.id: AccountMeta(
+            id=row.id,
+            book_id=book_id,
+            code=row.code,
+            name=row.name,
+            type=row.type,
+            parent_id=row.parent_id,
+            balance_direction=row.balance_direction,
+            is_active=row.is_active,
+            child_count=child_counts.get(row.id, 0),
+        )
+        for row in rows
+    }
+    snapshots[book_id] = snapshot
+    return snapshot
+
+
+def invalidate_chart_snapshot(db: AsyncSession, book_id: str) -> None:
+    """科目新增/修改/停用后调用，下次校验时重新加载"""
+    db.info.get(_CHART_SNAPSHOT_KEY, {}).pop(book_id, None)
+
+
+def _accounts_changed(db: AsyncSession, book_id: str) -> None:
+    """科目表变更：快照失效，并标记账务版本（报表含科目名称/启用状态）"""
+    invalidate_chart_snapshot(db, book_id)
+    ledger_service.mark_dirty(db, book_id)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _discard_chart_snapshots(session: Session) -> None:
+    # 快照只在一个事务内有效，避免长会话读到其他会话的科目变更
+    session.info.pop(_CHART_SNAPSHOT_KEY, None)
+
+
 async def get_accounts_by_book(db: AsyncSession, book_id: str) -> list[Account]:
     """获取账本下所有活跃科目"""
     result = await db.execute(
@@ -53,13 +135,19 @@ def _account_to_node(acc: Account, is_leaf: bool) -> AccountTreeNode:
     )
 
 
-def build_account_tree(accounts: list[Account]) -> AccountTreeResponse:
-    """将扁平科目列表构建为按 type 分组的树形结构"""
-    # 先收集所有有子科目的 parent_id
+def collect_parent_ids(accounts) -> set[str]:
+    """收集所有有子科目的 parent_id（元素需具备 parent_id 属性）"""
     parent_ids: set[str] = set()
     for acc in accounts:
         if acc.parent_id:
             parent_ids.add(acc.parent_id)
+    return parent_ids
+
+
+def build_account_tree(accounts: list[Account]) -> AccountTreeResponse:
+    """将扁平科目列表构建为按 type 分组的树形结构"""
+    # 先收集所有有子科目的 parent_id
+    parent_ids = collect_parent_ids(accounts)
 
     node_map: dict[str, AccountTreeNode] = {}
     for acc in accounts:
@@ -134,6 +222,7 @@ async def _migrate_lines_to_fallback(
             sort_order=990,
         )
         db.add(fallback)
+        _accounts_changed(db, parent_account.book_id)
         await db.flush()
 
     # 3. 批量迁移 journal_lines
@@ -142,6 +231,9 @@ async def _migrate_lines_to_fallback(
         .where(JournalLine.account_id == parent_account.id)
         .values(account_id=fallback.id)
     )
+    await ledger_service.rebuild_daily_balances(
+        db, parent_account.book_id, [parent_account.id, fallback.id]
+    )
 
     return MigrationInfo(
         triggered=True,
@@ -274,6 +366,7 @@ async def create_custom_account(
         sort_order=sort_order,
     )
     db.add(account)
+    _accounts_changed(db, book_id)
     await db.flush()
     await db.refresh(account)
     return account, migration_info
@@ -325,6 +418,7 @@ async def update_account(
         account.icon = icon
     if sort_order is not None:
         account.sort_order = sort_order
+    _accounts_changed(db, account.book_id)
     await db.flush()
     await db.refresh(account)
     return account
@@ -334,6 +428,7 @@ async def deactivate_account(db: AsyncSession, account: Account) -> Account:
     """软删除（停用）科目，需通过删除保护校验"""
     await _check_account_deletable(db, account)
     account.is_active = False
+    _accounts_changed(db, account.book_id)
     await db.flush()
     await db.refresh(account)
     return account
@@ -0,0 +1,260 @@
+"""
+贷款摊还引擎 — 以整数分为单位按列（array）计算还款计划，并按贷款条款缓存。
+
+舍入规则与逐期 Decimal 计算完全一致：每期利息 = ROUND_HALF_UP(剩余本金 × 月利率, 0.01)。
+剩余本金始终是整数分，利息可化为整数除法 R·A / 12_000_000（A 为年利率 × 10⁴）。
+只有恰好落在半分上时，Decimal 的 28 位精度月利率可能使结果向下舍入，
+这种情况回退到 Decimal 逐位重算，保证与原实现逐分相同。
+
+还款计划只由 (本金, 年利率, 期数, 还款方式, 首期日期) 决定；还款、提前还款只改变
+已还期数和剩余本金，不影响计划本身，因此缓存无需随还款失效，条款变化即换键。
+"""
+
+import calendar
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+_CENT = Decimal("0.01")
+_RATE_SCALE = 10_000  # 年利率(%) 最多 4 位小数
+# 利息(分) = 剩余本金(分) × A / (10⁴ × 1200)
+_INTEREST_DEN = _RATE_SCALE * 1200
+
+SCHEDULE_CACHE_SIZE = 1024
+
+
+def _round_half_up(num: int, den: int) -> int:
+    """非负整数 num/den 四舍五入到整数"""
+    return (2 * num + den) // (2 * den)
+
+
+def add_months(start: date, months: int) -> date:
+    """与 relativedelta(months=n) 相同：月份相加，日期超出当月天数时取月末"""
+    total = start.month - 1 + months
+    year, month = start.year + total // 12, total % 12 + 1
+    return start.replace(year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def to_cents(amount: float | Decimal) -> int | None:
+    """金额转整数分；不是整分时返回 None"""
+    value = Decimal(str(amount)) * 100
+    return int(value) if value == value.to_integral_value() else None
+
+
+def to_rate_units(annual_rate: float | Decimal) -> int | None:
+    """年利率(%) 转为 万分之一 的整数；超过 4 位小数时返回 None"""
+    value = Decimal(str(annual_rate)) * _RATE_SCALE
+    return int(value) if value == value.to_integral_value() else None
+
+
+@dataclass(frozen=True)
+class AmortizationTable:
+    """按列存储的还款计划（单位：分），cum_interest[k] 为前 k 期利息合计"""
+
+    start_date: date
+    payment: array
+    principal: array
+    interest: array
+    remaining: array
+    cum_interest: array
+
+    @property
+    def months(self) -> int:
+        return len(self.payment)
+
+    @property
+    def total_interest_cents(self) -> int:
+        return self.cum_interest[-1]
+
+    def paid_interest_cents(self, repaid_months: int) -> int:
+        """已还 repaid_months 期的利息合计，O(1)"""
+        return self.cum_interest[max(0, min(repaid_months, self.months))]
+
+    def payment_date(self, period: int) -> date:
+        return add_months(self.start_date, period - 1)
+
+    def rows(self, repaid_months: int = 0) -> list[dict]:
+        """展开为与 generate_schedule 相同结构的 dict 列表"""
+        return [
+            {
+                "period": i + 1,
+                "payment_date": self.payment_date(i + 1),
+                "payment": self.payment[i] / 100,
+                "principal": self.principal[i] / 100,
+                "interest": self.interest[i] / 100,
+                "remaining": self.remaining[i] / 100,
+                "is_paid": i + 1 <= repaid_months,
+            }
+            for i in range(self.months)
+        ]
+
+
+def _interest_cents(remaining: int, rate_units: int, monthly_rate: Decimal) -> int:
+    num = remaining * rate_units
+    if num % _INTEREST_DEN * 2 == _INTEREST_DEN:
+        # 恰为半分：按原 Decimal 计算重算，保持相同的舍入结果
+        return int((Decimal(remaining).scaleb(-2) * monthly_rate).quantize(_CENT, ROUND_HALF_UP) * 100)
+    return _round_half_up(num, _INTEREST_DEN)
+
+
+def monthly_rate(rate_units: int) -> Decimal:
+    """与 Decimal(str(annual_rate)) / 1200 相同的月利率"""
+    return Decimal(rate_units) / _RATE_SCALE / Decimal("1200")
+
+
+def installment_payment_cents(principal_cents: int, rate_units: int, months: int) -> int:
+    """等额本息月供（分）"""
+    if rate_units == 0:
+        return _round_half_up(principal_cents, months)
+    r = monthly_rate(rate_units)
+    factor = (1 + r) ** months
+    payment = Decimal(principal_cents).scaleb(-2) * r * factor / (factor - 1)
+    return int(payment.quantize(_CENT, ROUND_HALF_UP) * 100)
+
+
+def _build(
+    principal_cents: int,
+    rate_units: int,
+    months: int,
+    method: str,
+    start_date: date,
+) -> AmortizationTable:
+    r = monthly_rate(rate_units)
+    payment_col = array("q", bytes(8 * months))
+    principal_col = array("q", bytes(8 * months))
+    interest_col = array("q", bytes(8 * months))
+    remaining_col = array("q", bytes(8 * months))
+    cum = array("q", bytes(8 * (months + 1)))
+
+    if method == "equal_installment":
+        level = installment_payment_cents(principal_cents, rate_units, months)
+    else:
+        level = _round_half_up(principal_cents, months)
+
+    remaining = principal_cents
+    for i in range(months):
+        interest = _interest_cents(remaining, rate_units, r)
+        if i == months - 1:
+            principal_part = remaining
+        elif method == "equal_installment":
+            principal_part = level - interest
+        else:
+            principal_part = level
+        remaining -= principal_part
+
+        payment_col[i] = principal_part + interest
+        principal_col[i] = principal_part
+        interest_col[i] = interest
+        remaining_col[i] = max(remaining, 0)
+        cum[i + 1] = cum[i] + interest
+
+    return AmortizationTable(
+        start_date=start_date,
+        payment=payment_col,
+        principal=principal_col,
+        interest=interest_col,
+        remaining=remaining_col,
+        cum_interest=cum,
+    )
+
+
+def simulate(
+    principal_cents: int,
+    rate_units: int,
+    months: int,
+    method: str,
+    start_date: date,
+    prepayments: dict[int, int] | None = None,
+    extra_monthly_cents: int = 0,
+    strategy: str = "shorten_term",
+) -> AmortizationTable:
+    """
+    带提前还款的摊还表（不缓存、无副作用）。
+
+    prepayments: {期次: 金额(分)}，在该期正常还款之后偿还本金；期次 0 表示首期之前。
+    extra_monthly_cents: 每期额外偿还的本金。
+    strategy: shorten_term 月供不变、缩短期限；reduce_payment 期限不变、按剩余期数重算月供。
+    提前还款计入当期的 payment 和 principal 列，期次 0 的计入首期。无提前还款时与 get_table 结果相同。
+    """
+    prepayments = prepayments or {}
+    r = monthly_rate(rate_units)
+    upfront = min(prepayments.get(0, 0), principal_cents)
+    remaining = principal_cents - upfront
+
+    def level_for(balance: int, periods: int) -> int:
+        if method == "equal_installment":
+            return installment_payment_cents(balance, rate_units, periods)
+        return _round_half_up(balance, periods)
+
+    # 缩短期限时月供按原本金确定；期次 0 的提前还款只在降低月供时参与重算
+    if strategy == "reduce_payment":
+        level = level_for(remaining, months) if remaining > 0 else 0
+    else:
+        level = level_for(principal_cents, months)
+    payment_col, principal_col, interest_col, remaining_col = (array("q") for _ in range(4))
+    cum = array("q", [0])
+
+    for i in range(1, months + 1):
+        if remaining <= 0 and not upfront:
+            break
+        interest = _interest_cents(remaining, rate_units, r)
+        principal_part = level - interest if method == "equal_installment" else level
+        if i == months or principal_part >= remaining:
+            principal_part = remaining
+        remaining -= principal_part
+        extra = min(prepayments.get(i, 0) + extra_monthly_cents, remaining)
+        remaining -= extra
+        # 期次 0 的提前还款在首期之前已从本金扣除，这里只记入首期的还款列
+        extra_paid, upfront = extra + upfront, 0
+
+        payment_col.append(principal_part + extra_paid + interest)
+        principal_col.append(principal_part + extra_paid)
+        interest_col.append(interest)
+        remaining_col.append(remaining)
+        cum.append(cum[-1] + interest)
+
+        if extra and remaining > 0 and strategy == "reduce_payment":
+            level = level_for(remaining, months - i)
+
+    return AmortizationTable(
+        start_date=start_date,
+        payment=payment_col,
+        principal=principal_col,
+        interest=interest_col,
+        remaining=remaining_col,
+        cum_interest=cum,
+    )
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def get_table(
+    principal_cents: int,
+    rate_units: int,
+    months: int,
+    method: str,
+    start_date: date,
+) -> AmortizationTable:
+    """按贷款条款缓存的还款计划；表为只读共享对象，调用方不得修改"""
+    return _build(principal_cents, rate_units, months, method, start_date)
+
+
+def table_for(
+    principal: float,
+    annual_rate: float,
+    months: int,
+    method: str,
+    start_date: date,
+) -> AmortizationTable | None:
+    """按浮点条款取缓存表；本金非整分或利率超过 4 位小数时返回 None（由调用方走 Decimal 路径）"""
+    principal_cents = to_cents(principal)
+    rate_units = to_rate_units(annual_rate)
+    if principal_cents is None or rate_units is None or months <= 0:
+        return None
+    return get_table(principal_cents, rate_units, months, method, start_date)
+
+
+def cache_stats() -> dict:
+    info = get_table.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -0,0 +1,183 @@
+"""
+已验证 API Key 缓存：进程内 LRU + TTL，避免每次请求都做 bcrypt 校验和写库。
+
+键为明文 token 的 HMAC-SHA256 摘要（HMAC 密钥每个进程随机生成，仅存于内存），
+值为校验通过的 Key 的状态快照。Key 被停用、删除时在事务提交后立即失效（见 api_key_service）。
+last_used_at 在内存中合并，由后台任务按固定间隔批量写回。
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.api_key import ApiKey
+
+logger = logging.getLogger(__name__)
+
+_INVALIDATED_KEYS = "api_key_cache_invalidated"
+
+
+@dataclass(frozen=True)
+class VerifiedKey:
+    api_key_id: str
+    user_id: str
+    expires_at: datetime | None
+    is_active: bool
+    cached_at: float
+
+    def to_model(self) -> ApiKey:
+        """未绑定会话的只读快照，供只需要 id/user_id 的调用方使用"""
+        return ApiKey(
+            id=self.api_key_id,
+            user_id=self.user_id,
+            expires_at=self.expires_at,
+            is_active=self.is_active,
+        )
+
+
+class ApiKeyCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, flush_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.flush_seconds = flush_seconds
+        self._secret = secrets.token_bytes(32)
+        self._entries: OrderedDict[bytes, VerifiedKey] = OrderedDict()
+        self._last_used: dict[str, datetime] = {}
+        self._flush_task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.flushed = 0
+
+    def _digest(self, token: str) -> bytes:
+        return hmac.new(self._secret, token.encode("utf-8"), hashlib.sha256).digest()
+
+    # ─────────────────────── 校验结果缓存 ───────────────────────
+
+    def get(self, token: str) -> VerifiedKey | None:
+        digest = self._digest(token)
+        entry = self._entries.get(digest)
+        if entry is None or time.monotonic() - entry.cached_at > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry
+
+    def put(self, token: str, key: ApiKey) -> None:
+        digest = self._digest(token)
+        self._entries[digest] = VerifiedKey(
+            api_key_id=key.id,
+            user_id=key.user_id,
+            expires_at=key.expires_at,
+            is_active=key.is_active,
+            cached_at=time.monotonic(),
+        )
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, api_key_id: str) -> None:
+        stale = [d for d, entry in self._entries.items() if entry.api_key_id == api_key_id]
+        for digest in stale:
+            del self._entries[digest]
+        self.invalidations += len(stale)
+
+    def invalidate_on_commit(self, db: AsyncSession, api_key_id: str) -> None:
+        """立即失效，并在事务提交后再失效一次（防止提交前的并发请求用旧状态回填）"""
+        self.invalidate(api_key_id)
+        db.info.setdefault(_INVALIDATED_KEYS, set()).add(api_key_id)
+
+    # ─────────────────────── last_used_at 合并写回 ───────────────────────
+
+    def touch(
+        self, api_key_id: str, session_factory: async_sessionmaker[AsyncSession]
+    ) -> None:
+        """记录一次使用；首次记录时启动延迟写回任务"""
+        self._last_used[api_key_id] = datetime.utcnow()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(session_factory))
+
+    async def _flush_later(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        await asyncio.sleep(self.flush_seconds)
+        try:
+            await self.flush(session_factory)
+        except Exception:
+            logger.exception("[API Key] last_used_at 写回失败")
+
+    async def flush(self, session_factory: async_sessionmaker[AsyncSession]) -> int:
+        """把合并后的 last_used_at 一次批量写回，返回写回的 Key 数"""
+        pending, self._last_used = self._last_used, {}
+        if not pending:
+            return 0
+        stmt = (
+            update(ApiKey.__table__)
+            .where(ApiKey.__table__.c.id == bindparam("key_id"))
+            .values(last_used_at=bindparam("used_at"))
+        )
+        async with session_factory() as db:
+            await db.execute(stmt, [
+                {"key_id": key_id, "used_at": used_at} for key_id, used_at in pending.items()
+            ])
+            await db.commit()
+        self.flushed += len(pending)
+        return len(pending)
+
+    async def close(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """停止延迟任务并立即写回（应用关闭时调用）"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush(session_factory)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._last_used.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "pending_last_used": len(self._last_used),
+            "flushed_last_used": self.flushed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+api_key_cache = ApiKeyCache(
+    settings.API_KEY_CACHE_SIZE,
+    settings.API_KEY_CACHE_TTL_SECONDS,
+    settings.API_KEY_LAST_USED_FLUSH_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for api_key_id in session.info.pop(_INVALIDATED_KEYS, ()):
+        api_key_cache.invalidate(api_key_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_INVALIDATED_KEYS, None)
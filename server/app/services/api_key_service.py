@@ -9,6 +9,7 @@ from sqlalchemy.orm import selectinload
 
 from app.models.api_key import ApiKey
 from app.schemas.api_key import ApiKeyUpdateRequest
+from app.services.api_key_cache import api_key_cache
 
 
 def generate_api_key() -> tuple[str, str, str]:
@@ -81,6 +82,7 @@ async def get_api_key(db: AsyncSession, key_id: str, user_id: str) -> ApiKey:
 async def delete_api_key(db: AsyncSession, key_id: str, user_id: str) -> None:
     key = await get_api_key(db, key_id, user_id)
     await db.delete(key)
+    api_key_cache.invalidate_on_commit(db, key.id)
 
 
 async def update_api_key(
@@ -91,6 +93,7 @@ async def update_api_key(
         key.is_active = body.is_active
     if body.name is not None:
         key.name = body.name
+    api_key_cache.invalidate_on_commit(db, key.id)
     await db.flush()
     await db.refresh(key)
     return key
@@ -0,0 +1,174 @@
+"""
+请求鉴权缓存：用户投影（user_id → User 列值）与账本成员角色（(user_id, book_id) → role）。
+
+两级缓存：会话 db.info 上的请求级缓存（同一请求内重复校验不再查询），
+以及进程级 LRU + TTL 缓存（预热后鉴权不查库）。非成员结果同样缓存。
+User / BookMember 经 ORM 写入时立即失效，并在事务提交后再失效一次。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.util import identity_key
+
+from app.config import settings
+from app.models.book import BookMember
+from app.models.user import User
+
+_REQUEST_USERS = "auth_cache_users"
+_REQUEST_ROLES = "auth_cache_roles"
+_PENDING = "auth_cache_pending"
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        """命中返回缓存值（可能为 None），未命中或过期返回 _MISSING"""
+        item = self._entries.get(key)
+        if item is None or time.monotonic() - item[0] > self.ttl_seconds:
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key, value) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+role_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def _projection(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def _attach(db: AsyncSession, projection: dict) -> User:
+    """用缓存的列值构造 User 并以已持久化状态挂到会话上，不产生查询；修改后照常 flush"""
+    existing = db.sync_session.identity_map.get(identity_key(User, projection["id"]))
+    if existing is not None:
+        return existing
+    user = User(**projection)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+async def get_user(db: AsyncSession, user_id: str) -> User | None:
+    """按 ID 解析当前用户（请求级 → 进程级 → 数据库）"""
+    request_users = db.info.setdefault(_REQUEST_USERS, {})
+    if user_id in request_users:
+        return request_users[user_id]
+
+    cached = user_cache.get(user_id)
+    if cached is _MISSING:
+        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+        user_cache.put(user_id, _projection(user) if user else None)
+    else:
+        user = _attach(db, cached) if cached else None
+
+    request_users[user_id] = user
+    return user
+
+
+async def get_book_role(db: AsyncSession, user_id: str, book_id: str) -> str | None:
+    """用户在账本中的角色，非成员返回 None（请求级 → 进程级 → 数据库）"""
+    key = (user_id, book_id)
+    request_roles = db.info.setdefault(_REQUEST_ROLES, {})
+    if key in request_roles:
+        return request_roles[key]
+
+    role = role_cache.get(key)
+    if role is _MISSING:
+        role = (await db.execute(
+            select(BookMember.role).where(
+                BookMember.book_id == book_id,
+                BookMember.user_id == user_id,
+            )
+        )).scalar_one_or_none()
+        role_cache.put(key, role)
+
+    request_roles[key] = role
+    return role
+
+
+def clear() -> None:
+    user_cache.clear()
+    role_cache.clear()
+
+
+def stats() -> dict:
+    return {"users": user_cache.stats(), "roles": role_cache.stats()}
+
+
+# ─────────────────────── 失效 ───────────────────────
+
+
+def _invalidate(session: Session | None, kind: str, key) -> None:
+    cache, request_key = (
+        (user_cache, _REQUEST_USERS) if kind == "user" else (role_cache, _REQUEST_ROLES)
+    )
+    cache.pop(key)
+    if session is not None:
+        session.info.get(request_key, {}).pop(key, None)
+        session.info.setdefault(_PENDING, set()).add((kind, key))
+
+
+def _on_user_change(mapper, connection, target: User) -> None:
+    _invalidate(object_session(target), "user", target.id)
+
+
+def _on_member_change(mapper, connection, target: BookMember) -> None:
+    _invalidate(object_session(target), "role", (target.user_id, target.book_id))
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _event, _on_user_change)
+    event.listen(BookMember, _event, _on_member_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for kind, key in session.info.pop(_PENDING, ()):
+        (user_cache if kind == "user" else role_cache).pop(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    # 回滚后本会话内的请求级缓存可能引用未提交的状态，一并丢弃
+    for kind, key in session.info.pop(_PENDING, ()):
+        (user_cache if kind == "user" else role_cache).pop(key)
+    session.info.pop(_REQUEST_USERS, None)
+    session.info.pop(_REQUEST_ROLES, None)
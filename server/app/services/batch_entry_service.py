@@ -1,179 +1,274 @@
-"""批量记账 Service — 在单个事务中批量创建分录，支持 external_id 去重"""
+"""批量记账 Service — 在单个事务中批量创建分录，支持 external_id 去重
 
+整批只做固定次数的查询：一次加载科目表快照（含叶子状态），一次 IN 查询
+解析已存在的 external_id，分录行在内存中构造后以 executemany 批量插入。
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import Sequence
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.book import Book, BookMember
-from app.models.journal import JournalEntry
+from app.models.book import Book
+from app.models.journal import JournalEntry, JournalLine
 from app.models.user import User
 from app.schemas.plugin import BatchEntryItem, BatchEntryResultItem, BatchEntryResponse
+from app.services import ledger_service
+from app.services.account_service import AccountMeta, get_chart_snapshot
+from app.services.auth_cache import get_book_role
 from app.services.entry_service import (
-    create_expense,
-    create_income,
-    create_asset_purchase,
-    create_borrow,
-    create_repayment,
-    create_transfer,
     EntryError,
+    _build_expense_lines,
+    _build_income_lines,
+    _build_asset_purchase_lines,
+    _build_borrow_lines,
+    _build_repay_lines,
+    _build_transfer_lines,
+    _check_balance,
 )
 
+# SQLite 单条语句的绑定参数上限较低，external_id 的 IN 查询按块拆分
+_IN_CHUNK_SIZE = 500
 
-async def _validate_book_access(db: AsyncSession, book_id: str, user: User) -> Book:
-    """校验 book 归属并返回 Book 对象"""
-    result = await db.execute(
-        select(Book).where(Book.id == book_id)
-    )
-    book = result.scalar_one_or_none()
-    if not book:
+
+async def validate_book_access(db: AsyncSession, book_id: str, user: User) -> str:
+    """校验 book 归属并返回成员角色；成员关系走鉴权缓存，仅非成员时查询账本是否存在"""
+    role = await get_book_role(db, user.id, book_id)
+    if role is not None:
+        return role
+
+    exists = await db.execute(select(Book.id).where(Book.id == book_id))
+    if exists.scalar_one_or_none() is None:
         raise HTTPException(404, "账本不存在")
+    raise HTTPException(403, "无权访问该账本")
 
-    member = await db.execute(
-        select(BookMember).where(
-            BookMember.book_id == book_id,
-            BookMember.user_id == user.id,
-        )
-    )
-    if not member.scalar_one_or_none():
-        raise HTTPException(403, "无权访问该账本")
 
-    return book
+def _chunks(values: list[str]):
+    for i in range(0, len(values), _IN_CHUNK_SIZE):
+        yield values[i:i + _IN_CHUNK_SIZE]
 
 
-async def _find_by_external_id(
-    db: AsyncSession, book_id: str, external_id: str
-) -> JournalEntry | None:
-    """按 book_id + external_id 查找已有分录"""
-    result = await db.execute(
-        select(JournalEntry).where(
-            JournalEntry.book_id == book_id,
-            JournalEntry.external_id == external_id,
+async def _resolve_external_ids(
+    db: AsyncSession, book_id: str, external_ids: set[str]
+) -> dict[str, str]:
+    """一次 IN 查询解析已存在的 external_id → entry_id"""
+    existing: dict[str, str] = {}
+    for chunk in _chunks(sorted(external_ids)):
+        result = await db.execute(
+            select(JournalEntry.external_id, JournalEntry.id).where(
+                JournalEntry.book_id == book_id,
+                JournalEntry.external_id.in_(chunk),
+            )
         )
-    )
-    return result.scalar_one_or_none()
+        existing.update({row[0]: row[1] for row in result.all()})
+    return existing
 
 
-async def _create_single_entry(
-    db: AsyncSession, user: User, book: Book, item: BatchEntryItem
-) -> JournalEntry:
-    """复用现有 entry_service 的分录创建逻辑（不含联动实体创建）"""
+def _referenced_account_ids(item: BatchEntryItem) -> list[str]:
+    """
+    校验必填字段并返回需校验的科目 ID，顺序与 entry_service 各 create_* 一致，
+    保证报错的科目与逐条创建时相同。
+    """
     match item.entry_type:
         case "expense":
             if not item.amount or not item.category_account_id or not item.payment_account_id:
                 raise EntryError("费用分录需要 amount, category_account_id, payment_account_id")
-            return await create_expense(
-                db, book.id, user.id, item.entry_date, item.amount,
-                item.category_account_id, item.payment_account_id,
-                item.description, item.note,
-            )
+            return [item.category_account_id, item.payment_account_id]
         case "income":
             if not item.amount or not item.category_account_id or not item.payment_account_id:
                 raise EntryError("收入分录需要 amount, category_account_id, payment_account_id")
-            return await create_income(
-                db, book.id, user.id, item.entry_date, item.amount,
-                item.category_account_id, item.payment_account_id,
-                item.description, item.note,
-            )
+            return [item.payment_account_id, item.category_account_id]
         case "transfer":
             if not item.amount or not item.from_account_id or not item.to_account_id:
                 raise EntryError("转账需要 amount, from_account_id, to_account_id")
-            return await create_transfer(
-                db, book.id, user.id, item.entry_date, item.amount,
-                item.from_account_id, item.to_account_id,
-                item.description, item.note,
-            )
+            return [item.from_account_id, item.to_account_id]
         case "asset_purchase":
             if not item.amount or not item.asset_account_id or not item.payment_account_id:
                 raise EntryError("购买资产需要 amount, asset_account_id, payment_account_id")
-            entry, _ = await create_asset_purchase(
-                db, book.id, user.id, item.entry_date, item.amount,
-                item.asset_account_id, item.payment_account_id,
-                item.description, item.note,
-                item.extra_liability_account_id, item.extra_liability_amount,
-            )
-            return entry
+            ids = [item.asset_account_id, item.payment_account_id]
+            if item.extra_liability_account_id and item.extra_liability_amount:
+                ids.append(item.extra_liability_account_id)
+            return ids
         case "borrow":
             if not item.amount or not item.payment_account_id or not item.liability_account_id:
                 raise EntryError("借入需要 amount, payment_account_id, liability_account_id")
-            return await create_borrow(
-                db, book.id, user.id, item.entry_date, item.amount,
-                item.payment_account_id, item.liability_account_id,
-                item.description, item.note,
-            )
+            return [item.payment_account_id, item.liability_account_id]
         case "repay":
             if item.principal is None or item.interest is None:
                 raise EntryError("还款需要 principal, interest")
             if not item.liability_account_id or not item.payment_account_id:
                 raise EntryError("还款需要 liability_account_id, payment_account_id")
-            return await create_repayment(
-                db, book.id, user.id, item.entry_date,
-                item.principal, item.interest,
-                item.liability_account_id, item.payment_account_id,
-                item.category_account_id,
-                item.description, item.note,
-            )
+            ids = [item.liability_account_id, item.payment_account_id]
+            if item.category_account_id:
+                ids.append(item.category_account_id)
+            return ids
         case _:
             raise ValueError(f"批量导入不支持的分录类型: {item.entry_type}")
 
 
+def _check_account(accounts: dict[str, AccountMeta], account_id: str) -> AccountMeta:
+    """与 entry_service._get_account 相同的校验和报错（基于科目表快照）"""
+    acc = accounts.get(account_id)
+    if not acc or not acc.is_active:
+        raise EntryError(f"科目不存在或已停用: {account_id}", 404)
+    if acc.child_count > 0:
+        raise EntryError(
+            f"科目「{acc.name}」（{acc.code}）为非末级科目，"
+            f"含 {acc.child_count} 个子科目，请选择其下的末级科目记账"
+        )
+    return acc
+
+
+def _build_item_lines(
+    item: BatchEntryItem, accounts: dict[str, AccountMeta]
+) -> list[JournalLine]:
+    """校验单条记录并在内存中构造分录行（不含联动实体创建）"""
+    account_ids = _referenced_account_ids(item)
+    checked = [_check_account(accounts, account_id) for account_id in account_ids]
+
+    match item.entry_type:
+        case "expense":
+            lines = _build_expense_lines(
+                item.amount, item.category_account_id, item.payment_account_id
+            )
+        case "income":
+            lines = _build_income_lines(
+                item.amount, item.payment_account_id, item.category_account_id
+            )
+        case "transfer":
+            lines = _build_transfer_lines(
+                item.amount, item.from_account_id, item.to_account_id
+            )
+        case "asset_purchase":
+            # 批量导入不携带资产名称，无法为固定资产科目创建 FixedAsset
+            if checked[0].code and checked[0].code.startswith("1501"):
+                raise EntryError("固定资产科目必须填写资产名称")
+            lines = _build_asset_purchase_lines(
+                item.amount, item.asset_account_id, item.payment_account_id,
+                item.extra_liability_account_id, item.extra_liability_amount,
+            )
+        case "borrow":
+            lines = _build_borrow_lines(
+                item.amount, item.payment_account_id, item.liability_account_id
+            )
+        case "repay":
+            lines = _build_repay_lines(
+                item.principal, item.interest, item.liability_account_id,
+                item.payment_account_id, item.category_account_id,
+            )
+
+    _check_balance(lines)
+    return lines
+
+
 async def batch_create_entries(
     db: AsyncSession,
     user: User,
     book_id: str,
     entries: list[BatchEntryItem],
+    start_index: int = 0,
+    indexes: Sequence[int] | None = None,
 ) -> BatchEntryResponse:
     """批量创建分录，事务性保证。
 
-    - external_id 重复的条目自动跳过
+    - external_id 重复的条目自动跳过（含同一批次内的重复）
     - 任何一条失败则整体抛异常，由 router 层回滚事务
+    - start_index: 本批首条在整个导入中的序号（流式分块导入时用于结果和报错）
+    - indexes: 逐条给出序号（与 entries 一一对应），调用方跳过了部分源数据时使用，优先于 start_index
     """
-    book = await _validate_book_access(db, book_id, user)
+    await validate_book_access(db, book_id, user)
 
+    # 1. 预取：科目表快照（含叶子状态）、已存在的 external_id
+    accounts = await get_chart_snapshot(db, book_id)
+    existing = await _resolve_external_ids(
+        db, book_id, {item.external_id for item in entries if item.external_id}
+    )
+
+    # 2. 内存中校验并构造分录/分录行
     results: list[BatchEntryResultItem] = []
+    entry_rows: list[dict] = []
+    line_rows: list[dict] = []
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
+    )
     created_count = 0
     skipped_count = 0
+    # 同一批次内 created_at 逐条递增，保持与逐条插入相同的排序
+    now = datetime.utcnow()
 
-    for idx, item in enumerate(entries):
-        # 1. external_id 去重
-        if item.external_id:
-            existing = await _find_by_external_id(db, book_id, item.external_id)
-            if existing:
-                results.append(BatchEntryResultItem(
-                    index=idx,
-                    external_id=item.external_id,
-                    status="skipped",
-                    entry_id=existing.id,
-                ))
-                skipped_count += 1
-                continue
-
-        # 2. 创建分录
-        try:
-            entry = await _create_single_entry(db, user, book, item)
-
-            # 3. 设置 external_id 和 source
-            if item.external_id:
-                entry.external_id = item.external_id
-            entry.source = "sync"
-            await db.flush()
-
+    if indexes is None:
+        indexes = range(start_index, start_index + len(entries))
+    for seq, (idx, item) in enumerate(zip(indexes, entries)):
+        if item.external_id and item.external_id in existing:
             results.append(BatchEntryResultItem(
                 index=idx,
                 external_id=item.external_id,
-                status="created",
-                entry_id=entry.id,
+                status="skipped",
+                entry_id=existing[item.external_id],
             ))
-            created_count += 1
+            skipped_count += 1
+            continue
 
+        try:
+            lines = _build_item_lines(item, accounts)
         except EntryError as e:
             raise HTTPException(400, detail=f"第 {idx + 1} 条分录创建失败: {e.detail}")
-        except HTTPException:
-            raise
         except Exception as e:
             raise HTTPException(400, detail=f"第 {idx + 1} 条分录创建失败: {str(e)}")
 
+        entry_id = str(uuid.uuid4())
+        created_at = now + timedelta(microseconds=seq)
+        entry_rows.append({
+            "id": entry_id,
+            "book_id": book_id,
+            "user_id": user.id,
+            "entry_date": item.entry_date,
+            "entry_type": item.entry_type,
+            "description": item.description,
+            "note": item.note,
+            "is_balanced": True,
+            "reconciliation_status": "none",
+            "source": "sync",
+            "external_id": item.external_id,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        for line in lines:
+            line_rows.append({
+                "id": str(uuid.uuid4()),
+                "entry_id": entry_id,
+                "account_id": line.account_id,
+                "debit_amount": line.debit_amount,
+                "credit_amount": line.credit_amount,
+                "description": line.description,
+            })
+            bucket = deltas[(line.account_id, item.entry_date)]
+            bucket[0] += Decimal(str(line.debit_amount))
+            bucket[1] += Decimal(str(line.credit_amount))
+
+        if item.external_id:
+            existing[item.external_id] = entry_id
+        results.append(BatchEntryResultItem(
+            index=idx,
+            external_id=item.external_id,
+            status="created",
+            entry_id=entry_id,
+        ))
+        created_count += 1
+
+    # 3. executemany 批量写入 + 同步日发生额汇总
+    if entry_rows:
+        await db.execute(insert(JournalEntry), entry_rows)
+        await db.execute(insert(JournalLine), line_rows)
+        await ledger_service.apply_deltas(
+            db, book_id, {k: (v[0], v[1]) for k, v in deltas.items()}
+        )
+
     return BatchEntryResponse(
         total=len(entries),
         created=created_count,
@@ -2,6 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.book import Book, BookMember
+from app.services.auth_cache import get_book_role
 from app.utils.seed import seed_accounts_for_book
 
 
@@ -46,11 +47,5 @@ async def get_book_by_id(db: AsyncSession, book_id: str) -> Book | None:
 
 
 async def user_has_book_access(db: AsyncSession, user_id: str, book_id: str) -> bool:
-    """检查用户是否有权访问该账本"""
-    result = await db.execute(
-        select(BookMember).where(
-            BookMember.book_id == book_id,
-            BookMember.user_id == user_id,
-        )
-    )
-    return result.scalar_one_or_none() is not None
+    """检查用户是否有权访问该账本（走鉴权缓存）"""
+    return await get_book_role(db, user_id, book_id) is not None
@@ -1,60 +1,116 @@
 """预算检查服务"""
 
+from dataclasses import dataclass
 from datetime import date
 
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.budget import Budget
 from app.models.account import Account
-from app.models.journal import JournalEntry, JournalLine
+from app.models.balance import BudgetSpendCounter
 from app.schemas.budget import (
     BudgetResponse,
     BudgetOverview,
     BudgetCheckResult,
     BudgetAlert,
+    BudgetHistoryResponse,
+    BudgetHistoryRow,
 )
+from app.services.account_service import AccountMeta, get_chart_snapshot
+from app.services.ledger_service import spend_period
 
 
-def _current_month_range() -> tuple[date, date]:
-    """返回当月的第一天和最后一天"""
+def _current_period() -> str:
+    """当月的预算期间键 YYYY-MM"""
+    return spend_period(date.today())
+
+
+def _recent_periods(months: int) -> list[str]:
+    """截至当月的最近 months 个期间，按时间升序"""
     today = date.today()
-    first = today.replace(day=1)
-    if today.month == 12:
-        last = date(today.year + 1, 1, 1)
-    else:
-        last = date(today.year, today.month + 1, 1)
-    return first, last
+    index = today.year * 12 + today.month - 1
+    return [
+        f"{i // 12:04d}-{i % 12 + 1:02d}"
+        for i in range(index - months + 1, index + 1)
+    ]
 
 
-async def get_month_expense(
+async def get_expense_matrix(
     db: AsyncSession,
     book_id: str,
-    account_id: str | None,
-    start: date,
-    end: date,
-) -> float:
+    periods: list[str],
+) -> dict[str, dict[str, float]]:
     """
-    获取某月某科目（或全部费用）的实际支出。
-    查询 journal_lines 中关联费用科目的借方合计。
+    一次查询获取多个月份各费用科目的实际支出 {period: {account_id: 借方合计}}。
+    读取记账时同步维护的预算使用额计数器，不扫描分录。
     """
-    stmt = (
-        select(func.coalesce(func.sum(JournalLine.debit_amount), 0))
-        .join(JournalEntry, JournalLine.entry_id == JournalEntry.id)
-        .join(Account, JournalLine.account_id == Account.id)
+    result = await db.execute(
+        select(
+            BudgetSpendCounter.period,
+            BudgetSpendCounter.account_id,
+            BudgetSpendCounter.spent,
+        )
+        .join(Account, BudgetSpendCounter.account_id == Account.id)
         .where(
-            JournalEntry.book_id == book_id,
-            JournalEntry.entry_date >= start,
-            JournalEntry.entry_date < end,
+            BudgetSpendCounter.book_id == book_id,
+            BudgetSpendCounter.period.in_(periods),
             Account.type == "expense",
         )
     )
-    if account_id:
-        stmt = stmt.where(JournalLine.account_id == account_id)
+    matrix: dict[str, dict[str, float]] = {period: {} for period in periods}
+    for period, account_id, spent in result.all():
+        matrix[period][account_id] = float(spent or 0)
+    return matrix
+
+
+async def get_month_expense_map(
+    db: AsyncSession,
+    book_id: str,
+    period: str,
+) -> dict[str, float]:
+    """获取某月各费用科目的实际支出 {account_id: 借方合计}"""
+    matrix = await get_expense_matrix(db, book_id, [period])
+    return matrix[period]
+
+
+def rollup_expense(
+    expense_map: dict[str, float], chart: dict[str, AccountMeta]
+) -> dict[str, float]:
+    """把子科目支出逐级累加到所有上级科目，父科目预算包含其子科目的支出"""
+    rolled: dict[str, float] = {}
+    for account_id, amount in expense_map.items():
+        current: str | None = account_id
+        while current:
+            rolled[current] = rolled.get(current, 0.0) + amount
+            meta = chart.get(current)
+            current = meta.parent_id if meta else None
+    return rolled
 
-    result = await db.execute(stmt)
-    return float(result.scalar() or 0)
+
+@dataclass
+class MonthSpend:
+    """当月支出：按科目（已含子科目）及全部费用合计"""
+    by_account: dict[str, float]
+    total: float
+    chart: dict[str, AccountMeta]
+
+    def used(self, account_id: str | None) -> float:
+        if account_id is None:
+            return self.total
+        return self.by_account.get(account_id, 0.0)
+
+
+async def get_month_spend(db: AsyncSession, book_id: str) -> MonthSpend:
+    """预算总览、列表和记账后检查共用的当月支出汇总（一次计数器查询）"""
+    expense_map = await get_month_expense_map(db, book_id, _current_period())
+    chart = await get_chart_snapshot(db, book_id)
+    return MonthSpend(
+        by_account=rollup_expense(expense_map, chart),
+        total=sum(expense_map.values()),
+        chart=chart,
+    )
 
 
 def _calc_status(usage_rate: float, threshold: float) -> str:
@@ -68,10 +124,15 @@ def _calc_status(usage_rate: float, threshold: float) -> str:
 async def get_budget_with_usage(
     db: AsyncSession,
     budget: Budget,
+    spend: MonthSpend | None = None,
 ) -> BudgetResponse:
-    """获取预算当前状态（使用额、使用率、剩余、状态标识）"""
-    first, end = _current_month_range()
-    used = await get_month_expense(db, budget.book_id, budget.account_id, first, end)
+    """获取预算当前状态（使用额、使用率、剩余、状态标识）
+
+    批量展示多个预算时传入同一个 spend，避免每个预算各查一次。
+    """
+    if spend is None:
+        spend = await get_month_spend(db, budget.book_id)
+    used = spend.used(budget.account_id)
     amount = float(budget.amount)
     threshold = float(budget.alert_threshold)
     usage_rate = used / amount if amount > 0 else 0
@@ -81,11 +142,8 @@ async def get_budget_with_usage(
     account_name = None
     if budget.account:
         account_name = budget.account.name
-    elif budget.account_id:
-        result = await db.execute(
-            select(Account.name).where(Account.id == budget.account_id)
-        )
-        account_name = result.scalar()
+    elif budget.account_id and budget.account_id in spend.chart:
+        account_name = spend.chart[budget.account_id].name
 
     return BudgetResponse(
         id=budget.id,
@@ -118,18 +176,18 @@ async def get_overview(
     )
     budgets = list(result.scalars().all())
 
+    spend = await get_month_spend(db, book_id)
     total_budget_obj = None
     category_budgets: list[BudgetResponse] = []
 
     for b in budgets:
-        resp = await get_budget_with_usage(db, b)
+        resp = await get_budget_with_usage(db, b, spend)
         if b.account_id is None:
             total_budget_obj = resp
         else:
             category_budgets.append(resp)
 
-    first, end = _current_month_range()
-    total_used = await get_month_expense(db, book_id, None, first, end)
+    total_used = spend.total
 
     total_budget_amount = total_budget_obj.amount if total_budget_obj else None
     total_usage_rate = None
@@ -156,26 +214,36 @@ async def check_budget_after_expense(
 ) -> BudgetCheckResult:
     """
     记账后预算检查。
-    查找该科目相关的预算（分类预算 + 总预算），
+    查找该科目及其上级科目的分类预算和总预算，
     如果使用率 >= 阈值或超 100%，触发提醒。
     """
-    first, end = _current_month_range()
+    spend = await get_month_spend(db, book_id)
     alerts: list[BudgetAlert] = []
 
+    # 该科目及其各级上级科目（父科目预算包含子科目支出）
+    lineage: list[str] = []
+    current: str | None = account_id
+    while current and current not in lineage:
+        lineage.append(current)
+        meta = spend.chart.get(current)
+        current = meta.parent_id if meta else None
+
     # 查找分类预算
     result = await db.execute(
         select(Budget)
         .options(selectinload(Budget.account))
         .where(
             Budget.book_id == book_id,
-            Budget.account_id == account_id,
+            Budget.account_id.in_(lineage),
             Budget.is_active == True,
         )
     )
-    category_budget = result.scalar_one_or_none()
+    category_budgets = sorted(
+        result.scalars().all(), key=lambda b: lineage.index(b.account_id)
+    )
 
-    if category_budget:
-        used = await get_month_expense(db, book_id, account_id, first, end)
+    for category_budget in category_budgets:
+        used = spend.used(category_budget.account_id)
         amount = float(category_budget.amount)
         threshold = float(category_budget.alert_threshold)
         usage_rate = used / amount if amount > 0 else 0
@@ -212,7 +280,7 @@ async def check_budget_after_expense(
     total_budget = result.scalar_one_or_none()
 
     if total_budget:
-        total_used = await get_month_expense(db, book_id, None, first, end)
+        total_used = spend.total
         amount = float(total_budget.amount)
         threshold = float(total_budget.alert_threshold)
         usage_rate = total_used / amount if amount > 0 else 0
@@ -240,3 +308,51 @@ async def check_budget_after_expense(
         triggered=len(alerts) > 0,
         alerts=alerts,
     )
+
+
+async def get_budget_history(
+    db: AsyncSession,
+    book_id: str,
+    months: int = 12,
+) -> BudgetHistoryResponse:
+    """最近 months 个月各预算的实际支出、差额与使用率（一次按月分组查询）"""
+    result = await db.execute(
+        select(Budget)
+        .options(selectinload(Budget.account))
+        .where(Budget.book_id == book_id, Budget.is_active == True)
+        .order_by(Budget.created_at)
+    )
+    budgets = list(result.scalars().all())
+
+    periods = _recent_periods(months)
+    matrix = await get_expense_matrix(db, book_id, periods)
+    chart = await get_chart_snapshot(db, book_id)
+    rolled = {period: rollup_expense(spent, chart) for period, spent in matrix.items()}
+    totals = [sum(matrix[period].values()) for period in periods]
+
+    rows: list[BudgetHistoryRow] = []
+    for b in budgets:
+        amount = float(b.amount)
+        threshold = float(b.alert_threshold)
+        if b.account_id is None:
+            actual = totals
+        else:
+            actual = [rolled[period].get(b.account_id, 0.0) for period in periods]
+        rates = [used / amount if amount > 0 else 0 for used in actual]
+        rows.append(BudgetHistoryRow(
+            budget_id=b.id,
+            account_id=b.account_id,
+            account_name=b.account.name if b.account else None,
+            amount=amount,
+            alert_threshold=threshold,
+            actual=[round(used, 2) for used in actual],
+            variance=[round(amount - used, 2) for used in actual],
+            usage_rate=[round(rate, 4) for rate in rates],
+            status=[_calc_status(rate, threshold) for rate in rates],
+        ))
+
+    return BudgetHistoryResponse(
+        periods=periods,
+        total_expense=[round(total, 2) for total in totals],
+        rows=rows,
+    )
@@ -1,15 +1,25 @@
 """折旧计算引擎 — 按月/按日直线法、处置"""
 
-from datetime import date
+import logging
+import re
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import Any
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.models.asset import FixedAsset
+from app.models.asset import FixedAsset, DepreciationRecord
 from app.models.account import Account
 from app.models.journal import JournalEntry, JournalLine
+from app.services import ledger_service
+
+logger = logging.getLogger(__name__)
 
 
 class AssetError(Exception):
@@ -108,13 +118,11 @@ async def depreciate_one_period(
     if not can_depreciate(asset):
         raise AssetError("该资产无法继续折旧（已达上限或已处置或折旧方式为 none）")
 
-    # 检查是否已有该期折旧分录（防重复）
+    # 检查是否已有该期折旧（防重复，走 (asset_id, period_label) 唯一索引）
     existing = await db.execute(
-        select(JournalEntry).where(
-            JournalEntry.book_id == asset.book_id,
-            JournalEntry.entry_type == "depreciation",
-            JournalEntry.description.contains(asset.id),
-            JournalEntry.description.contains(period_label),
+        select(DepreciationRecord.id).where(
+            DepreciationRecord.asset_id == asset.id,
+            DepreciationRecord.period_label == period_label,
         )
     )
     if existing.scalar_one_or_none():
@@ -158,6 +166,16 @@ async def depreciate_one_period(
     )
     entry.lines = [line_debit, line_credit]
     db.add(entry)
+    await db.flush()
+    await ledger_service.apply_entry(db, entry)
+    db.add(DepreciationRecord(
+        book_id=asset.book_id,
+        asset_id=asset.id,
+        period_label=period_label,
+        entry_id=entry.id,
+        entry_date=entry.entry_date,
+        amount=actual_dep_decimal,
+    ))
 
     # 更新资产累计折旧
     asset.accumulated_depreciation = float(
@@ -204,6 +222,424 @@ async def depreciate_all_active(
     return entries
 
 
+# ─────────────────────── 批量计提（跨账本） ───────────────────────
+
+_IN_CHUNK_SIZE = 500
+
+_ASSET_COLUMNS = (
+    FixedAsset.id,
+    FixedAsset.book_id,
+    FixedAsset.name,
+    FixedAsset.status,
+    FixedAsset.purchase_date,
+    FixedAsset.original_cost,
+    FixedAsset.residual_rate,
+    FixedAsset.useful_life_months,
+    FixedAsset.depreciation_method,
+    FixedAsset.depreciation_granularity,
+    FixedAsset.accumulated_depreciation,
+)
+
+
+@dataclass
+class BulkDepreciationResult:
+    period_label: str
+    granularity: str
+    created: int = 0
+    total_amount: float = 0.0
+    failed_books: dict[str, str] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)  # 各阶段耗时（秒）
+
+
+@dataclass
+class _Pending:
+    """待写入的一期折旧"""
+    asset: Any  # FixedAsset 的列投影行
+    period_label: str
+    entry_date: date
+    amount: Decimal
+
+
+def _chunks(values: list[str]):
+    for i in range(0, len(values), _IN_CHUNK_SIZE):
+        yield values[i:i + _IN_CHUNK_SIZE]
+
+
+async def _resolve_dep_accounts(
+    db: AsyncSession, book_ids: set[str]
+) -> dict[tuple[str, str], str]:
+    """一次（分块）查询各账本的折旧费用(5014) / 累计折旧(1502) 科目"""
+    accounts: dict[tuple[str, str], str] = {}
+    for chunk in _chunks(sorted(book_ids)):
+        rows = await db.execute(
+            select(Account.book_id, Account.code, Account.id).where(
+                Account.book_id.in_(chunk),
+                Account.code.in_(("5014", "1502")),
+                Account.is_active == True,
+            )
+        )
+        accounts.update({(book_id, code): acc_id for book_id, code, acc_id in rows.all()})
+    return accounts
+
+
+async def _write_book_batch(
+    db: AsyncSession,
+    book_id: str,
+    items: list[_Pending],
+    expense_id: str,
+    acc_dep_id: str,
+    user_id: str,
+) -> Decimal:
+    """在一个 SAVEPOINT 内批量写入某账本的折旧分录、分录行、台账并更新累计折旧"""
+    now = datetime.utcnow()
+    entry_rows, line_rows, record_rows = [], [], []
+    accumulated: dict[str, Decimal] = {}
+    deltas: dict[tuple[str, date], tuple[Decimal, Decimal]] = {}
+    book_total = Decimal("0")
+
+    for i, item in enumerate(items):
+        asset = item.asset
+        entry_id = str(uuid.uuid4())
+        created_at = now + timedelta(microseconds=i)
+        entry_rows.append({
+            "id": entry_id,
+            "book_id": book_id,
+            "user_id": user_id,
+            "entry_date": item.entry_date,
+            "entry_type": "depreciation",
+            "description": f"折旧 - {asset.name} [{asset.id}] {item.period_label}",
+            "is_balanced": True,
+            "reconciliation_status": "none",
+            "source": "manual",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        line_rows.append({
+            "id": str(uuid.uuid4()),
+            "entry_id": entry_id,
+            "account_id": expense_id,
+            "debit_amount": item.amount,
+            "credit_amount": Decimal("0"),
+            "description": f"{asset.name} 折旧",
+        })
+        line_rows.append({
+            "id": str(uuid.uuid4()),
+            "entry_id": entry_id,
+            "account_id": acc_dep_id,
+            "debit_amount": Decimal("0"),
+            "credit_amount": item.amount,
+            "description": f"{asset.name} 累计折旧",
+        })
+        record_rows.append({
+            "id": str(uuid.uuid4()),
+            "book_id": book_id,
+            "asset_id": asset.id,
+            "period_label": item.period_label,
+            "entry_id": entry_id,
+            "entry_date": item.entry_date,
+            "amount": item.amount,
+            "created_at": created_at,
+        })
+        accumulated[asset.id] = accumulated.get(
+            asset.id, Decimal(str(asset.accumulated_depreciation))
+        ) + item.amount
+        debit, _ = deltas.get((expense_id, item.entry_date), (Decimal("0"), Decimal("0")))
+        deltas[(expense_id, item.entry_date)] = (debit + item.amount, Decimal("0"))
+        _, credit = deltas.get((acc_dep_id, item.entry_date), (Decimal("0"), Decimal("0")))
+        deltas[(acc_dep_id, item.entry_date)] = (Decimal("0"), credit + item.amount)
+        book_total += item.amount
+
+    async with db.begin_nested():
+        await db.execute(insert(JournalEntry), entry_rows)
+        await db.execute(insert(JournalLine), line_rows)
+        await db.execute(insert(DepreciationRecord), record_rows)
+        await db.execute(
+            update(FixedAsset),
+            [{"id": asset_id, "accumulated_depreciation": value}
+             for asset_id, value in accumulated.items()],
+        )
+        await ledger_service.apply_deltas(db, book_id, deltas)
+    return book_total
+
+
+def _group_by_book(pending: list[_Pending]) -> dict[str, list[_Pending]]:
+    per_book: dict[str, list[_Pending]] = defaultdict(list)
+    for item in pending:
+        per_book[item.asset.book_id].append(item)
+    return per_book
+
+
+async def _write_batches(
+    db: AsyncSession,
+    per_book: dict[str, list[_Pending]],
+    accounts: dict[tuple[str, str], str],
+    user_id: str,
+    failed_books: dict[str, str],
+    tag: str,
+) -> tuple[int, Decimal]:
+    """按账本写入，单个账本失败记入 failed_books 后继续；返回 (分录数, 合计金额)"""
+    created = 0
+    total = Decimal("0")
+    for book_id, items in per_book.items():
+        expense_id = accounts.get((book_id, "5014"))
+        acc_dep_id = accounts.get((book_id, "1502"))
+        if not expense_id or not acc_dep_id:
+            failed_books[book_id] = "找不到折旧费用科目(5014)或累计折旧科目(1502)"
+            continue
+        try:
+            total += await _write_book_batch(
+                db, book_id, items, expense_id, acc_dep_id, user_id
+            )
+        except Exception as e:
+            logger.error(f"[{tag}] 账本 {book_id} 失败: {e}")
+            failed_books[book_id] = str(e)
+            continue
+        created += len(items)
+    return created, total
+
+
+async def depreciate_bulk(
+    db: AsyncSession,
+    period_label: str,
+    granularity: str,
+    user_id: str = "system",
+    book_ids: list[str] | None = None,
+    entry_date: date | None = None,
+) -> BulkDepreciationResult:
+    """
+    跨账本批量计提一期折旧（定时任务使用）。
+
+    与逐个调用 depreciate_one_period 结果一致，但按集合处理：
+    一次查询加载全部待计提资产（已计提该期的资产经折旧台账唯一索引排除），
+    一次查询解析各账本的 5014/1502 科目，内存中计算折旧额，
+    再按账本批量写入分录、分录行、台账并批量更新累计折旧。
+    每个账本在独立的 SAVEPOINT 中写入，单个账本失败不影响其他账本。
+    """
+    result = BulkDepreciationResult(period_label=period_label, granularity=granularity)
+    entry_date = entry_date or date.today()
+    started = time.perf_counter()
+
+    # 1. 待计提资产
+    already_done = (
+        select(DepreciationRecord.id)
+        .where(
+            DepreciationRecord.asset_id == FixedAsset.id,
+            DepreciationRecord.period_label == period_label,
+        )
+        .exists()
+    )
+    stmt = select(*_ASSET_COLUMNS).where(
+        FixedAsset.status == "active",
+        FixedAsset.depreciation_method == "straight_line",
+        func.coalesce(FixedAsset.depreciation_granularity, "monthly") == granularity,
+        ~already_done,
+    )
+    if book_ids is not None:
+        stmt = stmt.where(FixedAsset.book_id.in_(book_ids))
+    assets = (await db.execute(stmt)).all()
+    result.timings["load_assets"] = time.perf_counter() - started
+
+    # 2. 内存中计算折旧额
+    phase = time.perf_counter()
+    pending: list[_Pending] = []
+    for asset in assets:
+        if not can_depreciate(asset):
+            continue
+        remaining = get_max_depreciation(asset) - float(asset.accumulated_depreciation)
+        amount = min(calculate_period_depreciation(asset), remaining)
+        if amount <= 0:
+            continue
+        pending.append(_Pending(asset, period_label, entry_date, Decimal(str(amount))))
+    result.timings["compute"] = time.perf_counter() - phase
+
+    # 3. 解析科目，按账本批量写入
+    phase = time.perf_counter()
+    per_book = _group_by_book(pending)
+    accounts = await _resolve_dep_accounts(db, set(per_book))
+    result.timings["resolve_accounts"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    created, total = await _write_batches(
+        db, per_book, accounts, user_id, result.failed_books, "批量折旧"
+    )
+    result.created = created
+    result.total_amount = float(total)
+    result.timings["write"] = time.perf_counter() - phase
+    result.timings["total"] = time.perf_counter() - started
+    return result
+
+
+# ─────────────────────── 补提（追溯缺失期间） ───────────────────────
+
+
+@dataclass
+class CatchUpResult:
+    through: date
+    created: int = 0
+    assets: int = 0
+    total_amount: float = 0.0
+    failed_books: dict[str, str] = field(default_factory=dict)
+    # 累计折旧与台账对不上、无法确定哪些期间已计提的资产 {asset_id: 原因}，不做补提
+    skipped_assets: dict[str, str] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+def _month_end(year: int, month: int) -> date:
+    if month == 12:
+        return date(year, 12, 31)
+    return date(year, month + 1, 1) - timedelta(days=1)
+
+
+def iter_periods(asset, through: date):
+    """
+    资产从购置起至 through 为止已结束的全部期间 (period_label, 期末日期)。
+    monthly 从购置当月起、期末为月末；daily 从购置当日起逐日。
+    """
+    start = asset.purchase_date
+    if (asset.depreciation_granularity or "monthly") == "daily":
+        day = start
+        while day <= through:
+            yield day.strftime("%Y-%m-%d"), day
+            day += timedelta(days=1)
+        return
+
+    year, month = start.year, start.month
+    while True:
+        end = _month_end(year, month)
+        if end > through:
+            return
+        yield f"{year:04d}-{month:02d}", end
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+_PERIOD_LABEL_PATTERNS = {
+    "monthly": re.compile(r"\d{4}-\d{2}"),
+    "daily": re.compile(r"\d{4}-\d{2}-\d{2}"),
+}
+
+
+def _is_period_label(asset, label: str) -> bool:
+    """label 是否为 iter_periods 会生成的标准期间标签（格式匹配且不早于购置期间）"""
+    granularity = asset.depreciation_granularity or "monthly"
+    if not _PERIOD_LABEL_PATTERNS[granularity].fullmatch(label):
+        return False
+    first = asset.purchase_date.strftime("%Y-%m-%d" if granularity == "daily" else "%Y-%m")
+    return label >= first
+
+
+def _reconcile_unposted(
+    asset, periods: list[tuple[str, date]], records: dict[str, Decimal], period_dep: Decimal
+) -> tuple[list[tuple[str, date]], str | None]:
+    """
+    用累计折旧核对台账，返回 (真正需要补提的期间, 无法核对时的原因)。
+
+    累计折旧中不能归属到标准期间台账的部分（旧版自由格式期间标签、迁移前的历史折旧、
+    建账时录入的期初累计折旧等）视为已覆盖最早的若干未计提期间；
+    该部分不是整期折旧额的倍数或为负时无法确定已计提到哪一期，拒绝补提。
+    """
+    posted = sum(
+        (amount for label, amount in records.items() if _is_period_label(asset, label)),
+        Decimal("0"),
+    )
+    legacy = (Decimal(str(asset.accumulated_depreciation)) - posted).quantize(Decimal("0.01"))
+    tolerance = Decimal("0.01")
+    if legacy < -tolerance:
+        return [], f"折旧台账合计 {posted} 超过累计折旧 {asset.accumulated_depreciation}"
+
+    unposted = [p for p in periods if p[0] not in records]
+    covered = 0
+    while covered < len(unposted) and legacy >= period_dep - tolerance:
+        legacy -= period_dep
+        covered += 1
+    if covered < len(unposted) and abs(legacy) > tolerance:
+        return [], (
+            f"累计折旧中有 {legacy} 未记入折旧台账且不足整期（每期 {period_dep}），"
+            "无法确定已计提期间"
+        )
+    return unposted[covered:], None
+
+
+async def depreciate_catch_up(
+    db: AsyncSession,
+    through: date,
+    user_id: str = "system",
+    book_ids: list[str] | None = None,
+) -> CatchUpResult:
+    """
+    补提截至 through 的全部缺失期间（定时任务停摆后恢复用）。
+
+    已计提的期间按折旧台账跳过，可重复执行；每期分录日期为该期期末，
+    逐期累加直到达到可折旧总额。写入方式与 depreciate_bulk 相同。
+    累计折旧中未记入台账的部分按 _reconcile_unposted 抵扣最早的期间，
+    对不上的资产记入 skipped_assets，不做补提。
+    """
+    result = CatchUpResult(through=through)
+    started = time.perf_counter()
+
+    stmt = select(*_ASSET_COLUMNS).where(
+        FixedAsset.status == "active",
+        FixedAsset.depreciation_method == "straight_line",
+        FixedAsset.purchase_date <= through,
+    )
+    if book_ids is not None:
+        stmt = stmt.where(FixedAsset.book_id.in_(book_ids))
+    assets = [a for a in (await db.execute(stmt)).all() if can_depreciate(a)]
+
+    records: dict[str, dict[str, Decimal]] = defaultdict(dict)
+    for chunk in _chunks([a.id for a in assets]):
+        rows = await db.execute(
+            select(
+                DepreciationRecord.asset_id,
+                DepreciationRecord.period_label,
+                DepreciationRecord.amount,
+            ).where(DepreciationRecord.asset_id.in_(chunk))
+        )
+        for asset_id, label, amount in rows.all():
+            records[asset_id][label] = Decimal(str(amount))
+    result.timings["load_assets"] = time.perf_counter() - started
+
+    phase = time.perf_counter()
+    pending: list[_Pending] = []
+    for asset in assets:
+        period_dep = Decimal(str(calculate_period_depreciation(asset)))
+        remaining = Decimal(str(get_max_depreciation(asset))) - Decimal(
+            str(asset.accumulated_depreciation)
+        )
+        periods, reason = _reconcile_unposted(
+            asset, list(iter_periods(asset, through)), records.get(asset.id, {}), period_dep
+        )
+        if reason:
+            result.skipped_assets[asset.id] = reason
+            continue
+        touched = False
+        for label, period_end in periods:
+            if remaining <= 0:
+                break
+            amount = min(period_dep, remaining).quantize(Decimal("0.01"))
+            if amount <= 0:
+                break
+            pending.append(_Pending(asset, label, period_end, amount))
+            remaining -= amount
+            touched = True
+        result.assets += touched
+    result.timings["compute"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    per_book = _group_by_book(pending)
+    accounts = await _resolve_dep_accounts(db, set(per_book))
+    result.timings["resolve_accounts"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    created, total = await _write_batches(
+        db, per_book, accounts, user_id, result.failed_books, "折旧补提"
+    )
+    result.created = created
+    result.total_amount = float(total)
+    result.timings["write"] = time.perf_counter() - phase
+    result.timings["total"] = time.perf_counter() - started
+    return result
+
+
 # ─────────────────────── 处置资产 ───────────────────────
 
 
@@ -308,6 +744,7 @@ async def dispose_asset(
 
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
 
     # 更新资产状态
     asset.status = "disposed"
@@ -335,43 +772,24 @@ async def get_asset_with_account(
 async def get_depreciation_history(
     db: AsyncSession, asset_id: str
 ) -> list[dict]:
-    """获取折旧历史（从分录表中查询 depreciation 类型且包含 asset_id 的记录）"""
+    """获取折旧历史（按资产查折旧台账，按时间正序累计）"""
     result = await db.execute(
-        select(JournalEntry)
-        .options(selectinload(JournalEntry.lines))
-        .where(
-            JournalEntry.entry_type == "depreciation",
-            JournalEntry.description.contains(asset_id),
-        )
-        .order_by(JournalEntry.entry_date.desc())
+        select(DepreciationRecord)
+        .where(DepreciationRecord.asset_id == asset_id)
+        .order_by(DepreciationRecord.entry_date, DepreciationRecord.created_at)
     )
-    entries = list(result.scalars().all())
 
     history = []
-    # 计算累计值 — 按时间正序
-    entries_asc = sorted(entries, key=lambda e: e.entry_date)
     running_accumulated = Decimal("0")
-
-    for entry in entries_asc:
-        # 从 description 中提取 period_label
-        desc = entry.description or ""
-        period = desc.rsplit(" ", 1)[-1] if " " in desc else str(entry.entry_date)
-
-        # 折旧额 = 该分录中折旧费用科目的借方金额
-        dep_amount = Decimal("0")
-        for line in entry.lines:
-            if line.debit_amount > 0:
-                dep_amount = Decimal(str(line.debit_amount))
-                break
-
+    for record in result.scalars().all():
+        dep_amount = Decimal(str(record.amount))
         running_accumulated += dep_amount
-
         history.append({
-            "period": period,
+            "period": record.period_label,
             "amount": float(dep_amount),
             "accumulated": float(running_accumulated),
             "net_value": 0.0,  # 需要在调用方补充
-            "entry_id": entry.id,
+            "entry_id": record.entry_id,
         })
 
     return history
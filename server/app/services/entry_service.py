@@ -1,16 +1,21 @@
 """核心记账逻辑 — 根据 entry_type 自动生成复式分录"""
 
-from datetime import date
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
 from decimal import Decimal
 
 from fastapi import HTTPException
-from sqlalchemy import select, func, and_, delete
+from sqlalchemy import select, func, and_, or_, delete, distinct, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.journal import JournalEntry, JournalLine
-from app.models.account import Account
-from app.models.asset import FixedAsset
+from app.models.asset import FixedAsset, DepreciationRecord
+from app.models.sync import ExternalTransaction
+from app.services import ledger_service
+from app.services.account_service import AccountMeta, get_chart_snapshot
 
 
 class EntryError(Exception):
@@ -21,44 +26,19 @@ class EntryError(Exception):
 
 # ─────────────────────── helpers ───────────────────────
 
-async def _check_is_leaf(db: AsyncSession, account_id: str) -> bool:
-    """检查科目是否为叶子节点（无活跃子科目）"""
-    child_count_result = await db.execute(
-        select(func.count()).select_from(Account).where(
-            Account.parent_id == account_id,
-            Account.is_active == True,
-        )
-    )
-    return child_count_result.scalar() == 0
-
-
 async def _get_account(
     db: AsyncSession, account_id: str, book_id: str, require_leaf: bool = True,
-) -> Account:
-    """获取科目并校验归属，默认要求必须为叶子节点"""
-    result = await db.execute(
-        select(Account).where(
-            Account.id == account_id,
-            Account.book_id == book_id,
-            Account.is_active == True,
-        )
-    )
-    acc = result.scalar_one_or_none()
-    if not acc:
+) -> AccountMeta:
+    """获取科目并校验归属，默认要求必须为叶子节点（基于本事务的科目表快照）"""
+    chart = await get_chart_snapshot(db, book_id)
+    acc = chart.get(account_id)
+    if not acc or not acc.is_active:
         raise EntryError(f"科目不存在或已停用: {account_id}", 404)
 
-    if require_leaf and not await _check_is_leaf(db, acc.id):
-        # 查询子科目数量用于提示
-        child_count_result = await db.execute(
-            select(func.count()).select_from(Account).where(
-                Account.parent_id == acc.id,
-                Account.is_active == True,
-            )
-        )
-        child_count = child_count_result.scalar()
+    if require_leaf and not acc.is_leaf:
         raise EntryError(
             f"科目「{acc.name}」（{acc.code}）为非末级科目，"
-            f"含 {child_count} 个子科目，请选择其下的末级科目记账"
+            f"含 {acc.child_count} 个子科目，请选择其下的末级科目记账"
         )
 
     return acc
@@ -240,6 +220,7 @@ async def create_expense(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
     return entry
@@ -272,6 +253,7 @@ async def create_income(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
     return entry
@@ -336,6 +318,7 @@ async def create_asset_purchase(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
 
@@ -412,6 +395,7 @@ async def create_borrow(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
 
@@ -471,6 +455,7 @@ async def create_repayment(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
     return entry
@@ -503,6 +488,7 @@ async def create_transfer(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
     return entry
@@ -530,6 +516,7 @@ async def create_manual_entry(
     _check_balance(lines)
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
     await db.flush()
     await db.refresh(entry)
     return entry
@@ -549,55 +536,170 @@ async def get_entry_detail(
     return result.scalar_one_or_none()
 
 
-async def get_entries_paginated(
-    db: AsyncSession,
+# ─────────────────────── 分录列表（游标分页） ───────────────────────
+
+# 列表排序键 (entry_date, created_at, id) 倒序；id 保证同一时刻创建的分录顺序稳定
+_LIST_ORDER = (
+    JournalEntry.entry_date.desc(),
+    JournalEntry.created_at.desc(),
+    JournalEntry.id.desc(),
+)
+
+# 筛选条件 → (账务版本号, 总数)；版本号持久化在数据库，其他进程提交后同样失效，见 ledger_service
+_COUNT_CACHE_SIZE = 512
+_count_cache: OrderedDict[tuple, tuple[int, int]] = OrderedDict()
+
+
+def encode_entry_cursor(entry: JournalEntry) -> str:
+    """由列表最后一条分录生成不透明游标"""
+    raw = json.dumps(
+        [entry.entry_date.isoformat(), entry.created_at.isoformat(), entry.id]
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_entry_cursor(cursor: str) -> tuple[date, datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        entry_date, created_at, entry_id = json.loads(raw)
+        return (
+            date.fromisoformat(entry_date),
+            datetime.fromisoformat(created_at),
+            str(entry_id),
+        )
+    except (ValueError, TypeError):
+        raise EntryError("无效的分页游标")
+
+
+def entry_cursor_condition(cursor: str):
+    """游标之后（按 _LIST_ORDER 倒序）的分录条件"""
+    last_date, last_created, last_id = decode_entry_cursor(cursor)
+    return or_(
+        JournalEntry.entry_date < last_date,
+        and_(
+            JournalEntry.entry_date == last_date,
+            or_(
+                JournalEntry.created_at < last_created,
+                and_(
+                    JournalEntry.created_at == last_created,
+                    JournalEntry.id < last_id,
+                ),
+            ),
+        ),
+    )
+
+
+def _entry_filters(
     book_id: str,
-    page: int = 1,
-    page_size: int = 20,
-    entry_type: str | None = None,
-    start_date: date | None = None,
-    end_date: date | None = None,
-    account_id: str | None = None,
-) -> tuple[list[JournalEntry], int]:
-    """分录列表（分页 + 筛选）"""
+    entry_type: str | None,
+    start_date: date | None,
+    end_date: date | None,
+) -> list:
     conditions = [JournalEntry.book_id == book_id]
-
     if entry_type:
         conditions.append(JournalEntry.entry_type == entry_type)
     if start_date:
         conditions.append(JournalEntry.entry_date >= start_date)
     if end_date:
         conditions.append(JournalEntry.entry_date <= end_date)
+    return conditions
 
-    # 按科目筛选：找包含该科目的分录
-    if account_id:
-        sub = (
-            select(JournalLine.entry_id)
-            .where(JournalLine.account_id == account_id)
-            .subquery()
-        )
-        conditions.append(JournalEntry.id.in_(select(sub.c.entry_id)))
 
-    where_clause = and_(*conditions)
+def _join_account(stmt, account_id: str):
+    """按科目筛选：经 ix_journal_lines_account_entry 连接分录行"""
+    return stmt.join(
+        JournalLine,
+        and_(
+            JournalLine.account_id == account_id,
+            JournalLine.entry_id == JournalEntry.id,
+        ),
+    )
+
 
-    # 总数
-    count_result = await db.execute(
-        select(func.count()).select_from(JournalEntry).where(where_clause)
+async def count_entries(
+    db: AsyncSession,
+    book_id: str,
+    entry_type: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    account_id: str | None = None,
+) -> int:
+    """筛选后的分录总数，按账务版本号缓存，账本未变动时不重复 COUNT"""
+    key = (book_id, entry_type, start_date, end_date, account_id)
+    # 先取版本号再查询：查询期间有提交时，缓存的旧版本号会在下次读取时失效
+    version = await ledger_service.get_ledger_version(db, book_id)
+    cached = _count_cache.get(key)
+    if cached is not None and cached[0] == version:
+        _count_cache.move_to_end(key)
+        return cached[1]
+
+    stmt = (
+        select(func.count(distinct(JournalEntry.id)))
+        .select_from(JournalEntry)
+        .where(*_entry_filters(book_id, entry_type, start_date, end_date))
     )
-    total = count_result.scalar() or 0
+    if account_id:
+        stmt = _join_account(stmt, account_id)
+    total = (await db.execute(stmt)).scalar() or 0
 
-    # 数据（预加载 lines + account 以计算净资产影响）
-    result = await db.execute(
+    _count_cache[key] = (version, total)
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > _COUNT_CACHE_SIZE:
+        _count_cache.popitem(last=False)
+    return total
+
+
+async def get_entries_paginated(
+    db: AsyncSession,
+    book_id: str,
+    page: int = 1,
+    page_size: int = 20,
+    entry_type: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    account_id: str | None = None,
+    cursor: str | None = None,
+    with_total: bool = True,
+) -> tuple[list[JournalEntry], int | None, str | None]:
+    """
+    分录列表（分页 + 筛选），返回 (分录, 总数, 下一页游标)。
+
+    传入 cursor 时按 (entry_date, created_at, id) 键集翻页，忽略 page，
+    翻得再深也只扫描一页数据；否则按页码 OFFSET 分页（兼容旧客户端）。
+    with_total=False 时不统计总数，返回 None。
+    """
+    conditions = _entry_filters(book_id, entry_type, start_date, end_date)
+    if cursor:
+        conditions.append(entry_cursor_condition(cursor))
+
+    # 数据（预加载 lines + account 以计算净资产影响）；多取一条判断是否还有下一页
+    stmt = (
         select(JournalEntry)
         .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
-        .where(where_clause)
-        .order_by(JournalEntry.entry_date.desc(), JournalEntry.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+        .where(*conditions)
+        .order_by(*_LIST_ORDER)
+        .limit(page_size + 1)
     )
+    if account_id:
+        # 同一分录可能有多行使用该科目
+        stmt = _join_account(stmt, account_id).distinct()
+    if not cursor:
+        stmt = stmt.offset((page - 1) * page_size)
+    result = await db.execute(stmt)
     entries = list(result.scalars().all())
 
-    return entries, total
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_cursor = encode_entry_cursor(entries[-1])
+
+    total = None
+    if with_total:
+        total = await count_entries(
+            db, book_id, entry_type, start_date, end_date, account_id
+        )
+
+    return entries, total, next_cursor
 
 
 def _has_business_fields(body) -> bool:
@@ -687,6 +789,20 @@ async def _rebuild_lines(
         raise EntryError(f"不支持的分录类型: {etype}")
 
 
+async def _release_external_matches(
+    db: AsyncSession, entry_id: str, statuses: tuple[str, ...] = ("matched",)
+) -> None:
+    """分录行重建或删除后，原先配对到该分录的外部交易恢复为未匹配，下次匹配时重新配对"""
+    await db.execute(
+        update(ExternalTransaction)
+        .where(
+            ExternalTransaction.matched_entry_id == entry_id,
+            ExternalTransaction.match_status.in_(statuses),
+        )
+        .values(matched_entry_id=None, matched_line_id=None, match_status="unmatched")
+    )
+
+
 async def update_entry(
     db: AsyncSession,
     entry: JournalEntry,
@@ -699,6 +815,12 @@ async def update_entry(
     3. 校验借贷平衡
     4. entry.id 和 created_at 不变
     """
+    # 记录旧日期和旧明细，用于冲出日发生额汇总
+    old_date = entry.entry_date
+    old_lines = [
+        _make_line(l.account_id, l.debit_amount, l.credit_amount) for l in entry.lines
+    ]
+
     # Step 1: 更新元数据
     if getattr(body, "entry_date", None) is not None:
         entry.entry_date = body.entry_date
@@ -713,6 +835,7 @@ async def update_entry(
         await db.execute(
             delete(JournalLine).where(JournalLine.entry_id == entry.id)
         )
+        await _release_external_matches(db, entry.id)
         # 清除 ORM 缓存中的旧 lines
         entry.lines.clear()
 
@@ -728,13 +851,25 @@ async def update_entry(
             db.add(line)
         entry.lines = new_lines
 
+    # Step 3: 同步日发生额汇总（日期或明细变化时）
+    ledger_service.mark_dirty(db, entry.book_id)
+    if entry.entry_date != old_date or _has_business_fields(body):
+        await ledger_service.apply_lines(db, entry.book_id, old_date, old_lines, sign=-1)
+        await ledger_service.apply_entry(db, entry)
+
     await db.flush()
     await db.refresh(entry)
     return entry
 
 
 async def delete_entry(db: AsyncSession, entry: JournalEntry) -> None:
-    """删除分录（级联删除 lines）"""
+    """删除分录（级联删除 lines；折旧分录同时移除折旧台账记录）"""
+    await ledger_service.apply_entry(db, entry, sign=-1)
+    await _release_external_matches(db, entry.id, ("matched", "reconciled"))
+    if entry.entry_type == "depreciation":
+        await db.execute(
+            delete(DepreciationRecord).where(DepreciationRecord.entry_id == entry.id)
+        )
     await db.delete(entry)
     await db.flush()
 
@@ -804,10 +939,12 @@ async def convert_entry_type(
     amount = _extract_amount_from_lines(entry.lines)
     old_accounts = _extract_account_ids_from_lines(entry.lines)
 
-    # 4. 删除原借贷明细行
+    # 4. 删除原借贷明细行（同时冲出日发生额汇总）
+    await ledger_service.apply_entry(db, entry, sign=-1)
     await db.execute(
         delete(JournalLine).where(JournalLine.entry_id == entry_id)
     )
+    await _release_external_matches(db, entry_id)
     entry.lines.clear()
 
     # 5. 确定新的科目 ID
@@ -867,6 +1004,7 @@ async def convert_entry_type(
         line.entry_id = entry.id
         db.add(line)
     entry.lines = new_lines
+    await ledger_service.apply_entry(db, entry)
 
     # 10. 更新 entry_type
     entry.entry_type = body.target_type
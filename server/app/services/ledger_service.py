@@ -0,0 +1,320 @@
+"""
+记账过账钩子：所有写入 journal_lines 的路径在同一事务内调用本模块，
+同步维护科目日发生额汇总表（account_daily_balances）和预算使用额计数器
+（budget_spend_counters），并在事务提交时递增账本的账务版本号（供报表缓存失效使用）。
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy import bindparam, select, func, delete, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.balance import AccountDailyBalance, BudgetSpendCounter, LedgerVersion
+from app.models.journal import JournalEntry, JournalLine
+
+
+# ─────────────────────── 账务版本号 ───────────────────────
+
+_DIRTY_BOOKS_KEY = "ledger_dirty_books"
+_ALL_BOOKS = "*"
+
+# 版本号持久化在 ledger_versions 表，与账务写入同一事务提交：
+# 重启后不会回退，多进程部署时各进程读到的也是同一个值
+_BUMP_VERSION = sqlite_insert(LedgerVersion).values(
+    book_id=bindparam("book_id"), version=1
+).on_conflict_do_update(
+    index_elements=["book_id"],
+    set_={"version": LedgerVersion.version + 1},
+)
+
+
+def mark_dirty(db: AsyncSession, book_id: str | None) -> None:
+    """标记本事务修改了账本的账务数据（None 表示全部账本），提交时版本号递增"""
+    db.info.setdefault(_DIRTY_BOOKS_KEY, set()).add(book_id or _ALL_BOOKS)
+
+
+async def get_ledger_version(db: AsyncSession, book_id: str) -> int:
+    """账本当前账务版本号（账本版本 + 全局版本），只增不减"""
+    result = await db.execute(
+        select(func.coalesce(func.sum(LedgerVersion.version), 0)).where(
+            LedgerVersion.book_id.in_((book_id, _ALL_BOOKS))
+        )
+    )
+    return result.scalar_one()
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions_before_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_BOOKS_KEY, None)
+    if not dirty:
+        return
+    session.execute(_BUMP_VERSION, [{"book_id": book_id} for book_id in sorted(dirty)])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_BOOKS_KEY, None)
+
+
+# ─────────────────────── 日发生额汇总 ───────────────────────
+
+
+def _to_decimal(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+async def apply_deltas(
+    db: AsyncSession,
+    book_id: str,
+    deltas: dict[tuple[str, date], tuple[Decimal, Decimal]],
+) -> None:
+    """
+    批量累加日发生额。
+    deltas: {(account_id, date): (debit, credit)}，金额可为负（冲销）。
+    """
+    mark_dirty(db, book_id)
+    await _apply_spend_deltas(db, book_id, deltas)
+    rows = [
+        {
+            "book_id": book_id,
+            "account_id": account_id,
+            "balance_date": day,
+            "debit_total": float(debit),
+            "credit_total": float(credit),
+        }
+        for (account_id, day), (debit, credit) in deltas.items()
+        if debit != 0 or credit != 0
+    ]
+    if not rows:
+        return
+
+    stmt = sqlite_insert(AccountDailyBalance)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["book_id", "account_id", "balance_date"],
+        set_={
+            "debit_total": func.round(
+                AccountDailyBalance.debit_total + stmt.excluded.debit_total, 2
+            ),
+            "credit_total": func.round(
+                AccountDailyBalance.credit_total + stmt.excluded.credit_total, 2
+            ),
+        },
+    )
+    await db.execute(stmt, rows)
+
+    # 冲销后清理归零的行，保持汇总表紧凑
+    if any(r["debit_total"] < 0 or r["credit_total"] < 0 for r in rows):
+        await db.execute(
+            delete(AccountDailyBalance).where(
+                AccountDailyBalance.book_id == book_id,
+                AccountDailyBalance.account_id.in_({r["account_id"] for r in rows}),
+                AccountDailyBalance.debit_total == 0,
+                AccountDailyBalance.credit_total == 0,
+            )
+        )
+
+
+async def apply_lines(
+    db: AsyncSession,
+    book_id: str,
+    entry_date: date,
+    lines: Iterable,
+    sign: int = 1,
+) -> None:
+    """
+    将一组分录行计入（sign=1）或冲出（sign=-1）日发生额汇总。
+    lines 中的元素需具备 account_id / debit_amount / credit_amount 属性。
+    """
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
+    )
+    for line in lines:
+        bucket = deltas[(line.account_id, entry_date)]
+        bucket[0] += _to_decimal(line.debit_amount) * sign
+        bucket[1] += _to_decimal(line.credit_amount) * sign
+    await apply_deltas(
+        db, book_id, {k: (v[0], v[1]) for k, v in deltas.items()}
+    )
+
+
+async def apply_entry(db: AsyncSession, entry: JournalEntry, sign: int = 1) -> None:
+    """按分录自身的日期和明细行计入/冲出汇总"""
+    await apply_lines(db, entry.book_id, entry.entry_date, entry.lines, sign)
+
+
+async def rebuild_daily_balances(
+    db: AsyncSession,
+    book_id: str | None = None,
+    account_ids: list[str] | None = None,
+) -> int:
+    """
+    从 journal_lines 全量重建日发生额汇总（同时重建预算使用额计数器）。
+    book_id / account_ids 为空时分别表示全部账本 / 全部科目。
+    返回重建后的日发生额汇总行数。
+    """
+    mark_dirty(db, book_id)
+    await rebuild_spend_counters(db, book_id, account_ids)
+    delete_conditions = []
+    source_conditions = []
+    if book_id:
+        delete_conditions.append(AccountDailyBalance.book_id == book_id)
+        source_conditions.append(JournalEntry.book_id == book_id)
+    if account_ids:
+        delete_conditions.append(AccountDailyBalance.account_id.in_(account_ids))
+        source_conditions.append(JournalLine.account_id.in_(account_ids))
+
+    await db.execute(delete(AccountDailyBalance).where(*delete_conditions))
+
+    source = (
+        select(
+            JournalEntry.book_id,
+            JournalLine.account_id,
+            JournalEntry.entry_date,
+            func.round(func.coalesce(func.sum(JournalLine.debit_amount), 0), 2),
+            func.round(func.coalesce(func.sum(JournalLine.credit_amount), 0), 2),
+        )
+        .join(JournalEntry, JournalEntry.id == JournalLine.entry_id)
+        .where(*source_conditions)
+        .group_by(JournalEntry.book_id, JournalLine.account_id, JournalEntry.entry_date)
+    )
+    result = await db.execute(
+        sqlite_insert(AccountDailyBalance).from_select(
+            ["book_id", "account_id", "balance_date", "debit_total", "credit_total"],
+            source,
+        )
+    )
+    return result.rowcount or 0
+
+
+# ─────────────────────── 预算使用额计数器 ───────────────────────
+# 按 (账本, 月份, 科目) 累计借方发生额，预算只取费用科目，读取时无需扫描分录。
+
+
+def spend_period(day: date) -> str:
+    """计数器期间键 YYYY-MM"""
+    return day.strftime("%Y-%m")
+
+
+def _spend_period_expr():
+    return func.strftime("%Y-%m", JournalEntry.entry_date)
+
+
+async def _apply_spend_deltas(
+    db: AsyncSession,
+    book_id: str,
+    deltas: dict[tuple[str, date], tuple[Decimal, Decimal]],
+) -> None:
+    spent: dict[tuple[str, str], Decimal] = defaultdict(Decimal)
+    for (account_id, day), (debit, _) in deltas.items():
+        if debit != 0:
+            spent[(account_id, spend_period(day))] += _to_decimal(debit)
+    rows = [
+        {"book_id": book_id, "account_id": account_id, "period": period, "spent": float(amount)}
+        for (account_id, period), amount in spent.items()
+        if amount != 0
+    ]
+    if not rows:
+        return
+
+    stmt = sqlite_insert(BudgetSpendCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["book_id", "period", "account_id"],
+        set_={"spent": func.round(BudgetSpendCounter.spent + stmt.excluded.spent, 2)},
+    )
+    await db.execute(stmt, rows)
+
+    if any(r["spent"] < 0 for r in rows):
+        await db.execute(
+            delete(BudgetSpendCounter).where(
+                BudgetSpendCounter.book_id == book_id,
+                BudgetSpendCounter.account_id.in_({r["account_id"] for r in rows}),
+                BudgetSpendCounter.spent == 0,
+            )
+        )
+
+
+def _spend_source(book_id: str | None, account_ids: list[str] | None = None):
+    """从 journal_lines 聚合 (账本, 月份, 科目) 借方合计，重建和校验共用"""
+    conditions = []
+    if book_id:
+        conditions.append(JournalEntry.book_id == book_id)
+    if account_ids:
+        conditions.append(JournalLine.account_id.in_(account_ids))
+    total = func.round(func.coalesce(func.sum(JournalLine.debit_amount), 0), 2)
+    return (
+        select(JournalEntry.book_id, _spend_period_expr(), JournalLine.account_id, total)
+        .join(JournalEntry, JournalEntry.id == JournalLine.entry_id)
+        .where(*conditions)
+        .group_by(JournalEntry.book_id, _spend_period_expr(), JournalLine.account_id)
+        .having(total != 0)
+    )
+
+
+async def rebuild_spend_counters(
+    db: AsyncSession,
+    book_id: str | None = None,
+    account_ids: list[str] | None = None,
+) -> int:
+    """从 journal_lines 重建预算使用额计数器，返回重建后的行数"""
+    mark_dirty(db, book_id)
+    conditions = []
+    if book_id:
+        conditions.append(BudgetSpendCounter.book_id == book_id)
+    if account_ids:
+        conditions.append(BudgetSpendCounter.account_id.in_(account_ids))
+    await db.execute(delete(BudgetSpendCounter).where(*conditions))
+
+    result = await db.execute(
+        sqlite_insert(BudgetSpendCounter).from_select(
+            ["book_id", "period", "account_id", "spent"],
+            _spend_source(book_id, account_ids),
+        )
+    )
+    return result.rowcount or 0
+
+
+@dataclass
+class SpendCounterDrift:
+    book_id: str
+    period: str
+    account_id: str
+    counter: Decimal
+    ledger: Decimal
+
+
+async def verify_spend_counters(
+    db: AsyncSession, book_id: str | None = None
+) -> list[SpendCounterDrift]:
+    """将计数器与 journal_lines 实际发生额逐项比对，返回不一致的项"""
+    cent = Decimal("0.01")
+    ledger = {
+        (row[0], row[1], row[2]): _to_decimal(row[3]).quantize(cent)
+        for row in (await db.execute(_spend_source(book_id))).all()
+    }
+    stmt = select(
+        BudgetSpendCounter.book_id,
+        BudgetSpendCounter.period,
+        BudgetSpendCounter.account_id,
+        BudgetSpendCounter.spent,
+    )
+    if book_id:
+        stmt = stmt.where(BudgetSpendCounter.book_id == book_id)
+    counters = {
+        (row[0], row[1], row[2]): _to_decimal(row[3]).quantize(cent)
+        for row in (await db.execute(stmt)).all()
+    }
+
+    drifts = []
+    zero = Decimal("0.00")
+    for key in sorted(ledger.keys() | counters.keys()):
+        expected = ledger.get(key, zero)
+        actual = counters.get(key, zero)
+        if expected != actual:
+            drifts.append(SpendCounterDrift(*key, counter=actual, ledger=expected))
+    return drifts
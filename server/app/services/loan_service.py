@@ -1,5 +1,6 @@
 """贷款计算引擎 — 等额本息/等额本金、还款计划、记录还款"""
 
+from bisect import bisect_right
 from datetime import date, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from dateutil.relativedelta import relativedelta
@@ -11,6 +12,14 @@ from sqlalchemy.orm import selectinload
 from app.models.loan import Loan
 from app.models.account import Account
 from app.models.journal import JournalEntry, JournalLine
+from app.schemas.loan import (
+    LoanScenario,
+    LoanScenarioResult,
+    LoanSimulateResponse,
+    LoanSimulationPlan,
+    ScenarioScheduleDelta,
+)
+from app.services import amortization, ledger_service
 
 
 class LoanError(Exception):
@@ -55,7 +64,24 @@ def generate_schedule(
     repaid_months: int = 0,
     remaining_principal: float | None = None,
 ) -> list[dict]:
-    """生成完整还款计划表"""
+    """生成完整还款计划表（整分条款走缓存的摊还表，否则逐期 Decimal 计算）"""
+    table = amortization.table_for(principal, annual_rate, total_months, repayment_method, start_date)
+    if table is not None:
+        return table.rows(repaid_months)
+    return _generate_schedule_decimal(
+        principal, annual_rate, total_months, repayment_method, start_date, repaid_months
+    )
+
+
+def _generate_schedule_decimal(
+    principal: float,
+    annual_rate: float,
+    total_months: int,
+    repayment_method: str,
+    start_date: date,
+    repaid_months: int = 0,
+) -> list[dict]:
+    """逐期 Decimal 计算还款计划（摊还表的参照实现）"""
     r = Decimal(str(annual_rate)) / Decimal("1200")
     p = Decimal(str(principal))
     n = total_months
@@ -118,10 +144,29 @@ def generate_schedule(
 
 def calc_total_interest(principal: float, annual_rate: float, total_months: int, repayment_method: str, start_date: date) -> float:
     """计算利息总额"""
+    table = amortization.table_for(principal, annual_rate, total_months, repayment_method, start_date)
+    if table is not None:
+        return table.total_interest_cents / 100
     schedule = generate_schedule(principal, annual_rate, total_months, repayment_method, start_date)
     return round(sum(item["interest"] for item in schedule), 2)
 
 
+def calc_paid_interest(loan: Loan) -> float:
+    """已还期数的利息累计"""
+    table = amortization.table_for(
+        float(loan.principal), float(loan.annual_rate),
+        loan.total_months, loan.repayment_method, loan.start_date,
+    )
+    if table is not None:
+        return table.paid_interest_cents(loan.repaid_months) / 100
+    schedule = _generate_schedule_decimal(
+        float(loan.principal), float(loan.annual_rate),
+        loan.total_months, loan.repayment_method, loan.start_date,
+        loan.repaid_months,
+    )
+    return round(sum(item["interest"] for item in schedule if item["is_paid"]), 2)
+
+
 # ─────────────────────── CRUD ───────────────────────
 
 
@@ -206,6 +251,7 @@ async def create_loan(
             ),
         ]
         db.add(entry)
+        await ledger_service.apply_entry(db, entry)
         await db.flush()
 
     await db.refresh(loan)
@@ -303,6 +349,7 @@ async def record_repayment(
 
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
 
     # 更新贷款状态
     loan.repaid_months = next_period
@@ -371,6 +418,7 @@ async def record_prepayment(
 
     entry.lines = lines
     db.add(entry)
+    await ledger_service.apply_entry(db, entry)
 
     loan.remaining_principal = float(remaining - prepay_amount)
     if loan.remaining_principal <= 0.01:
@@ -380,3 +428,99 @@ async def record_prepayment(
     await db.flush()
     await db.refresh(entry)
     return entry
+
+
+# ─────────────────────── 提前还款模拟 ───────────────────────
+
+
+def _amount_cents(amount: float) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), ROUND_HALF_UP))
+
+
+def _plan(table: amortization.AmortizationTable) -> LoanSimulationPlan:
+    periods = table.months
+    return LoanSimulationPlan(
+        total_interest=table.total_interest_cents / 100,
+        payoff_date=table.payment_date(periods) if periods else None,
+        periods=periods,
+        first_payment=table.payment[0] / 100 if periods else 0.0,
+        last_payment=table.payment[-1] / 100 if periods else 0.0,
+    )
+
+
+def _schedule_deltas(
+    table: amortization.AmortizationTable, baseline: amortization.AmortizationTable
+) -> list[ScenarioScheduleDelta]:
+    """逐期与基准计划比较；提前结清后的期次按 0 计"""
+    def cell(column, i: int) -> int:
+        return column[i] if i < len(column) else 0
+
+    return [
+        ScenarioScheduleDelta(
+            period=i + 1,
+            payment_date=baseline.payment_date(i + 1),
+            payment=cell(table.payment, i) / 100,
+            payment_delta=(cell(table.payment, i) - baseline.payment[i]) / 100,
+            interest=cell(table.interest, i) / 100,
+            interest_delta=(cell(table.interest, i) - baseline.interest[i]) / 100,
+            remaining=cell(table.remaining, i) / 100,
+            remaining_delta=(cell(table.remaining, i) - baseline.remaining[i]) / 100,
+        )
+        for i in range(baseline.months)
+    ]
+
+
+def simulate_prepayments(
+    loan: Loan, scenarios: list[LoanScenario], include_schedule: bool = False
+) -> LoanSimulateResponse:
+    """
+    提前还款方案模拟（只读，不记账）。
+
+    以当前剩余本金、剩余期数为基准重新摊还，各方案在同一基准上叠加提前还款，
+    返回节省利息、新的结清日期和期数变化。
+    """
+    if loan.status == "paid_off":
+        raise LoanError("该贷款已结清")
+    months = loan.total_months - loan.repaid_months
+    principal_cents = amortization.to_cents(loan.remaining_principal)
+    rate_units = amortization.to_rate_units(loan.annual_rate)
+    if months <= 0 or not principal_cents:
+        raise LoanError("该贷款没有待还期数")
+    if rate_units is None:
+        raise LoanError("年利率最多支持 4 位小数")
+
+    first_due = amortization.add_months(loan.start_date, loan.repaid_months)
+    due_dates = [amortization.add_months(first_due, i) for i in range(months)]
+
+    def run(prepayments: dict[int, int], extra_cents: int, strategy: str):
+        return amortization.simulate(
+            principal_cents, rate_units, months, loan.repayment_method, first_due,
+            prepayments, extra_cents, strategy,
+        )
+
+    baseline = run({}, 0, "shorten_term")
+    results = []
+    for scenario in scenarios:
+        prepayments: dict[int, int] = {}
+        for event in scenario.prepayments:
+            # 计入该日或之前最近一期还款之后；早于下一期则视为在下一期之前偿还
+            period = bisect_right(due_dates, event.prepay_date)
+            prepayments[period] = prepayments.get(period, 0) + _amount_cents(event.amount)
+        table = run(prepayments, _amount_cents(scenario.extra_monthly), scenario.strategy)
+
+        plan = _plan(table)
+        results.append(LoanScenarioResult(
+            **plan.model_dump(),
+            name=scenario.name,
+            strategy=scenario.strategy,
+            interest_saved=(baseline.total_interest_cents - table.total_interest_cents) / 100,
+            periods_saved=baseline.months - table.months,
+            schedule=_schedule_deltas(table, baseline) if include_schedule else None,
+        ))
+
+    return LoanSimulateResponse(
+        loan_id=loan.id,
+        remaining_principal=principal_cents / 100,
+        baseline=_plan(baseline),
+        scenarios=results,
+    )
@@ -0,0 +1,526 @@
+"""
+外部交易匹配引擎：导入数据源的外部交易流水，与同一科目上已记账的分录行自动配对。
+
+候选分录行按 (科目, 金额分) 建索引，每个金额桶内按日期排序；每笔外部交易只在
+同金额桶的 ±date_tolerance_days 日期窗口内二分查找候选，再按日期接近度与摘要相似度
+打分，全局按得分从高到低贪心配对。复杂度约 O((n + m) log m)，不做两两比较。
+
+金额约定：外部交易金额为该科目余额方向上的变动 —— 资产科目流入为正，
+负债科目余额增加（如信用卡消费）为正。
+配对失败的交易即真正的差异，可选择逐笔生成待确认的调节分录进入对账队列。
+"""
+
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from difflib import SequenceMatcher
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.adapters.file_import import FileImportConfig, FileImportError
+from app.models.account import Account
+from app.models.journal import JournalEntry, JournalLine
+from app.models.sync import DataSource, ExternalTransaction
+from app.services import ledger_service
+from app.services.reconciliation_service import (
+    build_reconciliation_entry,
+    ensure_suspense_accounts,
+)
+
+DEFAULT_DATE_TOLERANCE_DAYS = 3
+DEFAULT_MIN_SCORE = 0.5
+
+# 得分 = 日期接近度 × 0.6 + 摘要相似度 × 0.4；同日同金额即可达到默认阈值
+_DATE_WEIGHT = 0.6
+_TEXT_WEIGHT = 0.4
+
+_MATCH_STATUS_UPDATE = (
+    update(ExternalTransaction.__table__)
+    .where(ExternalTransaction.__table__.c.id == bindparam("txn_id"))
+    .values(
+        matched_entry_id=bindparam("entry_id"),
+        matched_line_id=bindparam("line_id"),
+        match_status=bindparam("status"),
+    )
+)
+
+
+class MatchingError(Exception):
+    def __init__(self, detail: str, status_code: int = 400):
+        self.detail = detail
+        self.status_code = status_code
+
+
+@dataclass
+class MatchResult:
+    imported: int = 0
+    skipped: int = 0
+    matched: int = 0
+    unmatched: int = 0
+    unmatched_amount: float = 0.0
+    reconciliation_entries: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class MatchCandidate:
+    line_id: str
+    entry_id: str
+    day: int  # date.toordinal()
+    text: str
+
+
+# ─────────────────────── 数据源 ───────────────────────
+
+
+async def create_data_source(
+    db: AsyncSession,
+    book_id: str,
+    account_id: str,
+    source_type: str,
+    provider_name: str | None = None,
+    config: dict | None = None,
+) -> DataSource:
+    account = (await db.execute(
+        select(Account).where(
+            Account.id == account_id,
+            Account.book_id == book_id,
+            Account.is_active == True,
+        )
+    )).scalar_one_or_none()
+    if not account:
+        raise MatchingError("科目不存在或已停用", 404)
+    _validate_config(source_type, config)
+
+    source = DataSource(
+        book_id=book_id,
+        account_id=account_id,
+        source_type=source_type,
+        provider_name=provider_name,
+        config=config,
+        sync_frequency="manual",
+        status="active",
+    )
+    db.add(source)
+    await db.flush()
+    return source
+
+
+def _validate_config(source_type: str, config: dict | None) -> None:
+    """csv_import 数据源的列映射等解析配置在保存时校验，避免上传文件后才报错"""
+    if source_type != "csv_import":
+        return
+    try:
+        FileImportConfig.from_dict(config)
+    except (FileImportError, TypeError) as e:
+        raise MatchingError(f"数据源导入配置无效: {getattr(e, 'detail', e)}")
+
+
+async def update_data_source(
+    db: AsyncSession,
+    data_source: DataSource,
+    provider_name: str | None = None,
+    config: dict | None = None,
+    status: str | None = None,
+) -> DataSource:
+    """更新数据源名称、导入配置或状态（仅更新传入的字段）"""
+    if config is not None:
+        _validate_config(data_source.source_type, config)
+        data_source.config = config
+    if provider_name is not None:
+        data_source.provider_name = provider_name
+    if status is not None:
+        data_source.status = status
+    await db.flush()
+    return data_source
+
+
+async def list_data_sources(db: AsyncSession, book_id: str) -> list[DataSource]:
+    result = await db.execute(
+        select(DataSource)
+        .where(DataSource.book_id == book_id)
+        .order_by(DataSource.created_at)
+    )
+    return list(result.scalars().all())
+
+
+async def get_data_source(db: AsyncSession, book_id: str, data_source_id: str) -> DataSource:
+    source = (await db.execute(
+        select(DataSource).where(
+            DataSource.id == data_source_id,
+            DataSource.book_id == book_id,
+        )
+    )).scalar_one_or_none()
+    if not source:
+        raise MatchingError("数据源不存在", 404)
+    return source
+
+
+async def list_external_transactions(
+    db: AsyncSession,
+    data_source: DataSource,
+    match_status: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> list[ExternalTransaction]:
+    conditions = [ExternalTransaction.data_source_id == data_source.id]
+    if match_status:
+        conditions.append(ExternalTransaction.match_status == match_status)
+    result = await db.execute(
+        select(ExternalTransaction)
+        .where(*conditions)
+        .order_by(ExternalTransaction.transaction_date, ExternalTransaction.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    return list(result.scalars().all())
+
+
+# ─────────────────────── 导入 ───────────────────────
+
+
+def _to_cents(value) -> int:
+    return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def _normalize(*parts: str | None) -> str:
+    return "".join(ch for p in parts if p for ch in p.lower() if ch.isalnum())
+
+
+async def add_transactions(
+    db: AsyncSession,
+    data_source: DataSource,
+    transactions: list[dict],
+) -> tuple[int, int]:
+    """
+    写入一批外部交易（executemany，不做匹配），返回 (写入数, 按 external_id 跳过数)。
+    transactions 为 DataSourceAdapter.fetch_transactions 的返回格式：
+    [{"date": date, "amount": Decimal, "description": str, "counterparty": str}, ...]
+    可选的 external_id 在同一数据源内去重，重复导入同一文件只写入新增部分。
+    """
+    rows = []
+    for i, txn in enumerate(transactions):
+        if not isinstance(txn.get("date"), date):
+            raise MatchingError(f"第 {i + 1} 笔交易缺少日期")
+        cents = _to_cents(txn["amount"])
+        if cents == 0:
+            continue
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "data_source_id": data_source.id,
+            "account_id": data_source.account_id,
+            "transaction_date": txn["date"],
+            "amount": cents / 100,
+            "description": txn.get("description"),
+            "counterparty": txn.get("counterparty"),
+            "external_id": txn.get("external_id"),
+            "match_status": "unmatched",
+        })
+
+    external_ids = [r["external_id"] for r in rows if r["external_id"]]
+    if external_ids:
+        seen = await _existing_external_ids(db, data_source.id, external_ids)
+        total = len(rows)
+        kept = []
+        for row in rows:
+            if row["external_id"]:
+                if row["external_id"] in seen:
+                    continue
+                seen.add(row["external_id"])
+            kept.append(row)
+        skipped = total - len(kept)
+        rows = kept
+    else:
+        skipped = 0
+
+    if rows:
+        await db.execute(insert(ExternalTransaction), rows)
+    return len(rows), skipped
+
+
+async def _existing_external_ids(
+    db: AsyncSession, data_source_id: str, external_ids: list[str]
+) -> set[str]:
+    existing = set()
+    # 分片查询，避免超出 SQLite 绑定参数上限
+    for start in range(0, len(external_ids), 500):
+        result = await db.execute(
+            select(ExternalTransaction.external_id).where(
+                ExternalTransaction.data_source_id == data_source_id,
+                ExternalTransaction.external_id.in_(external_ids[start:start + 500]),
+            )
+        )
+        existing.update(result.scalars().all())
+    return existing
+
+
+async def import_transactions(
+    db: AsyncSession,
+    data_source: DataSource,
+    transactions: list[dict],
+    user_id: str,
+    date_tolerance_days: int = DEFAULT_DATE_TOLERANCE_DAYS,
+    min_score: float = DEFAULT_MIN_SCORE,
+    book_residuals: bool = False,
+) -> MatchResult:
+    """导入外部交易并立即与账本匹配"""
+    t0 = time.perf_counter()
+    imported, skipped = await add_transactions(db, data_source, transactions)
+    insert_seconds = round(time.perf_counter() - t0, 4)
+    result = await match_transactions(
+        db, data_source, user_id, date_tolerance_days, min_score, book_residuals
+    )
+    result.imported = imported
+    result.skipped = skipped
+    result.timings["insert"] = insert_seconds
+    return result
+
+
+# ─────────────────────── 匹配 ───────────────────────
+
+
+def _build_index(candidates: list[tuple[int, MatchCandidate]]) -> dict[int, tuple[list[int], list[MatchCandidate]]]:
+    """金额(分) → (按日期排序的日期列, 对应候选)"""
+    buckets: dict[int, list[MatchCandidate]] = defaultdict(list)
+    for cents, cand in candidates:
+        buckets[cents].append(cand)
+    index = {}
+    for cents, items in buckets.items():
+        items.sort(key=lambda c: c.day)
+        index[cents] = ([c.day for c in items], items)
+    return index
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    if a in b or b in a:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def pair_transactions(
+    transactions: list[tuple[str, int, int, str]],
+    candidates: list[tuple[int, MatchCandidate]],
+    date_tolerance_days: int = DEFAULT_DATE_TOLERANCE_DAYS,
+    min_score: float = DEFAULT_MIN_SCORE,
+) -> dict[str, MatchCandidate]:
+    """
+    纯内存配对。transactions: [(txn_id, 金额分, 日期序数, 规范化摘要)]；
+    candidates: [(金额分, MatchCandidate)]。返回 {txn_id: 配对的候选}，每个候选至多用一次。
+    """
+    index = _build_index(candidates)
+    pairs = []
+    for order, (txn_id, cents, day, text) in enumerate(transactions):
+        bucket = index.get(cents)
+        if bucket is None:
+            continue
+        days, items = bucket
+        lo = bisect_left(days, day - date_tolerance_days)
+        hi = bisect_right(days, day + date_tolerance_days)
+        for cand in items[lo:hi]:
+            gap = abs(cand.day - day)
+            score = (
+                _DATE_WEIGHT * (1 - gap / (date_tolerance_days + 1))
+                + _TEXT_WEIGHT * _similarity(text, cand.text)
+            )
+            if score >= min_score:
+                pairs.append((-score, gap, order, txn_id, cand))
+
+    # 全局贪心：得分高、日期近者优先，同分按导入顺序
+    pairs.sort(key=lambda p: (p[0], p[1], p[2]))
+    matched: dict[str, MatchCandidate] = {}
+    used_lines: set[str] = set()
+    for _, _, _, txn_id, cand in pairs:
+        if txn_id in matched or cand.line_id in used_lines:
+            continue
+        matched[txn_id] = cand
+        used_lines.add(cand.line_id)
+    return matched
+
+
+async def _load_candidates(
+    db: AsyncSession,
+    account: Account,
+    start: date,
+    end: date,
+) -> list[tuple[int, MatchCandidate]]:
+    """
+    科目在日期区间内、尚未被任何外部交易配对的分录行（不含调节分录）。
+    检索路径：ix_journal_entries_book_date_type 取日期窗口内的分录（类型过滤只读索引），
+    再经 ix_journal_lines_account_entry 探查本科目的分录行。
+    """
+    # 按分录行排除（反连接走 matched_line_id 索引）：同一分录的其他行不受影响
+    already_matched = (
+        select(ExternalTransaction.id)
+        .where(ExternalTransaction.matched_line_id == JournalLine.id)
+        .exists()
+    )
+    rows = (await db.execute(
+        select(
+            JournalLine.id,
+            JournalLine.entry_id,
+            JournalLine.debit_amount,
+            JournalLine.credit_amount,
+            JournalLine.description,
+            JournalEntry.entry_date,
+            JournalEntry.description,
+            JournalEntry.note,
+        )
+        .join(JournalEntry, JournalEntry.id == JournalLine.entry_id)
+        .where(
+            JournalLine.account_id == account.id,
+            JournalEntry.book_id == account.book_id,
+            JournalEntry.entry_date >= start,
+            JournalEntry.entry_date <= end,
+            JournalEntry.entry_type != "reconciliation",
+            ~already_matched,
+        )
+    )).all()
+
+    sign = 1 if account.balance_direction == "debit" else -1
+    candidates = []
+    for line_id, entry_id, debit, credit, line_desc, entry_date, entry_desc, note in rows:
+        cents = sign * (_to_cents(debit or 0) - _to_cents(credit or 0))
+        if cents == 0:
+            continue
+        candidates.append((cents, MatchCandidate(
+            line_id=line_id,
+            entry_id=entry_id,
+            day=entry_date.toordinal(),
+            text=_normalize(entry_desc, line_desc, note),
+        )))
+    return candidates
+
+
+async def match_transactions(
+    db: AsyncSession,
+    data_source: DataSource,
+    user_id: str,
+    date_tolerance_days: int = DEFAULT_DATE_TOLERANCE_DAYS,
+    min_score: float = DEFAULT_MIN_SCORE,
+    book_residuals: bool = False,
+) -> MatchResult:
+    """
+    将数据源下所有未匹配的外部交易与账本配对。
+    book_residuals=True 时，仍未配对的交易逐笔生成待确认的调节分录（match_status=reconciled）。
+    """
+    result = MatchResult()
+    timings = result.timings
+    started = t0 = time.perf_counter()
+
+    account = await db.get(Account, data_source.account_id)
+    if not account:
+        raise MatchingError("数据源科目不存在", 404)
+
+    txns = (await db.execute(
+        select(
+            ExternalTransaction.id,
+            ExternalTransaction.transaction_date,
+            ExternalTransaction.amount,
+            ExternalTransaction.description,
+            ExternalTransaction.counterparty,
+        ).where(
+            ExternalTransaction.data_source_id == data_source.id,
+            ExternalTransaction.match_status == "unmatched",
+        )
+    )).all()
+    if not txns:
+        timings["total"] = round(time.perf_counter() - started, 4)
+        return result
+
+    tolerance = timedelta(days=date_tolerance_days)
+    candidates = await _load_candidates(
+        db,
+        account,
+        min(t.transaction_date for t in txns) - tolerance,
+        max(t.transaction_date for t in txns) + tolerance,
+    )
+    timings["load"] = round(time.perf_counter() - t0, 4)
+
+    t0 = time.perf_counter()
+    matched = pair_transactions(
+        [
+            (t.id, _to_cents(t.amount), t.transaction_date.toordinal(),
+             _normalize(t.description, t.counterparty))
+            for t in txns
+        ],
+        candidates,
+        date_tolerance_days,
+        min_score,
+    )
+    timings["pair"] = round(time.perf_counter() - t0, 4)
+
+    t0 = time.perf_counter()
+    updates = [
+        {"txn_id": txn_id, "entry_id": cand.entry_id, "line_id": cand.line_id, "status": "matched"}
+        for txn_id, cand in matched.items()
+    ]
+    residuals = [t for t in txns if t.id not in matched]
+    if book_residuals and residuals:
+        updates.extend(await _book_residuals(db, account, residuals, user_id))
+        result.reconciliation_entries = len(residuals)
+    if updates:
+        await db.execute(_MATCH_STATUS_UPDATE, updates)
+    data_source.last_sync_at = datetime.utcnow()
+    await db.flush()
+    timings["write"] = round(time.perf_counter() - t0, 4)
+
+    result.matched = len(matched)
+    if not book_residuals:
+        result.unmatched = len(residuals)
+        result.unmatched_amount = float(sum(Decimal(str(t.amount)) for t in residuals))
+    timings["total"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+async def _book_residuals(
+    db: AsyncSession,
+    account: Account,
+    residuals: list,
+    user_id: str,
+) -> list[dict]:
+    """未配对交易逐笔生成调节分录，日发生额汇总合并一次写入；返回状态更新参数"""
+    debit_direction = account.balance_direction == "debit"
+    # 余额方向上增加 → 借记资产 / 贷记负债
+    debit_flags = [(Decimal(str(t.amount)) > 0) == debit_direction for t in residuals]
+    suspense = await ensure_suspense_accounts(
+        db, account.book_id, {"income" if flag else "expense" for flag in debit_flags}
+    )
+
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
+    )
+    entries = []
+    for txn, debit_account in zip(residuals, debit_flags):
+        entry = build_reconciliation_entry(
+            account.book_id, user_id, account, txn.transaction_date,
+            abs(Decimal(str(txn.amount))), debit_account, suspense,
+            description=f"对账调节：{txn.description or txn.counterparty or account.name}"[:500],
+        )
+        entry.id = str(uuid.uuid4())
+        for line in entry.lines:
+            bucket = deltas[(line.account_id, txn.transaction_date)]
+            bucket[0] += Decimal(str(line.debit_amount))
+            bucket[1] += Decimal(str(line.credit_amount))
+        entries.append(entry)
+
+    db.add_all(entries)
+    await ledger_service.apply_deltas(
+        db, account.book_id, {k: (v[0], v[1]) for k, v in deltas.items()}
+    )
+    await db.flush()
+    return [
+        {
+            "txn_id": txn.id,
+            "entry_id": entry.id,
+            "line_id": next(l.id for l in entry.lines if l.account_id == account.id),
+            "status": "reconciled",
+        }
+        for txn, entry in zip(residuals, entries)
+    ]
@@ -2,16 +2,36 @@
 对账服务：余额快照、差异计算、调节分录生成、确认分类、拆分
 """
 
+from collections import defaultdict, namedtuple
 from datetime import date
 from decimal import Decimal
 
-from sqlalchemy import select, func, and_
+from sqlalchemy import case, select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.account import Account
+from app.models.balance import AccountDailyBalance
 from app.models.journal import JournalEntry, JournalLine
 from app.models.sync import DataSource, BalanceSnapshot
+from app.services import ledger_service
+from app.services.account_service import invalidate_chart_snapshot
+from app.services.entry_service import (
+    EntryError,
+    encode_entry_cursor,
+    entry_cursor_condition,
+)
+
+_SUSPENSE_NAMES = ("待分类费用", "待分类收入")
+
+# 待处理队列排序：与分录列表相同的 (entry_date, created_at, id) 倒序
+_PENDING_ORDER = (
+    JournalEntry.entry_date.desc(),
+    JournalEntry.created_at.desc(),
+    JournalEntry.id.desc(),
+)
+
+_CursorKey = namedtuple("_CursorKey", ["entry_date", "created_at", "id"])
 
 
 class ReconciliationError(Exception):
@@ -20,242 +40,376 @@ class ReconciliationError(Exception):
         self.status_code = status_code
 
 
-async def _get_book_balance(
-    db: AsyncSession, account_id: str, book_id: str, as_of_date: date
-) -> Decimal:
-    """计算指定科目截至指定日期的账本余额"""
-    account = await db.get(Account, account_id)
-    if not account:
-        raise ReconciliationError("科目不存在", 404)
+def _add_delta(deltas: dict, line: JournalLine, entry_date: date, sign: int) -> None:
+    bucket = deltas[(line.account_id, entry_date)]
+    bucket[0] += Decimal(str(line.debit_amount or 0)) * sign
+    bucket[1] += Decimal(str(line.credit_amount or 0)) * sign
 
-    stmt = (
+
+async def _get_book_balances(
+    db: AsyncSession, book_id: str, as_of: dict[str, date]
+) -> dict[str, tuple[Decimal, Decimal]]:
+    """
+    一次分组查询多个科目各自截至指定日期的借贷合计（读日发生额汇总表）。
+    as_of: {account_id: 截止日期}，返回 {account_id: (借方合计, 贷方合计)}。
+    """
+    day = AccountDailyBalance.balance_date
+    result = await db.execute(
         select(
-            func.coalesce(func.sum(JournalLine.debit_amount), 0).label("total_debit"),
-            func.coalesce(func.sum(JournalLine.credit_amount), 0).label("total_credit"),
+            AccountDailyBalance.account_id,
+            func.coalesce(func.sum(AccountDailyBalance.debit_total), 0),
+            func.coalesce(func.sum(AccountDailyBalance.credit_total), 0),
         )
-        .join(JournalEntry, JournalEntry.id == JournalLine.entry_id)
         .where(
-            JournalLine.account_id == account_id,
-            JournalEntry.book_id == book_id,
-            JournalEntry.entry_date <= as_of_date,
+            AccountDailyBalance.book_id == book_id,
+            AccountDailyBalance.account_id.in_(as_of),
+            day <= case(as_of, value=AccountDailyBalance.account_id),
+        )
+        .group_by(AccountDailyBalance.account_id)
+    )
+    totals = {account_id: (Decimal("0"), Decimal("0")) for account_id in as_of}
+    for account_id, debit, credit in result.all():
+        totals[account_id] = (Decimal(str(debit)), Decimal(str(credit)))
+    return totals
+
+
+async def _ensure_manual_sources(
+    db: AsyncSession, book_id: str, account_ids: list[str]
+) -> dict[str, DataSource]:
+    """取回（缺失时创建）各科目的 manual 数据源"""
+    result = await db.execute(
+        select(DataSource).where(
+            DataSource.account_id.in_(account_ids),
+            DataSource.book_id == book_id,
+            DataSource.source_type == "manual",
+        )
+    )
+    sources = {}
+    for ds in result.scalars().all():
+        sources.setdefault(ds.account_id, ds)
+    missing = [
+        DataSource(
+            book_id=book_id,
+            account_id=account_id,
+            source_type="manual",
+            provider_name="手动输入",
+            sync_frequency="manual",
+            status="active",
+        )
+        for account_id in account_ids
+        if account_id not in sources
+    ]
+    if missing:
+        db.add_all(missing)
+        await db.flush()
+        sources.update({ds.account_id: ds for ds in missing})
+    return sources
+
+
+async def ensure_suspense_accounts(
+    db: AsyncSession, book_id: str, types: set[str]
+) -> dict[str, Account]:
+    """查找或创建暂挂科目：expense → 待分类费用，income → 待分类收入"""
+    names = {"expense": "待分类费用", "income": "待分类收入"}
+    result = await db.execute(
+        select(Account).where(
+            Account.book_id == book_id,
+            Account.name.in_([names[t] for t in types]),
+            Account.type.in_(types),
+            Account.is_active == True,
         )
     )
-    result = await db.execute(stmt)
-    row = result.one()
+    found = {}
+    for acc in result.scalars().all():
+        if names.get(acc.type) == acc.name:
+            found.setdefault(acc.type, acc)
+    created = False
+    for suspense_type in types - found.keys():
+        found[suspense_type] = Account(
+            book_id=book_id,
+            code="9901" if suspense_type == "expense" else "9801",
+            name=names[suspense_type],
+            type=suspense_type,
+            balance_direction="debit" if suspense_type == "expense" else "credit",
+            is_system=True,
+            sort_order=999,
+        )
+        db.add(found[suspense_type])
+        created = True
+    if created:
+        invalidate_chart_snapshot(db, book_id)
+        await db.flush()
+    return found
 
-    total_debit = Decimal(str(row.total_debit))
-    total_credit = Decimal(str(row.total_credit))
 
-    if account.balance_direction == "debit":
-        return total_debit - total_credit
+def build_reconciliation_entry(
+    book_id: str,
+    user_id: str,
+    account: Account,
+    entry_date: date,
+    amount: Decimal,
+    debit_account: bool,
+    suspense: dict[str, Account],
+    description: str | None = None,
+) -> JournalEntry:
+    """
+    构造待确认的调节分录（未加入会话、未计入汇总）。
+    debit_account=True：借 该科目，贷 待分类收入；否则借 待分类费用，贷 该科目。
+    suspense 为 ensure_suspense_accounts 的返回值。
+    """
+    entry = JournalEntry(
+        book_id=book_id,
+        user_id=user_id,
+        entry_date=entry_date,
+        entry_type="reconciliation",
+        description=description or f"对账调节：{account.name}",
+        source="reconciliation",
+        reconciliation_status="pending",
+    )
+    if debit_account:
+        entry.lines = [
+            JournalLine(account_id=account.id, debit_amount=amount, credit_amount=0),
+            JournalLine(account_id=suspense["income"].id, debit_amount=0, credit_amount=amount),
+        ]
     else:
-        return total_credit - total_debit
+        entry.lines = [
+            JournalLine(account_id=suspense["expense"].id, debit_amount=amount, credit_amount=0),
+            JournalLine(account_id=account.id, debit_amount=0, credit_amount=amount),
+        ]
+    return entry
 
 
-async def create_snapshot(
+async def create_snapshots(
     db: AsyncSession,
     book_id: str,
     user_id: str,
-    account_id: str,
-    external_balance: Decimal,
-    snapshot_date: date | None = None,
-) -> dict:
+    items: list[dict],
+) -> list[dict]:
     """
-    记录外部余额快照，计算差异，如差异!=0 则自动生成调节分录。
+    批量记录外部余额快照。items 格式：
+    [{"account_id": "xxx", "external_balance": Decimal, "snapshot_date": date | None}, ...]
+
+    账本余额由一次分组查询得出；差异 != 0 的科目生成调节分录，
+    日发生额汇总合并为一次写入。同一科目在一批中只能出现一次；任一条目失败则整体不生效。
     """
-    target_date = snapshot_date or date.today()
+    bulk = len(items) > 1
+    account_ids = [i["account_id"] for i in items]
+    if len(set(account_ids)) != len(account_ids):
+        raise ReconciliationError("同一科目在一次提交中只能出现一次")
 
     # 校验科目
     result = await db.execute(
         select(Account).where(
-            Account.id == account_id,
+            Account.id.in_(account_ids),
             Account.book_id == book_id,
             Account.is_active == True,
         )
     )
-    account = result.scalar_one_or_none()
-    if not account:
-        raise ReconciliationError("科目不存在或已停用", 404)
+    accounts = {a.id: a for a in result.scalars().all()}
+    for account_id in account_ids:
+        if account_id not in accounts:
+            suffix = f": {account_id}" if bulk else ""
+            raise ReconciliationError(f"科目不存在或已停用{suffix}", 404)
 
     # 确保 data_source 存在（自动创建 manual 类型）
-    ds_result = await db.execute(
-        select(DataSource).where(
-            DataSource.account_id == account_id,
-            DataSource.book_id == book_id,
-            DataSource.source_type == "manual",
-        )
-    )
-    data_source = ds_result.scalar_one_or_none()
-    if not data_source:
-        data_source = DataSource(
-            book_id=book_id,
-            account_id=account_id,
-            source_type="manual",
-            provider_name="手动输入",
-            sync_frequency="manual",
-            status="active",
-        )
-        db.add(data_source)
-        await db.flush()
+    sources = await _ensure_manual_sources(db, book_id, account_ids)
 
     # 计算账本余额
-    book_balance = await _get_book_balance(db, account_id, book_id, target_date)
-    difference = external_balance - book_balance
-
-    # 创建快照
-    snapshot = BalanceSnapshot(
-        data_source_id=data_source.id,
-        account_id=account_id,
-        snapshot_date=target_date,
-        external_balance=float(external_balance),
-        book_balance=float(book_balance),
-        difference=float(difference),
-        status="balanced" if abs(difference) < Decimal("0.01") else "pending",
+    today = date.today()
+    as_of = {i["account_id"]: i.get("snapshot_date") or today for i in items}
+    totals = await _get_book_balances(db, book_id, as_of)
+
+    differences = {}
+    for item in items:
+        account = accounts[item["account_id"]]
+        debit, credit = totals[account.id]
+        book_balance = debit - credit if account.balance_direction == "debit" else credit - debit
+        differences[account.id] = (book_balance, item["external_balance"] - book_balance)
+
+    # 外部余额 > 账本余额 → 资产多了 → 待分类收入；反之 → 待分类费用
+    suspense_types = {
+        "income" if diff > 0 else "expense"
+        for _, diff in differences.values()
+        if abs(diff) >= Decimal("0.01")
+    }
+    suspense = (
+        await ensure_suspense_accounts(db, book_id, suspense_types) if suspense_types else {}
     )
 
-    reconciliation_entry = None
-
-    # 差异 != 0 → 自动生成调节分录
-    if abs(difference) >= Decimal("0.01"):
-        # 找到 "待分类费用" 或 "待分类收入" 科目，若不存在就用通用科目
-        if difference > 0:
-            # 外部余额 > 账本余额 → 资产多了 → 待分类收入
-            suspense_type = "income"
-            suspense_name = "待分类收入"
-        else:
-            # 外部余额 < 账本余额 → 资产少了 → 待分类费用
-            suspense_type = "expense"
-            suspense_name = "待分类费用"
-
-        # 查找或创建暂挂科目
-        suspense_result = await db.execute(
-            select(Account).where(
-                Account.book_id == book_id,
-                Account.name == suspense_name,
-                Account.type == suspense_type,
-                Account.is_active == True,
-            )
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
+    )
+    snapshots = []
+    for item in items:
+        account = accounts[item["account_id"]]
+        target_date = as_of[account.id]
+        book_balance, difference = differences[account.id]
+        snapshot = BalanceSnapshot(
+            data_source_id=sources[account.id].id,
+            account_id=account.id,
+            snapshot_date=target_date,
+            external_balance=float(item["external_balance"]),
+            book_balance=float(book_balance),
+            difference=float(difference),
+            status="balanced" if abs(difference) < Decimal("0.01") else "pending",
         )
-        suspense_account = suspense_result.scalar_one_or_none()
-        if not suspense_account:
-            suspense_account = Account(
-                book_id=book_id,
-                code=f"9901" if suspense_type == "expense" else "9801",
-                name=suspense_name,
-                type=suspense_type,
-                balance_direction="debit" if suspense_type == "expense" else "credit",
-                is_system=True,
-                sort_order=999,
-            )
-            db.add(suspense_account)
-            await db.flush()
-
-        abs_diff = abs(difference)
 
-        entry = JournalEntry(
-            book_id=book_id,
-            user_id=user_id,
-            entry_date=target_date,
-            entry_type="reconciliation",
-            description=f"对账调节：{account.name}",
-            source="reconciliation",
-            reconciliation_status="pending",
+        # 差异 != 0 → 自动生成调节分录（差异为正借记该科目，否则贷记）
+        if abs(difference) >= Decimal("0.01"):
+            entry = build_reconciliation_entry(
+                book_id, user_id, account, target_date,
+                abs(difference), difference > 0, suspense,
+            )
+            for line in entry.lines:
+                _add_delta(deltas, line, target_date, 1)
+            snapshot.reconciliation_entry = entry
+        snapshots.append(snapshot)
+
+    db.add_all(snapshots)
+    if deltas:
+        await ledger_service.apply_deltas(
+            db, book_id, {k: (v[0], v[1]) for k, v in deltas.items()}
         )
+    await db.flush()
 
-        if difference > 0:
-            # 资产增加：借 资产科目，贷 待分类收入
-            lines = [
-                JournalLine(account_id=account_id, debit_amount=abs_diff, credit_amount=0),
-                JournalLine(account_id=suspense_account.id, debit_amount=0, credit_amount=abs_diff),
-            ]
-        else:
-            # 资产减少：借 待分类费用，贷 资产科目
-            lines = [
-                JournalLine(account_id=suspense_account.id, debit_amount=abs_diff, credit_amount=0),
-                JournalLine(account_id=account_id, debit_amount=0, credit_amount=abs_diff),
-            ]
-
-        entry.lines = lines
-        db.add(entry)
-        await db.flush()
-        snapshot.reconciliation_entry_id = entry.id
-        reconciliation_entry = entry
+    return [
+        {
+            "snapshot_id": snap.id,
+            "account_id": snap.account_id,
+            "account_name": accounts[snap.account_id].name,
+            "account_type": accounts[snap.account_id].type,
+            "snapshot_date": snap.snapshot_date.isoformat(),
+            "external_balance": float(item["external_balance"]),
+            "book_balance": float(differences[snap.account_id][0]),
+            "difference": float(differences[snap.account_id][1]),
+            "status": snap.status,
+            "reconciliation_entry_id": snap.reconciliation_entry_id,
+        }
+        for item, snap in zip(items, snapshots)
+    ]
 
-    db.add(snapshot)
-    await db.flush()
-    await db.refresh(snapshot)
 
-    return {
-        "snapshot_id": snapshot.id,
+async def create_snapshot(
+    db: AsyncSession,
+    book_id: str,
+    user_id: str,
+    account_id: str,
+    external_balance: Decimal,
+    snapshot_date: date | None = None,
+) -> dict:
+    """
+    记录外部余额快照，计算差异，如差异!=0 则自动生成调节分录。
+    """
+    results = await create_snapshots(db, book_id, user_id, [{
         "account_id": account_id,
-        "account_name": account.name,
-        "account_type": account.type,
-        "snapshot_date": target_date.isoformat(),
-        "external_balance": float(external_balance),
-        "book_balance": float(book_balance),
-        "difference": float(difference),
-        "status": snapshot.status,
-        "reconciliation_entry_id": reconciliation_entry.id if reconciliation_entry else None,
-    }
+        "external_balance": external_balance,
+        "snapshot_date": snapshot_date,
+    }])
+    return results[0]
+
+
+def _pending_conditions(book_id: str) -> list:
+    return [
+        JournalEntry.book_id == book_id,
+        JournalEntry.entry_type == "reconciliation",
+        JournalEntry.reconciliation_status == "pending",
+    ]
 
 
 async def get_pending_reconciliations(
     db: AsyncSession,
     book_id: str,
-) -> list[dict]:
-    """获取待处理的调节队列"""
+    limit: int | None = None,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    获取待处理的调节队列，返回 (条目, 下一页游标)。
+
+    分录、分录行、科目、关联快照由一条连接查询取回。传入 limit 时按
+    (entry_date, created_at, id) 键集分页，游标格式与分录列表相同；否则返回全部。
+    """
+    conditions = _pending_conditions(book_id)
+    if cursor:
+        try:
+            conditions.append(entry_cursor_condition(cursor))
+        except EntryError as e:
+            raise ReconciliationError(e.detail, e.status_code)
+    if limit is not None:
+        # 先在分录上分页（多取一条判断是否还有下一页），再连接明细行
+        page_ids = (
+            select(JournalEntry.id)
+            .where(*conditions)
+            .order_by(*_PENDING_ORDER)
+            .limit(limit + 1)
+        )
+        conditions = [JournalEntry.id.in_(page_ids)]
+
     stmt = (
-        select(JournalEntry)
-        .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
-        .where(
-            JournalEntry.book_id == book_id,
-            JournalEntry.entry_type == "reconciliation",
-            JournalEntry.reconciliation_status == "pending",
+        select(
+            JournalEntry.id.label("entry_id"),
+            JournalEntry.entry_date,
+            JournalEntry.description,
+            JournalEntry.created_at,
+            JournalLine.id.label("line_id"),
+            JournalLine.account_id,
+            JournalLine.debit_amount,
+            JournalLine.credit_amount,
+            Account.name.label("account_name"),
+            Account.code.label("account_code"),
+            Account.type.label("account_type"),
+            BalanceSnapshot.id.label("snapshot_id"),
+            BalanceSnapshot.account_id.label("snapshot_account_id"),
+            BalanceSnapshot.snapshot_date,
+            BalanceSnapshot.external_balance,
+            BalanceSnapshot.book_balance,
+            BalanceSnapshot.difference,
         )
-        .order_by(JournalEntry.entry_date.desc(), JournalEntry.created_at.desc())
+        .outerjoin(JournalLine, JournalLine.entry_id == JournalEntry.id)
+        .outerjoin(Account, Account.id == JournalLine.account_id)
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.reconciliation_entry_id == JournalEntry.id)
+        .where(*conditions)
+        .order_by(*_PENDING_ORDER)
     )
-    result = await db.execute(stmt)
-    entries = result.scalars().all()
-
-    items = []
-    for e in entries:
-        # 找到关联的 snapshot
-        snap_result = await db.execute(
-            select(BalanceSnapshot).where(
-                BalanceSnapshot.reconciliation_entry_id == e.id
-            )
-        )
-        snap = snap_result.scalar_one_or_none()
-
-        lines_data = []
-        for l in e.lines:
-            lines_data.append({
-                "id": l.id,
-                "account_id": l.account_id,
-                "account_name": l.account.name if l.account else None,
-                "account_code": l.account.code if l.account else None,
-                "account_type": l.account.type if l.account else None,
-                "debit_amount": float(l.debit_amount),
-                "credit_amount": float(l.credit_amount),
+    rows = (await db.execute(stmt)).all()
+
+    items: dict[str, dict] = {}
+    keys: dict[str, _CursorKey] = {}
+    for row in rows:
+        item = items.get(row.entry_id)
+        if item is None:
+            item = items[row.entry_id] = {
+                "entry_id": row.entry_id,
+                "entry_date": row.entry_date.isoformat(),
+                "description": row.description,
+                "lines": [],
+                "snapshot": {
+                    "snapshot_id": row.snapshot_id,
+                    "account_id": row.snapshot_account_id,
+                    "snapshot_date": row.snapshot_date.isoformat(),
+                    "external_balance": float(row.external_balance),
+                    "book_balance": float(row.book_balance),
+                    "difference": float(row.difference),
+                } if row.snapshot_id else None,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            keys[row.entry_id] = _CursorKey(row.entry_date, row.created_at, row.entry_id)
+        if row.line_id is not None:
+            item["lines"].append({
+                "id": row.line_id,
+                "account_id": row.account_id,
+                "account_name": row.account_name,
+                "account_code": row.account_code,
+                "account_type": row.account_type,
+                "debit_amount": float(row.debit_amount),
+                "credit_amount": float(row.credit_amount),
             })
 
-        items.append({
-            "entry_id": e.id,
-            "entry_date": e.entry_date.isoformat(),
-            "description": e.description,
-            "lines": lines_data,
-            "snapshot": {
-                "snapshot_id": snap.id,
-                "account_id": snap.account_id,
-                "snapshot_date": snap.snapshot_date.isoformat(),
-                "external_balance": float(snap.external_balance),
-                "book_balance": float(snap.book_balance),
-                "difference": float(snap.difference),
-            } if snap else None,
-            "created_at": e.created_at.isoformat() if e.created_at else None,
-        })
-
-    return items
+    result = list(items.values())
+    next_cursor = None
+    if limit is not None and len(result) > limit:
+        result = result[:limit]
+        next_cursor = encode_entry_cursor(keys[result[-1]["entry_id"]])
+    return result, next_cursor
 
 
 async def get_pending_count(
@@ -264,15 +418,111 @@ async def get_pending_count(
 ) -> int:
     """获取待处理调节数量（用于角标）"""
     result = await db.execute(
-        select(func.count()).select_from(JournalEntry).where(
-            JournalEntry.book_id == book_id,
-            JournalEntry.entry_type == "reconciliation",
-            JournalEntry.reconciliation_status == "pending",
-        )
+        select(func.count()).select_from(JournalEntry).where(*_pending_conditions(book_id))
     )
     return result.scalar() or 0
 
 
+# ─────────────────────── 确认 / 拆分 ───────────────────────
+
+
+def _is_suspense(line: JournalLine) -> bool:
+    return line.account is not None and line.account.name in _SUSPENSE_NAMES
+
+
+async def _load_pending_entries(
+    db: AsyncSession, book_id: str, entry_ids: list[str]
+) -> dict[str, JournalEntry]:
+    """一次取回待处理分录（含分录行与科目）；批量时错误信息附带分录 ID"""
+    bulk = len(entry_ids) > 1
+    if len(set(entry_ids)) != len(entry_ids):
+        raise ReconciliationError("同一分录不能重复处理")
+    result = await db.execute(
+        select(JournalEntry)
+        .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
+        .where(JournalEntry.id.in_(entry_ids), JournalEntry.book_id == book_id)
+    )
+    entries = {e.id: e for e in result.scalars().all()}
+    for entry_id in entry_ids:
+        suffix = f": {entry_id}" if bulk else ""
+        entry = entries.get(entry_id)
+        if entry is None:
+            raise ReconciliationError(f"分录不存在{suffix}", 404)
+        if entry.reconciliation_status != "pending":
+            raise ReconciliationError(f"该分录已处理{suffix}")
+    return entries
+
+
+async def _load_accounts(
+    db: AsyncSession, book_id: str, account_ids: set[str]
+) -> dict[str, Account]:
+    """一次校验多个目标科目（本账本且启用）"""
+    result = await db.execute(
+        select(Account).where(
+            Account.id.in_(account_ids),
+            Account.book_id == book_id,
+            Account.is_active == True,
+        )
+    )
+    return {a.id: a for a in result.scalars().all()}
+
+
+async def _finish(
+    db: AsyncSession, book_id: str, entries: list[JournalEntry], deltas: dict
+) -> None:
+    """汇总写入日发生额、标记分录与快照状态（一次 UPDATE）"""
+    await ledger_service.apply_deltas(
+        db, book_id, {k: (v[0], v[1]) for k, v in deltas.items()}
+    )
+    for entry in entries:
+        entry.reconciliation_status = "confirmed"
+    await db.execute(
+        update(BalanceSnapshot)
+        .where(BalanceSnapshot.reconciliation_entry_id.in_([e.id for e in entries]))
+        .values(status="reconciled")
+    )
+    await db.flush()
+
+
+async def confirm_reconciliations(
+    db: AsyncSession,
+    book_id: str,
+    items: list[dict],
+) -> list[dict]:
+    """
+    批量确认调节分录分类：将暂挂科目替换为各自指定的目标科目。
+    items 格式：[{"entry_id": "xxx", "target_account_id": "yyy"}, ...]
+    任一条目校验失败则整体不生效。
+    """
+    entries = await _load_pending_entries(db, book_id, [i["entry_id"] for i in items])
+    accounts = await _load_accounts(db, book_id, {i["target_account_id"] for i in items})
+
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
+    )
+    results = []
+    for item in items:
+        target_account = accounts.get(item["target_account_id"])
+        if target_account is None:
+            suffix = f": {item['target_account_id']}" if len(items) > 1 else ""
+            raise ReconciliationError(f"目标科目不存在{suffix}", 404)
+        entry = entries[item["entry_id"]]
+        for line in entry.lines:
+            if _is_suspense(line):
+                _add_delta(deltas, line, entry.entry_date, -1)
+                line.account_id = target_account.id
+                _add_delta(deltas, line, entry.entry_date, 1)
+        results.append({
+            "entry_id": entry.id,
+            "reconciliation_status": "confirmed",
+            "target_account_id": target_account.id,
+            "target_account_name": target_account.name,
+        })
+
+    await _finish(db, book_id, list(entries.values()), deltas)
+    return results
+
+
 async def confirm_reconciliation(
     db: AsyncSession,
     entry_id: str,
@@ -282,56 +532,89 @@ async def confirm_reconciliation(
     """
     确认调节分录的分类：将暂挂科目替换为用户指定的目标科目。
     """
-    # 获取分录
-    result = await db.execute(
-        select(JournalEntry)
-        .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
-        .where(JournalEntry.id == entry_id)
+    results = await confirm_reconciliations(
+        db, book_id, [{"entry_id": entry_id, "target_account_id": target_account_id}]
     )
-    entry = result.scalar_one_or_none()
-    if not entry:
-        raise ReconciliationError("分录不存在", 404)
-    if entry.reconciliation_status != "pending":
-        raise ReconciliationError("该分录已处理")
-
-    # 校验目标科目
-    target_result = await db.execute(
-        select(Account).where(
-            Account.id == target_account_id,
-            Account.book_id == book_id,
-            Account.is_active == True,
-        )
-    )
-    target_account = target_result.scalar_one_or_none()
-    if not target_account:
-        raise ReconciliationError("目标科目不存在", 404)
+    return results[0]
 
-    # 找到暂挂科目行（待分类费用/待分类收入），替换为目标科目
-    for line in entry.lines:
-        if line.account and line.account.name in ("待分类费用", "待分类收入"):
-            line.account_id = target_account_id
 
-    entry.reconciliation_status = "confirmed"
+async def split_reconciliations(
+    db: AsyncSession,
+    book_id: str,
+    items: list[dict],
+) -> list[dict]:
+    """
+    批量拆分调节分录。items 格式：
+    [{"entry_id": "xxx", "splits": [{"account_id": "yyy", "amount": 50.00, "description": "..."}]}, ...]
+    每条分录的拆分金额合计必须等于其原差异金额；任一条目校验失败则整体不生效。
+    """
+    bulk = len(items) > 1
+    entries = await _load_pending_entries(db, book_id, [i["entry_id"] for i in items])
+    accounts = await _load_accounts(
+        db, book_id, {s["account_id"] for i in items for s in i["splits"]}
+    )
 
-    # 更新关联 snapshot 状态
-    snap_result = await db.execute(
-        select(BalanceSnapshot).where(
-            BalanceSnapshot.reconciliation_entry_id == entry_id
-        )
+    deltas: dict[tuple[str, date], list[Decimal]] = defaultdict(
+        lambda: [Decimal("0"), Decimal("0")]
     )
-    snap = snap_result.scalar_one_or_none()
-    if snap:
-        snap.status = "reconciled"
+    new_lines = []
+    results = []
+    for item in items:
+        entry = entries[item["entry_id"]]
+        suffix = f": {entry.id}" if bulk else ""
+
+        # 找出暂挂科目行和资产科目行
+        suspense_line = None
+        asset_line = None
+        for line in entry.lines:
+            if _is_suspense(line):
+                suspense_line = line
+            else:
+                asset_line = line
+        if not suspense_line or not asset_line:
+            raise ReconciliationError(f"无法解析调节分录结构{suffix}")
+
+        # 确定方向：暂挂在借方 = 费用类；暂挂在贷方 = 收入类
+        is_expense = float(suspense_line.debit_amount) > 0
+        total_amount = Decimal(str(
+            suspense_line.debit_amount if is_expense else suspense_line.credit_amount
+        ))
+
+        # 校验拆分金额
+        splits = item["splits"]
+        splits_total = sum(Decimal(str(s["amount"])) for s in splits)
+        if abs(splits_total - total_amount) >= Decimal("0.01"):
+            raise ReconciliationError(
+                f"拆分金额合计 {splits_total} 不等于原差异金额 {total_amount}{suffix}"
+            )
+        for s in splits:
+            if s["account_id"] not in accounts:
+                raise ReconciliationError(f"科目不存在: {s['account_id']}", 404)
+
+        # 删除旧的暂挂行，创建新的明细行
+        _add_delta(deltas, suspense_line, entry.entry_date, -1)
+        await db.delete(suspense_line)
+        for s in splits:
+            amount = Decimal(str(s["amount"]))
+            new_line = JournalLine(
+                entry_id=entry.id,
+                account_id=s["account_id"],
+                debit_amount=float(amount) if is_expense else 0,
+                credit_amount=float(amount) if not is_expense else 0,
+                description=s.get("description"),
+            )
+            _add_delta(deltas, new_line, entry.entry_date, 1)
+            new_lines.append(new_line)
 
-    await db.flush()
-    await db.refresh(entry)
+        results.append({
+            "entry_id": entry.id,
+            "reconciliation_status": "confirmed",
+            "splits_count": len(splits),
+        })
 
-    return {
-        "entry_id": entry.id,
-        "reconciliation_status": entry.reconciliation_status,
-        "target_account_id": target_account_id,
-        "target_account_name": target_account.name,
-    }
+    db.add_all(new_lines)
+    await _finish(db, book_id, list(entries.values()), deltas)
+    return results
 
 
 async def split_reconciliation(
@@ -346,86 +629,7 @@ async def split_reconciliation(
     [{"account_id": "xxx", "amount": 50.00, "description": "..."}, ...]
     总金额必须等于原差异金额。
     """
-    # 获取原分录
-    result = await db.execute(
-        select(JournalEntry)
-        .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
-        .where(JournalEntry.id == entry_id)
+    results = await split_reconciliations(
+        db, book_id, [{"entry_id": entry_id, "splits": splits}]
     )
-    entry = result.scalar_one_or_none()
-    if not entry:
-        raise ReconciliationError("分录不存在", 404)
-    if entry.reconciliation_status != "pending":
-        raise ReconciliationError("该分录已处理")
-
-    # 找出暂挂科目行和资产科目行
-    suspense_line = None
-    asset_line = None
-    for line in entry.lines:
-        if line.account and line.account.name in ("待分类费用", "待分类收入"):
-            suspense_line = line
-        else:
-            asset_line = line
-
-    if not suspense_line or not asset_line:
-        raise ReconciliationError("无法解析调节分录结构")
-
-    # 确定方向：暂挂在借方 = 费用类；暂挂在贷方 = 收入类
-    is_expense = float(suspense_line.debit_amount) > 0
-    total_amount = Decimal(str(
-        suspense_line.debit_amount if is_expense else suspense_line.credit_amount
-    ))
-
-    # 校验拆分金额
-    splits_total = sum(Decimal(str(s["amount"])) for s in splits)
-    if abs(splits_total - total_amount) >= Decimal("0.01"):
-        raise ReconciliationError(
-            f"拆分金额合计 {splits_total} 不等于原差异金额 {total_amount}"
-        )
-
-    # 删除旧的暂挂行
-    await db.delete(suspense_line)
-
-    # 创建新的明细行
-    for s in splits:
-        # 校验科目
-        acc_result = await db.execute(
-            select(Account).where(
-                Account.id == s["account_id"],
-                Account.book_id == book_id,
-                Account.is_active == True,
-            )
-        )
-        acc = acc_result.scalar_one_or_none()
-        if not acc:
-            raise ReconciliationError(f"科目不存在: {s['account_id']}", 404)
-
-        amount = Decimal(str(s["amount"]))
-        new_line = JournalLine(
-            entry_id=entry_id,
-            account_id=s["account_id"],
-            debit_amount=float(amount) if is_expense else 0,
-            credit_amount=float(amount) if not is_expense else 0,
-            description=s.get("description"),
-        )
-        db.add(new_line)
-
-    entry.reconciliation_status = "confirmed"
-
-    # 更新关联 snapshot
-    snap_result = await db.execute(
-        select(BalanceSnapshot).where(
-            BalanceSnapshot.reconciliation_entry_id == entry_id
-        )
-    )
-    snap = snap_result.scalar_one_or_none()
-    if snap:
-        snap.status = "reconciled"
-
-    await db.flush()
-
-    return {
-        "entry_id": entry.id,
-        "reconciliation_status": "confirmed",
-        "splits_count": len(splits),
-    }
+    return results[0]
@@ -0,0 +1,89 @@
+"""
+报表结果缓存：进程内 LRU，按 (book_id, 报表类型, 参数) 缓存序列化后的 JSON。
+条目携带生成时的账本账务版本号，版本号变化即视为失效（见 ledger_service）。
+版本号持久化在数据库中，重启或多进程部署时各进程的缓存与 ETag 均以同一版本号为准。
+"""
+
+import hashlib
+from collections import OrderedDict
+
+from app.config import settings
+
+CacheKey = tuple[str, str, tuple]
+
+# ETag 生成规则版本：规则或版本号来源变化时递增，避免与旧规则生成的 ETag 碰撞
+_ETAG_SCHEME = 2
+
+
+class ReportCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[CacheKey, tuple[int, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey, version: int) -> bytes | None:
+        item = self._entries.get(key)
+        if item is None or item[0] != version:
+            if item is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: CacheKey, version: int, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (version, body)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+report_cache = ReportCache(settings.REPORT_CACHE_MAX_BYTES)
+
+
+def make_etag(key: CacheKey, version: int) -> str:
+    """ETag 由缓存键和账务版本号决定，无需生成报表即可比对"""
+    digest = hashlib.sha1(repr((_ETAG_SCHEME, key, version)).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return etag in candidates
+
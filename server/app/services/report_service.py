@@ -1,46 +1,57 @@
 """
 报表服务：资产负债表 & 损益表 & 仪表盘 & 趋势 & 占比
-从分录明细行（journal_lines）实时汇算。
+从科目日发生额汇总表（account_daily_balances）汇算，
+该表由 ledger_service 在记账事务中同步维护。
 """
 
 from datetime import date, timedelta
 from decimal import Decimal
+from types import SimpleNamespace
 from dateutil.relativedelta import relativedelta
 
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, case, cast, literal, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.account import Account
+from app.models.balance import AccountDailyBalance
 from app.models.journal import JournalEntry, JournalLine
+from app.services.account_service import collect_parent_ids
+
+
+class ReportError(Exception):
+    def __init__(self, detail: str, status_code: int = 400):
+        self.detail = detail
+        self.status_code = status_code
 
 
 async def _query_account_balances(
     db: AsyncSession,
     book_id: str,
-    date_filter,
+    start_date: date | None = None,
+    end_date: date | None = None,
     type_filter=None,
 ) -> list:
     """
     通用查询：按科目汇总 debit/credit 合计。
-    date_filter: 附加到 JournalEntry 的日期条件列表
+    start_date / end_date: 日期区间（闭区间，None 表示不限）
     type_filter: 科目类型筛选（可选）
     """
 
-    # 子查询：先聚合 journal_lines，避免复杂多表 outerjoin
-    # 只选属于本 book 且符合日期条件的 entry 对应的 lines
-    entry_conditions = [
-        JournalEntry.book_id == book_id,
-    ] + date_filter
+    # 子查询：读取科目日发生额汇总表，避免每次扫描全部 journal_lines
+    balance_conditions = [AccountDailyBalance.book_id == book_id]
+    if start_date is not None:
+        balance_conditions.append(AccountDailyBalance.balance_date >= start_date)
+    if end_date is not None:
+        balance_conditions.append(AccountDailyBalance.balance_date <= end_date)
 
     line_sub = (
         select(
-            JournalLine.account_id,
-            func.coalesce(func.sum(JournalLine.debit_amount), 0).label("total_debit"),
-            func.coalesce(func.sum(JournalLine.credit_amount), 0).label("total_credit"),
+            AccountDailyBalance.account_id,
+            func.coalesce(func.sum(AccountDailyBalance.debit_total), 0).label("total_debit"),
+            func.coalesce(func.sum(AccountDailyBalance.credit_total), 0).label("total_credit"),
         )
-        .join(JournalEntry, JournalEntry.id == JournalLine.entry_id)
-        .where(*entry_conditions)
-        .group_by(JournalLine.account_id)
+        .where(*balance_conditions)
+        .group_by(AccountDailyBalance.account_id)
         .subquery()
     )
 
@@ -72,10 +83,56 @@ async def _query_account_balances(
     return result.all()
 
 
+def _rollup_items(items: list[dict], depth: int | None = None) -> list[dict]:
+    """
+    层级汇总：自底向上一次遍历，为每个科目补充 level / is_leaf / rollup_*。
+    depth 指定时只保留 level <= depth 的科目，更深的下级已汇入其祖先的 rollup_*。
+    父科目不在列表中（如已停用）时视为顶级。
+    """
+    by_id = {item["account_id"]: item for item in items}
+    parent_ids = collect_parent_ids(
+        SimpleNamespace(parent_id=item["parent_id"]) for item in items
+    )
+
+    def _level(item: dict) -> int:
+        if item.get("level") is None:
+            parent = by_id.get(item["parent_id"]) if item["parent_id"] else None
+            item["level"] = 1 if parent is None else _level(parent) + 1
+        return item["level"]
+
+    for item in items:
+        _level(item)
+        item["is_leaf"] = item["account_id"] not in parent_ids
+        item["rollup_debit_total"] = Decimal(str(item["debit_total"]))
+        item["rollup_credit_total"] = Decimal(str(item["credit_total"]))
+
+    # 从最深层开始，逐级把子树合计累加到父科目
+    for item in sorted(items, key=lambda i: i["level"], reverse=True):
+        parent = by_id.get(item["parent_id"]) if item["parent_id"] else None
+        if parent is not None:
+            parent["rollup_debit_total"] += item["rollup_debit_total"]
+            parent["rollup_credit_total"] += item["rollup_credit_total"]
+
+    for item in items:
+        debit = item["rollup_debit_total"]
+        credit = item["rollup_credit_total"]
+        if item["balance_direction"] == "debit":
+            item["rollup_balance"] = float(debit - credit)
+        else:
+            item["rollup_balance"] = float(credit - debit)
+        item["rollup_debit_total"] = float(debit)
+        item["rollup_credit_total"] = float(credit)
+
+    if depth is not None:
+        return [item for item in items if item["level"] <= depth]
+    return items
+
+
 async def get_balance_sheet(
     db: AsyncSession,
     book_id: str,
     as_of_date: date,
+    depth: int | None = None,
 ) -> dict:
     """
     资产负债表（截至指定日期）
@@ -84,10 +141,10 @@ async def get_balance_sheet(
     2. 汇总每个科目截至指定日期的余额
     3. 本期损益 = 收入合计 - 费用合计
     4. 校验：资产合计 == 负债合计 + 净资产合计
+    5. 按科目树自底向上汇总子树合计（depth 可折叠深层科目）
     """
 
-    date_filter = [JournalEntry.entry_date <= as_of_date]
-    rows = await _query_account_balances(db, book_id, date_filter)
+    rows = await _query_account_balances(db, book_id, end_date=as_of_date)
 
     assets = []
     liabilities = []
@@ -142,9 +199,9 @@ async def get_balance_sheet(
 
     return {
         "as_of_date": as_of_date.isoformat(),
-        "assets": assets,
-        "liabilities": liabilities,
-        "equities": equities,
+        "assets": _rollup_items(assets, depth),
+        "liabilities": _rollup_items(liabilities, depth),
+        "equities": _rollup_items(equities, depth),
         "net_income": float(net_income),
         "total_asset": float(total_asset),
         "total_liability": float(total_liability),
@@ -159,6 +216,7 @@ async def get_income_statement(
     book_id: str,
     start_date: date,
     end_date: date,
+    depth: int | None = None,
 ) -> dict:
     """
     损益表（指定时间段）
@@ -166,14 +224,11 @@ async def get_income_statement(
     1. 汇总时间段内所有收入科目贷方合计
     2. 汇总时间段内所有费用科目借方合计
     3. 本期损益 = 收入 - 费用
+    4. 按科目树自底向上汇总子树合计（depth 可折叠深层科目）
     """
 
-    date_filter = [
-        JournalEntry.entry_date >= start_date,
-        JournalEntry.entry_date <= end_date,
-    ]
     rows = await _query_account_balances(
-        db, book_id, date_filter, type_filter=["income", "expense"]
+        db, book_id, start_date, end_date, type_filter=["income", "expense"]
     )
 
     incomes = []
@@ -214,20 +269,33 @@ async def get_income_statement(
     return {
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat(),
-        "incomes": incomes,
-        "expenses": expenses,
+        "incomes": _rollup_items(incomes, depth),
+        "expenses": _rollup_items(expenses, depth),
         "total_income": float(total_income),
         "total_expense": float(total_expense),
         "net_income": float(net_income),
     }
 
 
+def _type_balance(acc_type: str, direction: str, debit: Decimal, credit: Decimal) -> Decimal:
+    """
+    按报表口径计算余额：资产类统一 debit - credit（抵减科目自动为负），
+    其余按科目自身的余额方向。
+    """
+    if acc_type == "asset" or direction == "debit":
+        return debit - credit
+    return credit - debit
+
+
 async def get_dashboard(
     db: AsyncSession,
     book_id: str,
 ) -> dict:
     """
-    仪表盘聚合数据：净资产、本月收入/费用/损益、较上月变化、近 5 条分录
+    仪表盘聚合数据：净资产、本月收入/费用/损益、较上月变化、近 30 条分录
+
+    一次条件聚合同时算出「截至今天」「截至上月末」「本月发生额」三组合计，
+    近期分录使用列投影 + 分组影响额，不加载 ORM 对象图。
     """
     today_ = date.today()
 
@@ -238,103 +306,264 @@ async def get_dashboard(
     # 上月末
     prev_month_end = month_start - timedelta(days=1)
 
-    # 并行算三张表
-    bs = await get_balance_sheet(db, book_id, today_)
-    prev_bs = await get_balance_sheet(db, book_id, prev_month_end)
-    income_stmt = await get_income_statement(db, book_id, month_start, month_end)
+    day = AccountDailyBalance.balance_date
+
+    def _sum_when(condition, column):
+        return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
 
-    # 近 30 条分录（仅展示，不支持点击详情）
-    from sqlalchemy.orm import selectinload
-    from app.models.journal import JournalEntry as JE, JournalLine as JL
+    in_month = and_(day >= month_start, day <= month_end)
     stmt = (
-        select(JE)
-        .where(JE.book_id == book_id)
-        .options(selectinload(JE.lines).selectinload(JL.account))
-        .order_by(JE.entry_date.desc(), JE.created_at.desc())
-        .limit(30)
+        select(
+            Account.type,
+            Account.balance_direction,
+            _sum_when(day <= today_, AccountDailyBalance.debit_total),
+            _sum_when(day <= today_, AccountDailyBalance.credit_total),
+            _sum_when(day <= prev_month_end, AccountDailyBalance.debit_total),
+            _sum_when(day <= prev_month_end, AccountDailyBalance.credit_total),
+            _sum_when(in_month, AccountDailyBalance.debit_total),
+            _sum_when(in_month, AccountDailyBalance.credit_total),
+        )
+        .join(Account, Account.id == AccountDailyBalance.account_id)
+        .where(
+            AccountDailyBalance.book_id == book_id,
+            day <= max(today_, month_end),
+            Account.is_active == True,
+        )
+        .group_by(Account.type, Account.balance_direction)
     )
     result = await db.execute(stmt)
-    entries = result.scalars().all()
-
-    def _calc_impact(entry) -> float:
-        asset_delta = 0.0
-        liability_delta = 0.0
-        for line in entry.lines:
-            acct = line.account
-            if not acct:
-                continue
-            d = float(line.debit_amount or 0)
-            c = float(line.credit_amount or 0)
-            if acct.type == "asset":
-                asset_delta += d - c
-            elif acct.type == "liability":
-                liability_delta += c - d
-        return round(asset_delta - liability_delta, 2)
-
-    recent_entries = [
-        {
-            "id": e.id,
-            "book_id": e.book_id,
-            "user_id": e.user_id,
-            "entry_date": e.entry_date.isoformat() if isinstance(e.entry_date, date) else str(e.entry_date),
-            "entry_type": e.entry_type,
-            "description": e.description,
-            "note": e.note,
-            "is_balanced": e.is_balanced,
-            "source": e.source,
-            "created_at": e.created_at.isoformat() if e.created_at else None,
-            "updated_at": e.updated_at.isoformat() if e.updated_at else None,
-            "net_worth_impact": _calc_impact(e),
-        }
-        for e in entries
-    ]
 
-    net_asset = bs["adjusted_equity"]
-    prev_net_asset = prev_bs["adjusted_equity"]
+    zero = Decimal("0")
+    current = {t: zero for t in ("asset", "liability", "equity", "income", "expense")}
+    previous = dict(current)
+    month = dict(current)
+    for row in result.all():
+        acc_type, direction = row[0], row[1]
+        if acc_type not in current:
+            continue
+        amounts = [Decimal(str(v)) for v in row[2:]]
+        current[acc_type] += _type_balance(acc_type, direction, amounts[0], amounts[1])
+        previous[acc_type] += _type_balance(acc_type, direction, amounts[2], amounts[3])
+        month[acc_type] += _type_balance(acc_type, direction, amounts[4], amounts[5])
+
+    def _net_asset(totals: dict) -> float:
+        return float(totals["equity"] + totals["income"] - totals["expense"])
+
+    recent_entries = await _get_recent_entries(db, book_id, limit=30)
+
+    net_asset = _net_asset(current)
+    prev_net_asset = _net_asset(previous)
     net_asset_change = net_asset - prev_net_asset
 
     return {
         "net_asset": net_asset,
         "prev_net_asset": prev_net_asset,
         "net_asset_change": net_asset_change,
-        "total_asset": bs["total_asset"],
-        "total_liability": bs["total_liability"],
-        "month_income": income_stmt["total_income"],
-        "month_expense": income_stmt["total_expense"],
-        "month_net_income": income_stmt["net_income"],
+        "total_asset": float(current["asset"]),
+        "total_liability": float(current["liability"]),
+        "month_income": float(month["income"]),
+        "month_expense": float(month["expense"]),
+        "month_net_income": float(month["income"] - month["expense"]),
         "recent_entries": recent_entries,
     }
 
 
+async def _get_recent_entries(db: AsyncSession, book_id: str, limit: int) -> list[dict]:
+    """近期分录（仅展示）：分录列投影 + 按分录汇总的净资产影响额"""
+    recent = (
+        select(
+            JournalEntry.id,
+            JournalEntry.book_id,
+            JournalEntry.user_id,
+            JournalEntry.entry_date,
+            JournalEntry.entry_type,
+            JournalEntry.description,
+            JournalEntry.note,
+            JournalEntry.is_balanced,
+            JournalEntry.source,
+            JournalEntry.created_at,
+            JournalEntry.updated_at,
+        )
+        .where(JournalEntry.book_id == book_id)
+        .order_by(JournalEntry.entry_date.desc(), JournalEntry.created_at.desc())
+        .limit(limit)
+        .subquery()
+    )
+
+    # 净资产影响 = 资产增加 - 负债增加 = 资产/负债行的 (debit - credit) 之和
+    impact = (
+        select(
+            JournalLine.entry_id,
+            func.sum(JournalLine.debit_amount - JournalLine.credit_amount).label("impact"),
+        )
+        .join(Account, Account.id == JournalLine.account_id)
+        .where(
+            JournalLine.entry_id.in_(select(recent.c.id)),
+            Account.type.in_(["asset", "liability"]),
+        )
+        .group_by(JournalLine.entry_id)
+        .subquery()
+    )
+
+    stmt = (
+        select(recent, func.coalesce(impact.c.impact, 0).label("impact"))
+        .outerjoin(impact, impact.c.entry_id == recent.c.id)
+        .order_by(recent.c.entry_date.desc(), recent.c.created_at.desc())
+    )
+    result = await db.execute(stmt)
+
+    return [
+        {
+            "id": r.id,
+            "book_id": r.book_id,
+            "user_id": r.user_id,
+            "entry_date": r.entry_date.isoformat() if isinstance(r.entry_date, date) else str(r.entry_date),
+            "entry_type": r.entry_type,
+            "description": r.description,
+            "note": r.note,
+            "is_balanced": r.is_balanced,
+            "source": r.source,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+            "updated_at": r.updated_at.isoformat() if r.updated_at else None,
+            "net_worth_impact": round(float(r.impact), 2),
+        }
+        for r in result.all()
+    ]
+
+
+TREND_GRANULARITIES = ("day", "week", "month", "quarter")
+MAX_TREND_POINTS = 1000
+
+
+def _bucket_start(d: date, granularity: str) -> date:
+    """日期所在周期的起始日（周以周一为起点）"""
+    if granularity == "day":
+        return d
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+
+
+def _next_bucket(b: date, granularity: str) -> date:
+    if granularity == "day":
+        return b + timedelta(days=1)
+    if granularity == "week":
+        return b + timedelta(days=7)
+    if granularity == "month":
+        return b + relativedelta(months=1)
+    return b + relativedelta(months=3)
+
+
+def _bucket_label(b: date, granularity: str) -> str:
+    if granularity == "day":
+        return b.isoformat()
+    if granularity == "week":
+        iso_year, iso_week, _ = b.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == "month":
+        return b.strftime("%Y-%m")
+    return f"{b.year}-Q{(b.month - 1) // 3 + 1}"
+
+
+def _bucket_expr(column, granularity: str):
+    """SQLite 表达式：日期所在周期的起始日（YYYY-MM-DD 字符串）"""
+    if granularity == "day":
+        return func.date(column)
+    if granularity == "week":
+        # 'weekday 0' 前进到周日（当天为周日则不动），再回退 6 天即周一
+        return func.date(column, "weekday 0", "-6 days")
+    if granularity == "month":
+        return func.date(column, "start of month")
+    month = cast(func.strftime("%m", column), Integer)
+    return func.printf(
+        "%s-%02d-01", func.strftime("%Y", column), (month - 1) // 3 * 3 + 1
+    )
+
+
 async def get_net_worth_trend(
     db: AsyncSession,
     book_id: str,
     months: int = 12,
+    granularity: str = "month",
+    start_date: date | None = None,
+    end_date: date | None = None,
 ) -> list:
     """
-    近 N 个月每月末的净资产趋势数据
+    净资产趋势：每个周期末的资产、负债、净资产。
+
+    一次分组查询取出「期初余额 + 各周期发生额」（按科目类型和余额方向汇总），
+    再在内存中累加得到各周期末的余额，查询次数与周期数无关。
+    未指定 start_date 时取近 months 个月；end_date 默认今天。
     """
-    today_ = date.today()
-    points = []
+    if granularity not in TREND_GRANULARITIES:
+        raise ReportError(f"不支持的粒度: {granularity}")
+
+    end_date = end_date or date.today()
+    if start_date is None:
+        start_date = (end_date - relativedelta(months=months - 1)).replace(day=1)
+    if start_date > end_date:
+        raise ReportError("开始日期不能晚于结束日期")
+
+    buckets = []
+    b = _bucket_start(start_date, granularity)
+    while b <= end_date:
+        buckets.append(b)
+        if len(buckets) > MAX_TREND_POINTS:
+            raise ReportError(f"数据点过多（上限 {MAX_TREND_POINTS}），请缩小范围或增大粒度")
+        b = _next_bucket(b, granularity)
+
+    # 早于首个周期的发生额归入期初（bucket 为空串）
+    bucket_col = case(
+        (AccountDailyBalance.balance_date < buckets[0], literal("")),
+        else_=_bucket_expr(AccountDailyBalance.balance_date, granularity),
+    ).label("bucket")
 
-    for i in range(months - 1, -1, -1):
-        # 往前推 i 个月的月末
-        ref = today_ - relativedelta(months=i)
-        if i == 0:
-            # 当前月用今天
-            as_of = today_
-        else:
-            # 该月最后一天
-            next_month = ref.replace(day=1) + relativedelta(months=1)
-            as_of = next_month - timedelta(days=1)
+    stmt = (
+        select(
+            bucket_col,
+            Account.type,
+            Account.balance_direction,
+            func.coalesce(func.sum(AccountDailyBalance.debit_total), 0),
+            func.coalesce(func.sum(AccountDailyBalance.credit_total), 0),
+        )
+        .join(Account, Account.id == AccountDailyBalance.account_id)
+        .where(
+            AccountDailyBalance.book_id == book_id,
+            AccountDailyBalance.balance_date <= end_date,
+            Account.is_active == True,
+        )
+        .group_by(bucket_col, Account.type, Account.balance_direction)
+    )
+    result = await db.execute(stmt)
 
-        bs = await get_balance_sheet(db, book_id, as_of)
+    # {bucket: {type: 余额变动}}，余额口径与 get_balance_sheet 一致
+    changes: dict[str, dict[str, Decimal]] = {}
+    for bucket, acc_type, direction, debit, credit in result.all():
+        delta = _type_balance(acc_type, direction, Decimal(str(debit)), Decimal(str(credit)))
+        by_type = changes.setdefault(bucket, {})
+        by_type[acc_type] = by_type.get(acc_type, Decimal("0")) + delta
+
+    running = {t: Decimal("0") for t in ("asset", "liability", "equity", "income", "expense")}
+
+    def _accumulate(key: str):
+        for acc_type, delta in changes.get(key, {}).items():
+            if acc_type in running:
+                running[acc_type] += delta
+
+    _accumulate("")
+    points = []
+    for b in buckets:
+        _accumulate(b.isoformat())
+        as_of = min(_next_bucket(b, granularity) - timedelta(days=1), end_date)
+        net_asset = running["equity"] + running["income"] - running["expense"]
         points.append({
             "date": as_of.isoformat(),
-            "label": as_of.strftime("%Y-%m"),
-            "net_asset": bs["adjusted_equity"],
-            "total_asset": bs["total_asset"],
-            "total_liability": bs["total_liability"],
+            "label": _bucket_label(b, granularity),
+            "net_asset": float(net_asset),
+            "total_asset": float(running["asset"]),
+            "total_liability": float(running["liability"]),
         })
 
     return points
@@ -0,0 +1,221 @@
+"""
+进程内定时任务调度器：随 FastAPI lifespan 启动，按 cron 表达式周期执行注册的任务。
+
+调度状态持久化在 scheduled_jobs 表（下次运行时间、上次结果、耗时）。
+多个 uvicorn worker 各自运行调度循环，到期任务通过一条带条件的 UPDATE
+抢占租约锁，只有抢到的 worker 执行，避免重复记账。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.job import ScheduledJob
+from app.utils.cron import CronExpr
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    name: str
+    schedule: str  # cron 表达式，服务器本地时间
+    func: Callable[[], Awaitable[object]]
+    jitter_seconds: int | None = None  # None 时使用调度器默认值
+
+    def __post_init__(self):
+        self.cron = CronExpr.parse(self.schedule)
+
+
+@dataclass
+class JobMetrics:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0  # 到期但锁被其他 worker 持有
+    last_duration_ms: float = 0.0
+    max_duration_ms: float = 0.0
+    total_duration_ms: float = 0.0
+    last_error: str | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration_ms": round(self.last_duration_ms, 1),
+            "max_duration_ms": round(self.max_duration_ms, 1),
+            "avg_duration_ms": round(self.total_duration_ms / self.runs, 1) if self.runs else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+@dataclass
+class JobScheduler:
+    session_factory: async_sessionmaker[AsyncSession]
+    poll_seconds: float = 30.0
+    lease_seconds: int = 30 * 60
+    jitter_seconds: int = 60
+    worker_id: str = field(
+        default_factory=lambda: f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    )
+
+    def __post_init__(self):
+        self.jobs: dict[str, JobSpec] = {}
+        self.metrics: dict[str, JobMetrics] = {}
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+
+    def register(self, spec: JobSpec) -> None:
+        self.jobs[spec.name] = spec
+        self.metrics.setdefault(spec.name, JobMetrics())
+
+    def next_run(self, spec: JobSpec, after: datetime) -> datetime:
+        """cron 的下一触发时间 + 随机抖动，错开多实例同一时刻的负载"""
+        jitter = self.jitter_seconds if spec.jitter_seconds is None else spec.jitter_seconds
+        return spec.cron.next_after(after) + timedelta(seconds=random.uniform(0, jitter))
+
+    # ─────────────────────── 调度状态表 ───────────────────────
+
+    async def sync_jobs(self) -> None:
+        """登记已注册任务；新任务或 cron 变更时重新计算下次运行时间"""
+        now = datetime.now()
+        async with self.session_factory() as db:
+            for spec in self.jobs.values():
+                await db.execute(
+                    sqlite_insert(ScheduledJob)
+                    .values(name=spec.name, schedule=spec.schedule,
+                            next_run_at=self.next_run(spec, now),
+                            run_count=0, failure_count=0)
+                    .on_conflict_do_nothing(index_elements=["name"])
+                )
+                await db.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.name == spec.name, ScheduledJob.schedule != spec.schedule)
+                    .values(schedule=spec.schedule, next_run_at=self.next_run(spec, now))
+                )
+            await db.commit()
+
+    async def _claim(self, db: AsyncSession, name: str, now: datetime) -> bool:
+        """抢占到期任务的租约锁；条件 UPDATE 在 SQLite 写锁下原子执行"""
+        result = await db.execute(
+            update(ScheduledJob)
+            .where(
+                ScheduledJob.name == name,
+                ScheduledJob.next_run_at <= now,
+                or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+            )
+            .values(
+                locked_by=self.worker_id,
+                locked_until=now + timedelta(seconds=self.lease_seconds),
+            )
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def _finish(
+        self, db: AsyncSession, spec: JobSpec, started: datetime,
+        duration_ms: float, error: str | None,
+    ) -> None:
+        finished = datetime.now()
+        await db.execute(
+            update(ScheduledJob)
+            .where(ScheduledJob.name == spec.name, ScheduledJob.locked_by == self.worker_id)
+            .values(
+                last_run_at=started,
+                last_finished_at=finished,
+                last_status="failed" if error else "success",
+                last_error=error,
+                last_duration_ms=int(duration_ms),
+                run_count=ScheduledJob.run_count + 1,
+                failure_count=ScheduledJob.failure_count + (1 if error else 0),
+                next_run_at=self.next_run(spec, finished),
+                locked_by=None,
+                locked_until=None,
+            )
+        )
+        await db.commit()
+
+    # ─────────────────────── 执行 ───────────────────────
+
+    async def run_due(self, now: datetime | None = None) -> list[str]:
+        """执行所有到期且抢到锁的任务（串行，避免 SQLite 写争用），返回已执行的任务名"""
+        now = now or datetime.now()
+        ran: list[str] = []
+        async with self.session_factory() as db:
+            due = (await db.execute(
+                select(ScheduledJob.name).where(
+                    ScheduledJob.name.in_(list(self.jobs)),
+                    ScheduledJob.next_run_at <= now,
+                )
+            )).scalars().all()
+
+            for name in due:
+                spec = self.jobs[name]
+                metrics = self.metrics[name]
+                if not await self._claim(db, name, now):
+                    metrics.skipped += 1
+                    continue
+
+                started = datetime.now()
+                began = time.perf_counter()
+                error = None
+                try:
+                    await spec.func()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    logger.exception(f"[调度器] 任务 {name} 失败")
+                duration_ms = (time.perf_counter() - began) * 1000
+
+                metrics.runs += 1
+                metrics.failures += 1 if error else 0
+                metrics.last_duration_ms = duration_ms
+                metrics.max_duration_ms = max(metrics.max_duration_ms, duration_ms)
+                metrics.total_duration_ms += duration_ms
+                metrics.last_error = error
+                await self._finish(db, spec, started, duration_ms, error)
+                logger.info(f"[调度器] 任务 {name} 完成，耗时 {duration_ms:.0f}ms")
+                ran.append(name)
+        return ran
+
+    async def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("[调度器] 调度循环异常")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        await self.sync_jobs()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._loop(), name="job-scheduler")
+        logger.info(f"[调度器] 已启动（{self.worker_id}），任务: {', '.join(self.jobs)}")
+
+    async def stop(self) -> None:
+        """通知循环退出并等待当前任务执行完毕"""
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "worker_id": self.worker_id,
+            "jobs": {name: m.as_dict() for name, m in self.metrics.items()},
+        }
@@ -0,0 +1,192 @@
+"""
+对账单文件导入：FileImportAdapter 逐行解析上传的 CSV / OFX，按 chunk_size 分块写入，
+每块使用独立会话提交（同流式批量记账）。
+
+- target="transactions"：写入外部交易表，全部写完后做一次自动匹配
+- target="entries"：直接生成收支分录，走 batch_entry_service 的批量记账路径
+
+两种目标都以 external_id 去重；中途出错时已提交的分块保留，修正后重新上传同一文件即可续传。
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.adapters.file_import import FileImportAdapter, FileImportError
+from app.models.account import Account
+from app.models.sync import DataSource
+from app.models.user import User
+from app.schemas.plugin import BatchEntryItem
+from app.services import batch_entry_service
+from app.services.matching_service import (
+    DEFAULT_DATE_TOLERANCE_DAYS,
+    DEFAULT_MIN_SCORE,
+    MatchingError,
+    MatchResult,
+    add_transactions,
+    get_data_source,
+    match_transactions,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class StatementImportError(Exception):
+    def __init__(self, detail: str, status_code: int = 400):
+        self.detail = detail
+        self.status_code = status_code
+
+
+@dataclass
+class StatementImportResult:
+    format: str
+    target: str
+    total: int = 0
+    imported: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    match: MatchResult | None = None
+
+
+def _entry_external_id(data_source_id: str, external_id: str) -> str:
+    """分录 external_id 在账本内唯一，加数据源前缀避免不同账户的流水号冲突"""
+    value = f"{data_source_id}:{external_id}"
+    if len(value) <= 128:
+        return value
+    return f"{data_source_id}:{hashlib.sha1(external_id.encode('utf-8')).hexdigest()}"
+
+
+def _to_entry_items(
+    rows: list[dict],
+    data_source: DataSource,
+    account: Account,
+    expense_account_id: str,
+    income_account_id: str,
+    start_index: int = 0,
+) -> tuple[list[int], list[BatchEntryItem]]:
+    """
+    资产科目流出 / 负债科目增加记为费用，其余记为收入；零金额行忽略。
+    返回 (各分录对应的行在文件中的序号, 分录列表)，跳过零金额行后序号仍指向原始行。
+    """
+    indexes, items = [], []
+    for idx, row in enumerate(rows, start=start_index):
+        amount = row["amount"]
+        if not amount:
+            continue
+        spend = (amount < 0) == (account.balance_direction == "debit")
+        description = row["description"] or row["counterparty"]
+        items.append(BatchEntryItem(
+            entry_type="expense" if spend else "income",
+            entry_date=row["date"],
+            amount=abs(amount),
+            description=description[:500] if description else None,
+            note=row["counterparty"] if row["description"] else None,
+            category_account_id=expense_account_id if spend else income_account_id,
+            payment_account_id=data_source.account_id,
+            external_id=_entry_external_id(data_source.id, row["external_id"]),
+        ))
+        indexes.append(idx)
+    return indexes, items
+
+
+async def import_statement(
+    session_factory: async_sessionmaker[AsyncSession],
+    user: User,
+    book_id: str,
+    data_source_id: str,
+    source: BinaryIO,
+    filename: str | None = None,
+    target: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    date_tolerance_days: int = DEFAULT_DATE_TOLERANCE_DAYS,
+    min_score: float = DEFAULT_MIN_SCORE,
+    book_residuals: bool = False,
+) -> StatementImportResult:
+    """
+    流式导入对账单文件。source 为可 seek 的二进制文件对象，解析时只持有当前分块。
+    数据源 config 除 FileImportConfig 的解析配置外，还可包含：
+    target（默认 transactions）、expense_account_id / income_account_id（target=entries 时必填）。
+    """
+    async with session_factory() as db:
+        try:
+            data_source = await get_data_source(db, book_id, data_source_id)
+        except MatchingError as e:
+            raise StatementImportError(e.detail, e.status_code)
+        account = await db.get(Account, data_source.account_id)
+
+    if data_source.source_type != "csv_import":
+        raise StatementImportError("仅 csv_import 类型的数据源支持文件导入")
+    config = data_source.config or {}
+    try:
+        adapter = FileImportAdapter(source, config, filename)
+    except FileImportError as e:
+        raise StatementImportError(f"数据源导入配置无效: {e.detail}")
+
+    target = target or config.get("target", "transactions")
+    if target not in ("transactions", "entries"):
+        raise StatementImportError(f"不支持的导入目标: {target}")
+    expense_account_id = config.get("expense_account_id")
+    income_account_id = config.get("income_account_id")
+    if target == "entries" and not (expense_account_id and income_account_id):
+        raise StatementImportError(
+            "导入为分录需要在数据源 config 中配置 expense_account_id 和 income_account_id"
+        )
+
+    result = StatementImportResult(format=adapter.format, target=target)
+
+    async def write_chunk(rows: list[dict]) -> None:
+        async with session_factory() as chunk_db:
+            try:
+                if target == "transactions":
+                    imported, skipped = await add_transactions(chunk_db, data_source, rows)
+                else:
+                    indexes, items = _to_entry_items(
+                        rows, data_source, account, expense_account_id, income_account_id,
+                        result.total - len(rows),
+                    )
+                    response = await batch_entry_service.batch_create_entries(
+                        chunk_db, user, book_id, items, indexes=indexes
+                    )
+                    imported, skipped = response.created, response.skipped
+                await chunk_db.commit()
+            except Exception:
+                await chunk_db.rollback()
+                raise
+        result.imported += imported
+        result.skipped += skipped
+        result.chunks += 1
+
+    def _resumable(detail: str, status_code: int) -> StatementImportError:
+        return StatementImportError(
+            f"{detail}（已导入 {result.imported} 条、跳过 {result.skipped} 条，"
+            f"修正后重新上传同一文件可续传）",
+            status_code,
+        )
+
+    try:
+        for rows in adapter.iter_chunks(chunk_size):
+            result.total += len(rows)
+            await write_chunk(rows)
+    except (FileImportError, MatchingError, HTTPException) as e:
+        detail = e.detail if not isinstance(e, HTTPException) else str(e.detail)
+        raise _resumable(detail, getattr(e, "status_code", 400))
+    except SQLAlchemyError as e:
+        # 分块提交时的数据库错误（如并发上传同一文件触发唯一约束）：已提交的分块保留
+        logger.exception(f"[对账单导入] 数据源 {data_source_id} 第 {result.chunks + 1} 块写入失败")
+        raise _resumable(f"数据库写入失败: {e.__class__.__name__}", 500)
+
+    if target == "transactions":
+        async with session_factory() as db:
+            data_source = await get_data_source(db, book_id, data_source_id)
+            result.match = await match_transactions(
+                db, data_source, user.id, date_tolerance_days, min_score, book_residuals
+            )
+            await db.commit()
+    return result
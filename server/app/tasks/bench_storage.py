@@ -0,0 +1,210 @@
+"""SQLite 存储配置基准：对比 default / production 配置下的读写混合吞吐
+
+用法：
+    python -m app.tasks.bench_storage [--seconds 5] [--writers 2] [--readers 4]
+                                      [--write-rate 20] [--write-batch 1]
+
+每种配置使用独立的临时数据库文件：写任务提交「分录 + 分录行 + 日发生额」（每个事务
+--write-batch 笔），读任务循环执行报表使用的余额汇总查询，统计各自每秒完成的事务数、
+读延迟和锁冲突次数。
+
+读写任务运行在同一个事件循环中，CPU 不足时读写吞吐此消彼长：不限速时写入更快的配置
+会挤占读任务的 CPU，看起来像「读变慢」。因此默认以固定的总写入速率（--write-rate）
+施加相同的写负载，比较各配置下读任务受写入影响的程度；--write-rate 0 为不限速。
+
+单核环境下的结论（2000 笔预置数据，2 写 4 读）：
+- 无写入时两种配置读吞吐持平；两种配置下均未出现锁等待报错
+- 同等写负载下 production 的读吞吐低约 5%~15%：WAL 每次提交和检查点的额外开销
+  （单笔写入 CPU 约多 10%）与读任务争抢同一个核；读引擎是否独立、mmap / cache_size /
+  wal_autocheckpoint 的取值对此没有超出噪声的影响
+- production 的收益在写入侧：写提交不必等读者释放共享锁，不限速时写吞吐约提升 60%
+多核或多进程部署时读写各自占用 CPU，上述争抢不再存在；单核且以报表读为主的部署
+可保留 default 配置。
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import Base, create_engines
+from app.models.balance import AccountDailyBalance
+from app.models.journal import JournalEntry, JournalLine
+from app.services import ledger_service
+
+PROFILES = ("default", "production")
+_BOOK_ID = "bench-book"
+_ACCOUNTS = [f"bench-account-{i}" for i in range(20)]
+
+
+@dataclass
+class BenchResult:
+    profile: str
+    seconds: float
+    writes: int = 0
+    reads: int = 0
+    errors: int = 0
+    read_latencies: list[float] = field(default_factory=list)
+
+    @property
+    def p95_read_ms(self) -> float:
+        if not self.read_latencies:
+            return 0.0
+        ordered = sorted(self.read_latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+
+
+async def _write_one(db: AsyncSession, day: date, batch: int = 1) -> None:
+    """一个写事务：batch 笔「分录 + 分录行 + 日发生额」一次提交"""
+    entries, lines = [], []
+    deltas: dict[tuple[str, date], tuple[Decimal, Decimal]] = {}
+    for _ in range(batch):
+        debit_acc, credit_acc = random.sample(_ACCOUNTS, 2)
+        amount = Decimal(random.randint(1, 50000)) / 100
+        entry_id = str(uuid.uuid4())
+        entries.append({
+            "id": entry_id,
+            "book_id": _BOOK_ID,
+            "user_id": "bench-user",
+            "entry_date": day,
+            "entry_type": "expense",
+            "is_balanced": True,
+        })
+        lines += [
+            {"id": str(uuid.uuid4()), "entry_id": entry_id, "account_id": debit_acc,
+             "debit_amount": amount, "credit_amount": 0},
+            {"id": str(uuid.uuid4()), "entry_id": entry_id, "account_id": credit_acc,
+             "debit_amount": 0, "credit_amount": amount},
+        ]
+        for key, delta in (((debit_acc, day), (amount, Decimal("0"))),
+                           ((credit_acc, day), (Decimal("0"), amount))):
+            old = deltas.get(key, (Decimal("0"), Decimal("0")))
+            deltas[key] = (old[0] + delta[0], old[1] + delta[1])
+    await db.execute(insert(JournalEntry), entries)
+    await db.execute(insert(JournalLine), lines)
+    await ledger_service.apply_deltas(db, _BOOK_ID, deltas)
+    await db.commit()
+
+
+async def _read_one(db: AsyncSession) -> None:
+    await db.execute(
+        select(
+            AccountDailyBalance.account_id,
+            func.sum(AccountDailyBalance.debit_total),
+            func.sum(AccountDailyBalance.credit_total),
+        )
+        .where(AccountDailyBalance.book_id == _BOOK_ID)
+        .group_by(AccountDailyBalance.account_id)
+    )
+    await db.execute(
+        select(func.count()).select_from(JournalEntry)
+        .where(JournalEntry.book_id == _BOOK_ID)
+    )
+    await db.rollback()
+
+
+async def run_profile(
+    profile: str,
+    seconds: float,
+    writers: int,
+    readers: int,
+    seed_rows: int,
+    write_rate: float = 0,
+    write_batch: int = 1,
+) -> BenchResult:
+    """write_rate > 0 时所有写任务合计每秒最多提交 write_rate 个写事务，每个事务 write_batch 笔"""
+    result = BenchResult(profile=profile, seconds=seconds)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        engine, read_engine = create_engines(url, profile)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        write_sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        read_sessions = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+        start_day = date(2024, 1, 1)
+        async with write_sessions() as db:
+            for i in range(seed_rows):
+                await _write_one(db, start_day + timedelta(days=i % 365))
+
+        deadline = time.perf_counter() + seconds
+        interval = writers / write_rate if write_rate > 0 else 0.0
+
+        async def writer() -> None:
+            i = 0
+            async with write_sessions() as db:
+                while time.perf_counter() < deadline:
+                    began = time.perf_counter()
+                    try:
+                        await _write_one(db, start_day + timedelta(days=i % 365), write_batch)
+                        result.writes += write_batch
+                    except OperationalError:
+                        await db.rollback()
+                        result.errors += 1
+                    i += 1
+                    if interval:
+                        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - began)))
+
+        async def reader() -> None:
+            async with read_sessions() as db:
+                while time.perf_counter() < deadline:
+                    began = time.perf_counter()
+                    try:
+                        await _read_one(db)
+                        result.reads += 1
+                        result.read_latencies.append(time.perf_counter() - began)
+                    except OperationalError:
+                        await db.rollback()
+                        result.errors += 1
+
+        await asyncio.gather(
+            *(writer() for _ in range(writers)),
+            *(reader() for _ in range(readers)),
+        )
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="SQLite 存储配置读写混合基准")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每种配置的压测时长")
+    parser.add_argument("--writers", type=int, default=2, help="并发写任务数")
+    parser.add_argument("--readers", type=int, default=4, help="并发读任务数")
+    parser.add_argument("--seed-rows", type=int, default=2000, help="压测前预置的分录数")
+    parser.add_argument("--write-rate", type=float, default=20.0,
+                        help="所有写任务合计的每秒写事务数上限，0 为不限速")
+    parser.add_argument("--write-batch", type=int, default=1, help="每个写事务包含的分录笔数")
+    parser.add_argument("--profile", choices=PROFILES, action="append",
+                        help="只测指定配置（可重复），默认全部")
+    args = parser.parse_args(argv)
+
+    rate = f"{args.write_rate:g}/s" if args.write_rate > 0 else "不限速"
+    print(f"CPU 核数 {os.cpu_count()}，写入速率 {rate}，每事务 {args.write_batch} 笔")
+    print(f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}{'p95 read ms':>13}{'errors':>8}")
+    for profile in args.profile or PROFILES:
+        r = asyncio.run(run_profile(
+            profile, args.seconds, args.writers, args.readers, args.seed_rows,
+            args.write_rate, args.write_batch,
+        ))
+        print(
+            f"{r.profile:<12}{r.writes / r.seconds:>10.1f}{r.reads / r.seconds:>10.1f}"
+            f"{r.p95_read_ms:>13.2f}{r.errors:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,36 @@
-"""月度 & 每日自动折旧定时任务"""
+"""月度 & 每日自动折旧定时任务
 
+手动补提停摆期间缺失的折旧：
+    python -m app.tasks.depreciation catch-up [--through YYYY-MM-DD] [--book BOOK_ID]
+"""
+
+import argparse
+import asyncio
 import logging
 from datetime import date, timedelta
 
-from sqlalchemy import select
-
 from app.database import AsyncSessionLocal
-from app.models.asset import FixedAsset
 from app.services.depreciation_service import (
-    depreciate_all_active,
+    BulkDepreciationResult,
+    CatchUpResult,
+    depreciate_bulk,
+    depreciate_catch_up,
 )
 
 logger = logging.getLogger(__name__)
 
 
-async def run_monthly_depreciation():
+def _log_result(tag: str, result: BulkDepreciationResult | CatchUpResult) -> None:
+    timings = ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in result.timings.items())
+    logger.info(
+        f"[{tag}] 完成，共生成 {result.created} 条折旧分录，"
+        f"合计 {result.total_amount:.2f}（{timings}）"
+    )
+    for book_id, reason in result.failed_books.items():
+        logger.error(f"[{tag}] 账本 {book_id} 失败: {reason}")
+
+
+async def run_monthly_depreciation() -> BulkDepreciationResult:
     """
     每月 1 日凌晨执行
     为所有账本中 granularity=monthly 的活跃资产生成上月折旧分录
@@ -27,32 +43,13 @@ async def run_monthly_depreciation():
     logger.info(f"[月度折旧] 开始执行，期间: {period_label}")
 
     async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(FixedAsset.book_id)
-            .where(
-                FixedAsset.status == "active",
-                FixedAsset.depreciation_method == "straight_line",
-            )
-            .distinct()
-        )
-        book_ids = [row[0] for row in result.all()]
-
-        total_entries = 0
-        for book_id in book_ids:
-            try:
-                # 使用系统用户 ID（第一个用户）
-                entries = await depreciate_all_active(
-                    db, book_id, period_label, "monthly", "system"
-                )
-                total_entries += len(entries)
-            except Exception as e:
-                logger.error(f"[月度折旧] 账本 {book_id} 失败: {e}")
-
+        result = await depreciate_bulk(db, period_label, "monthly", "system")
         await db.commit()
-        logger.info(f"[月度折旧] 完成，共生成 {total_entries} 条折旧分录")
+    _log_result("月度折旧", result)
+    return result
 
 
-async def run_daily_depreciation():
+async def run_daily_depreciation() -> BulkDepreciationResult:
     """
     每日凌晨执行
     为所有账本中 granularity=daily 的活跃资产生成前一日折旧分录
@@ -63,25 +60,52 @@ async def run_daily_depreciation():
     logger.info(f"[每日折旧] 开始执行，期间: {period_label}")
 
     async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(FixedAsset.book_id)
-            .where(
-                FixedAsset.status == "active",
-                FixedAsset.depreciation_method == "straight_line",
-            )
-            .distinct()
-        )
-        book_ids = [row[0] for row in result.all()]
-
-        total_entries = 0
-        for book_id in book_ids:
-            try:
-                entries = await depreciate_all_active(
-                    db, book_id, period_label, "daily", "system"
-                )
-                total_entries += len(entries)
-            except Exception as e:
-                logger.error(f"[每日折旧] 账本 {book_id} 失败: {e}")
+        result = await depreciate_bulk(db, period_label, "daily", "system")
+        await db.commit()
+    _log_result("每日折旧", result)
+    return result
+
 
+async def run_depreciation_catch_up(
+    through: date | None = None, book_id: str | None = None
+) -> CatchUpResult:
+    """
+    补提截至 through（默认昨天）的所有缺失期间
+    用于定时任务停摆后恢复，已计提的期间自动跳过，可重复执行
+    """
+    through = through or date.today() - timedelta(days=1)
+    logger.info(f"[折旧补提] 开始执行，截至: {through}，账本: {book_id or '全部'}")
+
+    async with AsyncSessionLocal() as db:
+        result = await depreciate_catch_up(
+            db, through, "system", [book_id] if book_id else None
+        )
         await db.commit()
-        logger.info(f"[每日折旧] 完成，共生成 {total_entries} 条折旧分录")
+    _log_result("折旧补提", result)
+    for asset_id, reason in result.skipped_assets.items():
+        logger.warning(f"[折旧补提] 资产 {asset_id} 未补提: {reason}")
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="固定资产折旧维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    catch_up = sub.add_parser("catch-up", help="补提缺失期间的折旧")
+    catch_up.add_argument("--through", type=date.fromisoformat, default=None,
+                          help="补提截止日期 YYYY-MM-DD，默认昨天")
+    catch_up.add_argument("--book", dest="book_id", default=None, help="仅补提指定账本")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "catch-up":
+        result = asyncio.run(run_depreciation_catch_up(args.through, args.book_id))
+        print(
+            f"created {result.created} entries for {result.assets} assets, "
+            f"total {result.total_amount:.2f}, skipped {len(result.skipped_assets)} assets"
+        )
+        if result.failed_books:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
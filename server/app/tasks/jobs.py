@@ -0,0 +1,16 @@
+"""内置调度器的任务清单（cron 为服务器本地时间）"""
+
+from app.services.scheduler import JobScheduler, JobSpec
+from app.tasks.depreciation import run_daily_depreciation, run_monthly_depreciation
+
+DEFAULT_JOBS = (
+    # 每日凌晨：前一日的按日折旧
+    JobSpec("depreciation-daily", "10 0 * * *", run_daily_depreciation),
+    # 每月 1 日凌晨：上月的按月折旧
+    JobSpec("depreciation-monthly", "30 0 1 * *", run_monthly_depreciation),
+)
+
+
+def register_default_jobs(scheduler: JobScheduler) -> None:
+    for spec in DEFAULT_JOBS:
+        scheduler.register(spec)
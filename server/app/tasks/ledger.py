@@ -0,0 +1,74 @@
+"""科目日发生额汇总维护任务
+
+用法：
+    python -m app.tasks.ledger rebuild-balances [--book BOOK_ID]
+    python -m app.tasks.ledger verify-spend-counters [--book BOOK_ID] [--fix]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.database import AsyncSessionLocal
+from app.services.ledger_service import (
+    SpendCounterDrift,
+    rebuild_daily_balances,
+    rebuild_spend_counters,
+    verify_spend_counters,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def run_rebuild_balances(book_id: str | None = None) -> int:
+    """从 journal_lines 全量重建 account_daily_balances"""
+    logger.info(f"[日发生额汇总] 开始重建，账本: {book_id or '全部'}")
+    async with AsyncSessionLocal() as db:
+        count = await rebuild_daily_balances(db, book_id)
+        await db.commit()
+    logger.info(f"[日发生额汇总] 完成，共 {count} 行")
+    return count
+
+
+async def run_verify_spend_counters(
+    book_id: str | None = None, fix: bool = False
+) -> list[SpendCounterDrift]:
+    """比对预算使用额计数器与分录明细；fix 时对有偏差的账本重建计数器"""
+    async with AsyncSessionLocal() as db:
+        drifts = await verify_spend_counters(db, book_id)
+        for d in drifts:
+            logger.warning(
+                f"[预算计数器] 偏差 book={d.book_id} period={d.period} "
+                f"account={d.account_id} counter={d.counter} ledger={d.ledger}"
+            )
+        if drifts and fix:
+            for drift_book_id in sorted({d.book_id for d in drifts}):
+                await rebuild_spend_counters(db, drift_book_id)
+            await db.commit()
+            logger.info(f"[预算计数器] 已重建 {len({d.book_id for d in drifts})} 个账本")
+    return drifts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="科目日发生额汇总维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild-balances", help="从分录明细全量重建汇总表")
+    rebuild.add_argument("--book", dest="book_id", default=None, help="仅重建指定账本")
+    verify = sub.add_parser("verify-spend-counters", help="校验预算使用额计数器与分录明细是否一致")
+    verify.add_argument("--book", dest="book_id", default=None, help="仅校验指定账本")
+    verify.add_argument("--fix", action="store_true", help="发现偏差时重建对应账本的计数器")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild-balances":
+        count = asyncio.run(run_rebuild_balances(args.book_id))
+        print(f"rebuilt {count} rows")
+    elif args.command == "verify-spend-counters":
+        drifts = asyncio.run(run_verify_spend_counters(args.book_id, args.fix))
+        print(f"{len(drifts)} drifted counters" + (" (rebuilt)" if drifts and args.fix else ""))
+        if drifts and not args.fix:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""五段式 cron 表达式（分 时 日 月 周）解析与下次触发时间计算
+
+支持 *、数字、a-b 区间、/n 步长和逗号列表；周字段 0 和 7 均表示周日。
+与标准 cron 一致：日和周同时受限时，满足其一即触发。
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+# 最多向后搜索的年数，避免 "0 0 31 2 *" 这类永不触发的表达式死循环
+_MAX_YEARS = 5
+
+
+class CronError(ValueError):
+    pass
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) <= 0:
+                raise CronError(f"cron {name} 字段步长无效: {text}")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            if not (a.isdigit() and b.isdigit()):
+                raise CronError(f"cron {name} 字段无效: {text}")
+            start, end = int(a), int(b)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise CronError(f"cron {name} 字段无效: {text}")
+        if start < low or end > high or start > end:
+            raise CronError(f"cron {name} 字段超出范围 {low}-{high}: {text}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronExpr:
+    expr: str
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]  # 0 = 周日
+    day_restricted: bool
+    weekday_restricted: bool
+
+    @classmethod
+    def parse(cls, expr: str) -> "CronExpr":
+        parts = expr.split()
+        if len(parts) != 5:
+            raise CronError(f"cron 表达式应为 5 段（分 时 日 月 周）: {expr}")
+        minutes, hours, days, months, weekdays = (
+            _parse_field(text, name, low, high)
+            for text, (name, low, high) in zip(parts, _FIELDS)
+        )
+        return cls(
+            expr=expr,
+            minutes=minutes,
+            hours=hours,
+            days=days,
+            months=months,
+            weekdays=frozenset(d % 7 for d in weekdays),
+            day_restricted=parts[2] != "*",
+            weekday_restricted=parts[4] != "*",
+        )
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """严格晚于 after 的下一次触发时间（精确到分钟）"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after.year + _MAX_YEARS
+        while dt.year <= limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise CronError(f"cron 表达式在 {_MAX_YEARS} 年内不会触发: {self.expr}")
@@ -24,9 +24,9 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    from app.services.auth_service import get_user_by_id
+    from app.services.auth_cache import get_user
 
-    user = await get_user_by_id(db, user_id)
+    user = await get_user(db, user_id)
     if user is None:
         raise credentials_exception
 
@@ -0,0 +1,63 @@
+"""NDJSON 流式读写工具"""
+
+import json
+from typing import AsyncIterable, AsyncIterator
+
+from pydantic import BaseModel
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class NDJSONError(ValueError):
+    def __init__(self, detail: str, line_no: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.line_no = line_no
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterable[bytes], max_line_bytes: int = 64 * 1024
+) -> AsyncIterator[tuple[int, bytes]]:
+    """
+    按行增量切分字节流，返回 (行号, 行内容)；跳过空行。
+    单行超过 max_line_bytes 时抛 NDJSONError，避免无换行的超大请求占满内存。
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            pos = buffer.find(b"\n")
+            if pos < 0:
+                break
+            line, buffer = buffer[:pos], buffer[pos + 1:]
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+        if len(buffer) > max_line_bytes:
+            raise NDJSONError(f"第 {line_no + 1} 行超过 {max_line_bytes} 字节", line_no + 1)
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+
+def dump_line(model: BaseModel | dict) -> bytes:
+    if isinstance(model, BaseModel):
+        return model.model_dump_json().encode("utf-8") + b"\n"
+    return json.dumps(model, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    边读请求体边写响应的 NDJSON 流。
+
+    Starlette 的 StreamingResponse 会并发调用 receive() 监听断开，
+    与生成器内读取 request.stream() 争抢消息；这里只发送响应，
+    客户端断开由 request.stream() 抛出的 ClientDisconnect 感知。
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
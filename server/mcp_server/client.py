@@ -67,6 +67,11 @@ class HAClient:
     async def get_dashboard(self, book_id: str) -> dict:
         return await self._request("GET", f"/books/{book_id}/dashboard")
 
+    async def get_budget_history(self, book_id: str, months: int = 12) -> dict:
+        return await self._request(
+            "GET", f"/books/{book_id}/budgets/history", params={"months": months}
+        )
+
     # ─── 同步 ──────────────────────────────
 
     async def submit_snapshot(self, account_id: str, external_balance: float, snapshot_date: str) -> dict:
@@ -75,6 +80,11 @@ class HAClient:
             "snapshot_date": snapshot_date,
         })
 
+    async def submit_snapshots_batch(self, book_id: str, items: list[dict]) -> dict:
+        return await self._request("POST", f"/books/{book_id}/snapshots/batch", json={
+            "items": items,
+        })
+
     # ─── 管理 ──────────────────────────────
 
     async def list_accounts(self, book_id: str) -> dict:
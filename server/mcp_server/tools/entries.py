@@ -47,6 +47,7 @@ def register(mcp: FastMCP):
         entry_type: str = "",
         page: int = 1,
         page_size: int = 20,
+        cursor: str = "",
     ) -> str:
         """查询分录列表。
 
@@ -57,12 +58,15 @@ def register(mcp: FastMCP):
         - entry_type: 筛选类型 (expense/income/transfer/asset_purchase/borrow/repay)
         - page: 页码，默认 1
         - page_size: 每页条数，默认 20
+        - cursor: 翻页游标。结果中 next_cursor 不为空时，原样传入即可取下一页（忽略 page）
         """
         bid = book_id or config.default_book_id
         if not bid:
             return "错误：未指定 book_id，且未配置默认账本"
 
         params = {"page": page, "page_size": page_size}
+        if cursor:
+            params = {"cursor": cursor, "page_size": page_size}
         if start_date:
             params["start_date"] = start_date
         if end_date:
@@ -54,3 +54,18 @@ def register(mcp: FastMCP):
             return "错误：未指定 book_id"
         result = await ha_client.get_dashboard(bid)
         return json.dumps(result, ensure_ascii=False, indent=2)
+
+    @mcp.tool()
+    async def get_budget_history(book_id: str = "", months: int = 12) -> str:
+        """获取最近几个月的预算执行情况（预算 vs 实际）。
+
+        返回 periods（月份列表）及每个预算按月对应的 actual（实际支出）、
+        variance（预算 - 实际，负数为超支）、usage_rate、status。
+        - book_id: 账本 ID
+        - months: 最近几个月（含当月），默认 12，最多 60
+        """
+        bid = book_id or config.default_book_id
+        if not bid:
+            return "错误：未指定 book_id"
+        result = await ha_client.get_budget_history(bid, months)
+        return json.dumps(result, ensure_ascii=False, indent=2)
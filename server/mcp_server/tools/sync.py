@@ -26,3 +26,29 @@ def register(mcp: FastMCP):
 
         result = await ha_client.submit_snapshot(account_id, external_balance, snapshot_date)
         return json.dumps(result, ensure_ascii=False, indent=2)
+
+    @mcp.tool()
+    async def sync_balances(
+        balances: str,
+        book_id: str = "",
+    ) -> str:
+        """一次提交多个科目的余额快照（多账户同步），系统逐一计算差额并生成调节分录。
+
+        balances 参数是一个 JSON 数组字符串，每个元素包含：
+        - account_id: 科目 ID（使用 list_accounts 获取）
+        - external_balance: 外部真实余额（数字）
+        - snapshot_date: (可选) 快照日期 (YYYY-MM-DD)，默认今天
+
+        同一科目在一次提交中只能出现一次。
+        """
+        bid = book_id or config.default_book_id
+        if not bid:
+            return "错误：未指定 book_id，且未配置默认账本 HA_DEFAULT_BOOK_ID"
+
+        try:
+            items = json.loads(balances)
+        except json.JSONDecodeError as e:
+            return f"错误：balances 参数 JSON 解析失败: {e}"
+
+        result = await ha_client.submit_snapshots_batch(bid, items)
+        return json.dumps(result, ensure_ascii=False, indent=2)
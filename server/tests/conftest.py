@@ -9,7 +9,7 @@ import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db, get_session_factory
 from app.models.user import User
 from app.models.book import Book, BookMember
 from app.models.account import Account
@@ -66,10 +66,18 @@ async def client():
     from app.main import app
 
     app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_read_db] = _override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestSessionLocal
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
     app.dependency_overrides.clear()
+    # 进程级 API Key / 鉴权缓存：写回本测试合并的 last_used_at 后清空
+    from app.services import auth_cache
+    from app.services.api_key_cache import api_key_cache
+    await api_key_cache.close(TestSessionLocal)
+    api_key_cache.clear()
+    auth_cache.clear()
 
 
 # ──────────── 测试用户 ────────────
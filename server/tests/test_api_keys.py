@@ -281,6 +281,75 @@ class TestApiKeyAuth:
         assert create_resp.json()["expires_at"] is not None
 
 
+class TestApiKeyCache:
+    """已验证 Key 缓存：命中跳过 bcrypt、停用/删除立即失效、last_used_at 合并写回"""
+
+    @staticmethod
+    async def _create_key(client: AsyncClient, auth_headers, **body) -> tuple[str, dict]:
+        resp = await client.post("/api-keys", json={"name": "Cache Key", **body}, headers=auth_headers)
+        data = resp.json()
+        return data["id"], {"Authorization": f"Bearer {data['key']}"}
+
+    @pytest.mark.asyncio
+    async def test_bcrypt_only_on_first_use(self, client: AsyncClient, auth_headers, monkeypatch):
+        from app.utils import api_key_auth
+
+        calls = []
+        original = api_key_auth.bcrypt.verify
+
+        def counting_verify(token, key_hash):
+            calls.append(token)
+            return original(token, key_hash)
+
+        monkeypatch.setattr(api_key_auth.bcrypt, "verify", counting_verify)
+        _, key_headers = await self._create_key(client, auth_headers)
+
+        for _ in range(3):
+            resp = await client.get("/books", headers=key_headers)
+            assert resp.status_code == 200
+        assert len(calls) == 1
+
+        # 错误的 Key 不会命中缓存
+        bad = {"Authorization": key_headers["Authorization"][:-2] + "xx"}
+        assert (await client.get("/books", headers=bad)).status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_deactivate_and_delete_invalidate(self, client: AsyncClient, auth_headers):
+        key_id, key_headers = await self._create_key(client, auth_headers)
+        assert (await client.get("/books", headers=key_headers)).status_code == 200
+
+        await client.patch(f"/api-keys/{key_id}", json={"is_active": False}, headers=auth_headers)
+        assert (await client.get("/books", headers=key_headers)).status_code == 401
+
+        await client.patch(f"/api-keys/{key_id}", json={"is_active": True}, headers=auth_headers)
+        assert (await client.get("/books", headers=key_headers)).status_code == 200
+
+        await client.delete(f"/api-keys/{key_id}", headers=auth_headers)
+        assert (await client.get("/books", headers=key_headers)).status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_expired_key_rejected(self, client: AsyncClient, auth_headers):
+        expired = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+        _, key_headers = await self._create_key(client, auth_headers, expires_at=expired)
+        for _ in range(2):
+            resp = await client.get("/books", headers=key_headers)
+            assert resp.status_code == 401
+            assert resp.json()["detail"] == "API Key expired"
+
+    @pytest.mark.asyncio
+    async def test_last_used_at_coalesced(self, client: AsyncClient, auth_headers):
+        from app.services.api_key_cache import api_key_cache
+
+        _, key_headers = await self._create_key(client, auth_headers)
+        for _ in range(3):
+            await client.get("/books", headers=key_headers)
+
+        # 未写回前数据库中仍为空；一次写回合并多次使用
+        assert (await client.get("/api-keys", headers=auth_headers)).json()[0]["last_used_at"] is None
+        assert await api_key_cache.flush(TestSessionLocal) == 1
+        assert (await client.get("/api-keys", headers=auth_headers)).json()[0]["last_used_at"] is not None
+
+
 class TestApiKeyGeneration:
 
     def test_generate_key_format(self):
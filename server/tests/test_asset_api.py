@@ -319,6 +319,45 @@ class TestDepreciateAPI:
         assert resp.status_code == 404
 
 
+    @pytest.mark.asyncio
+    async def test_catch_up_endpoint(
+        self, client: AsyncClient, auth_headers, test_book, sample_asset: FixedAsset
+    ):
+        """POST /books/{id}/assets/depreciation/catch-up — 补提缺失期间"""
+        url = f"/books/{test_book.id}/assets/depreciation/catch-up?through=2025-03-31"
+        resp = await client.post(url, headers=auth_headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["created"] == 3
+        assert data["assets"] == 1
+        assert data["total_amount"] == pytest.approx(211.11 * 3, abs=0.01)
+
+        again = await client.post(url, headers=auth_headers)
+        assert again.json()["created"] == 0
+
+    @pytest.mark.asyncio
+    async def test_delete_asset_removes_depreciation_records(
+        self, client: AsyncClient, auth_headers, test_book, sample_asset: FixedAsset
+    ):
+        """DELETE /assets/{id} — 折旧台账随资产删除，不留孤儿记录"""
+        from sqlalchemy import func, select
+
+        from app.models.asset import DepreciationRecord
+        from tests.conftest import TestSessionLocal
+
+        url = f"/books/{test_book.id}/assets/depreciation/catch-up?through=2025-03-31"
+        assert (await client.post(url, headers=auth_headers)).json()["created"] == 3
+
+        resp = await client.delete(f"/assets/{sample_asset.id}", headers=auth_headers)
+        assert resp.status_code == 200
+        async with TestSessionLocal() as db:
+            count = (await db.execute(
+                select(func.count()).select_from(DepreciationRecord)
+                .where(DepreciationRecord.asset_id == sample_asset.id)
+            )).scalar_one()
+        assert count == 0
+
+
 # ═══════════════════════════════════════════
 # 资产处置
 # ═══════════════════════════════════════════
@@ -0,0 +1,124 @@
+"""鉴权缓存测试：用户投影、账本成员角色、成员变更失效"""
+
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, event
+
+from app.models.book import Book, BookMember
+from app.models.user import User
+from app.services import auth_cache
+from app.utils.security import create_access_token, hash_password
+
+from tests.conftest import TestSessionLocal, test_engine
+
+
+class _StatementLog:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def touching(self, *tables: str) -> list[str]:
+        return [s for s in self.statements if any(f" {t}" in s for t in tables)]
+
+
+async def _other_user() -> tuple[User, dict]:
+    async with TestSessionLocal() as db:
+        user = User(
+            id=str(uuid.uuid4()),
+            email=f"{uuid.uuid4().hex[:8]}@example.com",
+            password_hash=hash_password("password123"),
+            nickname="其他用户",
+        )
+        db.add(user)
+        await db.commit()
+    return user, {"Authorization": f"Bearer {create_access_token(user.id)}"}
+
+
+class TestAuthCache:
+
+    @pytest.mark.asyncio
+    async def test_no_auth_queries_after_warm_up(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        url = f"/books/{test_book.id}/accounts"
+        assert (await client.get(url, headers=auth_headers)).status_code == 200
+
+        log = _StatementLog()
+        event.listen(test_engine.sync_engine, "before_cursor_execute", log)
+        try:
+            assert (await client.get(url, headers=auth_headers)).status_code == 200
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", log)
+        assert log.statements
+        assert log.touching("users", "book_members") == []
+
+    @pytest.mark.asyncio
+    async def test_membership_changes_invalidate(
+        self, client: AsyncClient, test_book: Book
+    ):
+        user, headers = await _other_user()
+        url = f"/books/{test_book.id}/accounts"
+        # 非成员结果同样被缓存
+        assert (await client.get(url, headers=headers)).status_code == 403
+        assert (await client.get(url, headers=headers)).status_code == 403
+
+        async with TestSessionLocal() as db:
+            db.add(BookMember(book_id=test_book.id, user_id=user.id, role="member"))
+            await db.commit()
+        assert (await client.get(url, headers=headers)).status_code == 200
+
+        async with TestSessionLocal() as db:
+            member = await db.get(BookMember, (test_book.id, user.id))
+            await db.delete(member)
+            await db.commit()
+        assert (await client.get(url, headers=headers)).status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_new_book_visible_immediately(self, client: AsyncClient, auth_headers):
+        resp = await client.post("/books", json={"name": "新账本"}, headers=auth_headers)
+        book_id = resp.json()["id"]
+        assert (await client.get(f"/books/{book_id}/accounts", headers=auth_headers)).status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_profile_update_with_cached_user(self, client: AsyncClient, auth_headers):
+        assert (await client.get("/auth/me", headers=auth_headers)).status_code == 200
+        resp = await client.put("/auth/profile", json={"nickname": "新昵称"}, headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.json()["nickname"] == "新昵称"
+        assert (await client.get("/auth/me", headers=auth_headers)).json()["nickname"] == "新昵称"
+
+    @pytest.mark.asyncio
+    async def test_request_scoped_lookups(self, test_user: User, test_book: Book):
+        """同一会话内重复校验只查询一次；进程级缓存命中不再查询"""
+        log = _StatementLog()
+        event.listen(test_engine.sync_engine, "before_cursor_execute", log)
+        try:
+            async with TestSessionLocal() as db:
+                for _ in range(3):
+                    assert await auth_cache.get_book_role(db, test_user.id, test_book.id) == "admin"
+                    assert (await auth_cache.get_user(db, test_user.id)).id == test_user.id
+            async with TestSessionLocal() as db:
+                assert await auth_cache.get_book_role(db, test_user.id, test_book.id) == "admin"
+                assert (await auth_cache.get_user(db, test_user.id)).email == test_user.email
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", log)
+        assert len(log.touching("book_members")) == 1
+        assert len(log.touching("users")) == 1
+
+    @pytest.mark.asyncio
+    async def test_bulk_delete_bypass_expires_by_ttl(
+        self, test_user: User, test_book: Book, monkeypatch
+    ):
+        """绕过 ORM 的批量删除不触发失效，依靠 TTL 过期"""
+        async with TestSessionLocal() as db:
+            assert await auth_cache.get_book_role(db, test_user.id, test_book.id) == "admin"
+            await db.execute(delete(BookMember).where(BookMember.book_id == test_book.id))
+            await db.commit()
+
+        monkeypatch.setattr(auth_cache.role_cache, "ttl_seconds", 0)
+        async with TestSessionLocal() as db:
+            assert await auth_cache.get_book_role(db, test_user.id, test_book.id) is None
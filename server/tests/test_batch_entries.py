@@ -13,6 +13,7 @@
 - 认证校验
 """
 
+import json
 import uuid
 from datetime import date
 
@@ -318,6 +319,34 @@ class TestBatchCreateNormal:
 # ──────────── external_id 去重 ────────────
 
 
+    @pytest.mark.asyncio
+    async def test_batch_updates_reports(
+        self, client: AsyncClient, auth_headers, api_key_and_headers, plugin_id,
+        test_book, accounts,
+    ):
+        """批量写入同步维护日发生额汇总，报表立即可见"""
+        _, api_headers = api_key_and_headers
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch",
+            json={
+                "book_id": test_book.id,
+                "entries": [_income_item(accounts, 0)] + [
+                    _expense_item(accounts, i) for i in range(1, 4)
+                ],
+            },
+            headers=api_headers,
+        )
+        assert resp.json()["created"] == 4
+
+        resp = await client.get(
+            f"/books/{test_book.id}/income-statement?start=2025-06-01&end=2025-06-30",
+            headers=auth_headers,
+        )
+        data = resp.json()
+        assert data["total_income"] == pytest.approx(8000)
+        assert data["total_expense"] == pytest.approx(150)
+
+
 class TestBatchDeduplication:
 
     @pytest.mark.asyncio
@@ -437,6 +466,29 @@ class TestBatchDeduplication:
 # ──────────── 错误场景 ────────────
 
 
+    @pytest.mark.asyncio
+    async def test_duplicate_within_same_batch(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
+    ):
+        """同一批次内 external_id 重复 → 仅创建第一条"""
+        _, api_headers = api_key_and_headers
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch",
+            json={
+                "book_id": test_book.id,
+                "entries": [
+                    _expense_item(accounts, 0, external_id="dup_001"),
+                    _expense_item(accounts, 1, external_id="dup_001"),
+                ],
+            },
+            headers=api_headers,
+        )
+        data = resp.json()
+        assert data["created"] == 1
+        assert data["skipped"] == 1
+        assert data["results"][1]["entry_id"] == data["results"][0]["entry_id"]
+
+
 class TestBatchErrors:
 
     @pytest.mark.asyncio
@@ -465,6 +517,29 @@ class TestBatchErrors:
         assert resp.status_code in (400, 404)
         assert "第 2 条" in resp.json()["detail"]
 
+    @pytest.mark.asyncio
+    async def test_non_leaf_account_rejected(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
+    ):
+        """非末级科目 → 报错并提示子科目数量，整批不落库"""
+        _, api_headers = api_key_and_headers
+        item = _expense_item(accounts, 1)
+        item["payment_account_id"] = accounts["1001"]  # 货币资金（非末级）
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch",
+            json={"book_id": test_book.id, "entries": [_expense_item(accounts, 0), item]},
+            headers=api_headers,
+        )
+        assert resp.status_code == 400
+        assert "第 2 条" in resp.json()["detail"]
+        assert "非末级科目" in resp.json()["detail"]
+
+        async with TestSessionLocal() as db:
+            result = await db.execute(
+                select(JournalEntry).where(JournalEntry.book_id == test_book.id)
+            )
+            assert result.scalars().all() == []
+
     @pytest.mark.asyncio
     async def test_missing_required_fields(
         self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
@@ -638,3 +713,138 @@ class TestBatchAuth:
             json={"book_id": test_book.id, "entries": entries},
         )
         assert resp.status_code == 401
+
+
+# ──────────── 流式批量记账（NDJSON） ────────────
+
+
+def _ndjson(items) -> bytes:
+    return "".join(json.dumps(i, ensure_ascii=False) + "\n" for i in items).encode()
+
+
+def _parse_ndjson(resp) -> list[dict]:
+    return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+
+class TestBatchStream:
+
+    @pytest.mark.asyncio
+    async def test_stream_chunks_and_summary(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
+    ):
+        """按 chunk_size 分块写入，逐条返回结果，最后一行为汇总"""
+        _, api_headers = api_key_and_headers
+        items = [_expense_item(accounts, i, external_id=f"s_{i}") for i in range(5)]
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch/stream",
+            params={"book_id": test_book.id, "chunk_size": 2},
+            content=_ndjson(items),
+            headers={**api_headers, "Content-Type": "application/x-ndjson"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        lines = _parse_ndjson(resp)
+        assert [l["index"] for l in lines[:-1]] == [0, 1, 2, 3, 4]
+        assert all(l["status"] == "created" for l in lines[:-1])
+        assert lines[-1] == {
+            "status": "done", "total": 5, "created": 5, "skipped": 0, "chunks": 3,
+        }
+
+    @pytest.mark.asyncio
+    async def test_stream_error_keeps_committed_chunks_and_resumes(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
+    ):
+        """中途出错：已提交的分块保留；修正后重传，已导入的条目被跳过"""
+        _, api_headers = api_key_and_headers
+        items = [_expense_item(accounts, i, external_id=f"r_{i}") for i in range(4)]
+        bad = dict(items[2], category_account_id=str(uuid.uuid4()))
+        url = f"/plugins/{plugin_id}/entries/batch/stream"
+        params = {"book_id": test_book.id, "chunk_size": 2}
+        headers = {**api_headers, "Content-Type": "application/x-ndjson"}
+
+        resp = await client.post(
+            url, params=params, content=_ndjson(items[:2] + [bad, items[3]]), headers=headers
+        )
+        lines = _parse_ndjson(resp)
+        assert lines[-1]["status"] == "error"
+        assert "第 3 条" in lines[-1]["detail"]
+        assert lines[-1]["created"] == 2
+
+        resp = await client.post(url, params=params, content=_ndjson(items), headers=headers)
+        lines = _parse_ndjson(resp)
+        assert [l["status"] for l in lines[:-1]] == ["skipped", "skipped", "created", "created"]
+        assert lines[-1]["created"] == 2
+        assert lines[-1]["skipped"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_database_error_ends_with_error_line(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts,
+        auth_headers, monkeypatch,
+    ):
+        """分块写入抛出数据库错误：仍返回错误行（含已提交计数），插件状态记为失败"""
+        from sqlalchemy.exc import IntegrityError
+
+        from app.services import batch_entry_service
+
+        original = batch_entry_service.batch_create_entries
+        calls = 0
+
+        async def flaky(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise IntegrityError("INSERT INTO journal_entries", {}, Exception("UNIQUE"))
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(batch_entry_service, "batch_create_entries", flaky)
+        _, api_headers = api_key_and_headers
+        items = [_expense_item(accounts, i, external_id=f"db_{i}") for i in range(4)]
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch/stream",
+            params={"book_id": test_book.id, "chunk_size": 2},
+            content=_ndjson(items),
+            headers={**api_headers, "Content-Type": "application/x-ndjson"},
+        )
+        assert resp.status_code == 200
+        lines = _parse_ndjson(resp)
+        assert [l["status"] for l in lines[:-1]] == ["created", "created"]
+        assert lines[-1]["status"] == "error"
+        assert "IntegrityError" in lines[-1]["detail"]
+        assert (lines[-1]["created"], lines[-1]["skipped"]) == (2, 0)
+
+        plugin = (await client.get(f"/plugins/{plugin_id}", headers=auth_headers)).json()
+        assert plugin["last_sync_status"] == "failed"
+        assert "IntegrityError" in plugin["last_error_message"]
+
+    @pytest.mark.asyncio
+    async def test_stream_malformed_line(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, test_book, accounts
+    ):
+        """格式错误的行 → 错误行，之前未满一块的记录不写入"""
+        _, api_headers = api_key_and_headers
+        body = _ndjson([_expense_item(accounts, 0)]) + b'{"entry_type": "expense"}\n'
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch/stream",
+            params={"book_id": test_book.id},
+            content=body,
+            headers=api_headers,
+        )
+        lines = _parse_ndjson(resp)
+        assert len(lines) == 1
+        assert lines[0]["status"] == "error"
+        assert lines[0]["index"] == 1
+        assert "第 2 条记录格式错误" in lines[0]["detail"]
+
+    @pytest.mark.asyncio
+    async def test_stream_forbidden_book(
+        self, client: AsyncClient, api_key_and_headers, plugin_id, accounts
+    ):
+        """账本不存在 → 直接返回 404，不开始流式写入"""
+        _, api_headers = api_key_and_headers
+        resp = await client.post(
+            f"/plugins/{plugin_id}/entries/batch/stream",
+            params={"book_id": str(uuid.uuid4())},
+            content=_ndjson([_expense_item(accounts, 0)]),
+            headers=api_headers,
+        )
+        assert resp.status_code == 404
@@ -283,3 +283,279 @@ class TestBudgetOverviewAndCheck:
         data = resp.json()
         assert data["triggered"] is True
         assert data["alerts"][0]["alert_type"] == "exceeded"
+
+    @pytest.mark.asyncio
+    async def test_parent_budget_rolls_up_children(
+        self, client, auth_headers, test_book: Book
+    ):
+        """父科目预算包含子科目支出（总览、列表、记账后检查一致）"""
+        from datetime import date
+
+        acct_resp = await client.get(
+            f"/books/{test_book.id}/accounts", headers=auth_headers
+        )
+        food_account = next(a for a in acct_resp.json()["expense"] if a["code"] == "5001")
+        cash_equiv = next(a for a in acct_resp.json()["asset"] if a["code"] == "1002")
+        bank_account = next(c for c in cash_equiv["children"] if c["code"] == "1002-01")
+
+        child_ids = []
+        for name in ("外卖", "堂食"):
+            resp = await client.post(
+                f"/books/{test_book.id}/accounts",
+                json={
+                    "name": name,
+                    "type": "expense",
+                    "balance_direction": "debit",
+                    "parent_id": food_account["id"],
+                },
+                headers=auth_headers,
+            )
+            child_ids.append(resp.json()["id"])
+
+        await client.post(
+            f"/books/{test_book.id}/budgets",
+            json={"account_id": food_account["id"], "amount": 1000, "alert_threshold": 0.8},
+            headers=auth_headers,
+        )
+
+        today = date.today().isoformat()
+        for child_id, amount in zip(child_ids, (500, 400)):
+            await client.post(
+                f"/books/{test_book.id}/entries",
+                json={
+                    "entry_type": "expense",
+                    "entry_date": today,
+                    "amount": amount,
+                    "category_account_id": child_id,
+                    "payment_account_id": bank_account["id"],
+                },
+                headers=auth_headers,
+            )
+
+        overview = (await client.get(
+            f"/books/{test_book.id}/budgets/overview", headers=auth_headers
+        )).json()
+        assert overview["total_used"] == 900
+        assert overview["category_budgets"][0]["used_amount"] == 900
+        assert overview["category_budgets"][0]["status"] == "warning"
+
+        listed = (await client.get(
+            f"/books/{test_book.id}/budgets", headers=auth_headers
+        )).json()
+        assert listed[0]["used_amount"] == 900
+
+        resp = await client.post(
+            f"/books/{test_book.id}/budgets/check?account_id={child_ids[0]}",
+            headers=auth_headers,
+        )
+        data = resp.json()
+        assert data["triggered"] is True
+        assert data["alerts"][0]["budget_id"] == overview["category_budgets"][0]["id"]
+        assert data["alerts"][0]["used_amount"] == 900
+
+
+# ──────────── 预算使用额计数器 ────────────
+
+class TestBudgetSpendCounters:
+
+    @staticmethod
+    async def _counters(book_id):
+        from sqlalchemy import select
+        from app.models.balance import BudgetSpendCounter
+        from tests.conftest import TestSessionLocal
+
+        async with TestSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    BudgetSpendCounter.period,
+                    BudgetSpendCounter.account_id,
+                    BudgetSpendCounter.spent,
+                ).where(BudgetSpendCounter.book_id == book_id)
+            )
+            return {(r[0], r[1]): float(r[2]) for r in result.all()}
+
+    @staticmethod
+    async def _verify(book_id):
+        from app.services.ledger_service import verify_spend_counters
+        from tests.conftest import TestSessionLocal
+
+        async with TestSessionLocal() as db:
+            return await verify_spend_counters(db, book_id)
+
+    @staticmethod
+    async def _accounts(client, auth_headers, book_id):
+        tree = (await client.get(f"/books/{book_id}/accounts", headers=auth_headers)).json()
+        food = next(a for a in tree["expense"] if a["code"] == "5001")
+        cash_equiv = next(a for a in tree["asset"] if a["code"] == "1002")
+        bank = next(c for c in cash_equiv["children"] if c["code"] == "1002-01")
+        return food["id"], bank["id"]
+
+    @pytest.mark.asyncio
+    async def test_counter_follows_entry_lifecycle(
+        self, client, auth_headers, test_book: Book
+    ):
+        """新增/编辑/转换/删除分录时同步增减计数器，且与分录明细一致"""
+        from datetime import date
+
+        food_id, bank_id = await self._accounts(client, auth_headers, test_book.id)
+        today = date.today()
+        period = today.strftime("%Y-%m")
+
+        resp = await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "expense",
+                "entry_date": today.isoformat(),
+                "amount": 200,
+                "category_account_id": food_id,
+                "payment_account_id": bank_id,
+            },
+            headers=auth_headers,
+        )
+        entry_id = resp.json()["id"]
+        assert (await self._counters(test_book.id))[(period, food_id)] == 200
+
+        # 改金额
+        resp = await client.put(
+            f"/entries/{entry_id}",
+            json={
+                "amount": 350,
+                "category_account_id": food_id,
+                "payment_account_id": bank_id,
+            },
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        assert (await self._counters(test_book.id))[(period, food_id)] == 350
+        assert await self._verify(test_book.id) == []
+
+        overview = (await client.get(
+            f"/books/{test_book.id}/budgets/overview", headers=auth_headers
+        )).json()
+        assert overview["total_used"] == 350
+
+        # 转为购买资产：费用科目的计数器被冲出
+        resp = await client.post(
+            f"/entries/{entry_id}/convert",
+            json={"target_type": "asset_purchase", "category_account_id": bank_id},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        assert (period, food_id) not in await self._counters(test_book.id)
+        assert await self._verify(test_book.id) == []
+
+        resp = await client.delete(f"/entries/{entry_id}", headers=auth_headers)
+        assert resp.status_code in (200, 204)
+        assert await self._counters(test_book.id) == {}
+        assert await self._verify(test_book.id) == []
+
+    @pytest.mark.asyncio
+    async def test_verify_detects_drift_and_rebuild_fixes(
+        self, client, auth_headers, test_book: Book
+    ):
+        from sqlalchemy import update
+        from app.models.balance import BudgetSpendCounter
+        from app.services.ledger_service import rebuild_spend_counters
+        from tests.conftest import TestSessionLocal
+
+        food_id, bank_id = await self._accounts(client, auth_headers, test_book.id)
+        await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "expense",
+                "entry_date": "2025-03-10",
+                "amount": 80,
+                "category_account_id": food_id,
+                "payment_account_id": bank_id,
+            },
+            headers=auth_headers,
+        )
+
+        async with TestSessionLocal() as db:
+            await db.execute(
+                update(BudgetSpendCounter)
+                .where(BudgetSpendCounter.book_id == test_book.id)
+                .values(spent=1)
+            )
+            await db.commit()
+
+        drifts = await self._verify(test_book.id)
+        assert len(drifts) == 1
+        assert drifts[0].period == "2025-03"
+        assert drifts[0].account_id == food_id
+        assert float(drifts[0].ledger) == 80
+
+        async with TestSessionLocal() as db:
+            await rebuild_spend_counters(db, test_book.id)
+            await db.commit()
+        assert await self._verify(test_book.id) == []
+        assert await self._counters(test_book.id) == {("2025-03", food_id): 80}
+
+
+# ──────────── 多期预算执行 ────────────
+
+class TestBudgetHistory:
+
+    @pytest.mark.asyncio
+    async def test_history_matrix(self, client, auth_headers, test_book: Book):
+        """最近 N 个月的实际支出、差额、使用率按月对齐"""
+        from datetime import date, timedelta
+
+        tree = (await client.get(
+            f"/books/{test_book.id}/accounts", headers=auth_headers
+        )).json()
+        food = next(a for a in tree["expense"] if a["code"] == "5001")
+        cash_equiv = next(a for a in tree["asset"] if a["code"] == "1002")
+        bank = next(c for c in cash_equiv["children"] if c["code"] == "1002-01")
+
+        await client.post(
+            f"/books/{test_book.id}/budgets",
+            json={"amount": 1000},
+            headers=auth_headers,
+        )
+        await client.post(
+            f"/books/{test_book.id}/budgets",
+            json={"account_id": food["id"], "amount": 500, "alert_threshold": 0.8},
+            headers=auth_headers,
+        )
+
+        today = date.today()
+        prev_month_end = today.replace(day=1) - timedelta(days=1)
+        for day, amount in ((today, 450), (prev_month_end, 600)):
+            await client.post(
+                f"/books/{test_book.id}/entries",
+                json={
+                    "entry_type": "expense",
+                    "entry_date": day.isoformat(),
+                    "amount": amount,
+                    "category_account_id": food["id"],
+                    "payment_account_id": bank["id"],
+                },
+                headers=auth_headers,
+            )
+
+        resp = await client.get(
+            f"/books/{test_book.id}/budgets/history?months=3", headers=auth_headers
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["periods"][-1] == today.strftime("%Y-%m")
+        assert data["periods"][-2] == prev_month_end.strftime("%Y-%m")
+        assert data["total_expense"] == [0, 600, 450]
+
+        total_row = next(r for r in data["rows"] if r["account_id"] is None)
+        assert total_row["actual"] == [0, 600, 450]
+        assert total_row["variance"] == [1000, 400, 550]
+
+        food_row = next(r for r in data["rows"] if r["account_id"] == food["id"])
+        assert food_row["actual"] == [0, 600, 450]
+        assert food_row["variance"] == [500, -100, 50]
+        assert food_row["usage_rate"] == [0, 1.2, 0.9]
+        assert food_row["status"] == ["normal", "exceeded", "warning"]
+
+    @pytest.mark.asyncio
+    async def test_history_months_validated(self, client, auth_headers, test_book: Book):
+        resp = await client.get(
+            f"/books/{test_book.id}/budgets/history?months=0", headers=auth_headers
+        )
+        assert resp.status_code == 422
@@ -0,0 +1,71 @@
+"""SQLite 存储配置测试
+
+覆盖：
+- default 配置不改变 SQLite 默认行为，读写共用一个引擎
+- production 配置在每个连接上启用 WAL 等 PRAGMA
+- production 配置的只读引擎拒绝写入
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import create_engines, sqlite_pragmas
+
+
+class TestStorageProfile:
+
+    @pytest.mark.asyncio
+    async def test_default_profile_single_engine(self, tmp_path):
+        engine, read_engine = create_engines(
+            f"sqlite+aiosqlite:///{tmp_path / 'default.db'}", "default"
+        )
+        try:
+            assert read_engine is engine
+            async with engine.connect() as conn:
+                mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            assert mode.lower() == "delete"
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_production_profile_pragmas(self, tmp_path):
+        engine, read_engine = create_engines(
+            f"sqlite+aiosqlite:///{tmp_path / 'prod.db'}", "production"
+        )
+        try:
+            assert read_engine is not engine
+            async with engine.connect() as conn:
+                values = {
+                    name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+                }
+            assert values["journal_mode"].lower() == "wal"
+            assert values["synchronous"] == 1  # NORMAL
+            assert values["busy_timeout"] > 0
+            assert values["temp_store"] == 2  # MEMORY
+        finally:
+            await engine.dispose()
+            await read_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_read_engine_rejects_writes(self, tmp_path):
+        engine, read_engine = create_engines(
+            f"sqlite+aiosqlite:///{tmp_path / 'ro.db'}", "production"
+        )
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE t (v INTEGER)"))
+                await conn.execute(text("INSERT INTO t VALUES (1)"))
+
+            async with read_engine.connect() as conn:
+                assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 1
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("INSERT INTO t VALUES (2)"))
+        finally:
+            await engine.dispose()
+            await read_engine.dispose()
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            sqlite_pragmas("turbo")
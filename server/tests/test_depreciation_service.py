@@ -18,8 +18,9 @@ from types import SimpleNamespace
 
 import pytest
 import pytest_asyncio
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.models.asset import FixedAsset
 from app.models.account import Account
@@ -264,6 +265,238 @@ class TestDepreciateAllActive:
             assert daily_asset.id in entries[0].description
 
 
+class TestDepreciateBulk:
+    """跨账本批量计提"""
+
+    @staticmethod
+    async def _make_book(owner_id: str, with_accounts: bool = True) -> tuple[str, str]:
+        """新建账本及一项月度资产，返回 (book_id, asset_id)"""
+        from app.models.book import Book
+        from app.utils.seed import seed_accounts_for_book
+
+        async with TestSessionLocal() as db:
+            book = Book(id=str(uuid.uuid4()), name="批量账本", type="personal", owner_id=owner_id)
+            db.add(book)
+            await db.flush()
+            account_id = str(uuid.uuid4())
+            if with_accounts:
+                await seed_accounts_for_book(db, book.id)
+                account_id = (await db.execute(
+                    select(Account.id).where(Account.book_id == book.id, Account.code == "1501")
+                )).scalar_one()
+            asset = FixedAsset(
+                id=str(uuid.uuid4()), book_id=book.id, account_id=account_id,
+                name="批量资产", purchase_date=date(2025, 1, 1), original_cost=3600.0,
+                residual_rate=0, useful_life_months=36, depreciation_method="straight_line",
+                depreciation_granularity="monthly", accumulated_depreciation=0, status="active",
+            )
+            db.add(asset)
+            await db.commit()
+            return book.id, asset.id
+
+    @pytest.mark.asyncio
+    async def test_bulk_matches_single_period(self, sample_asset, daily_asset, test_user):
+        """批量计提结果与逐个计提一致，重复执行不重复计提"""
+        from app.models.asset import DepreciationRecord
+        from app.services.depreciation_service import depreciate_bulk
+
+        async with TestSessionLocal() as db:
+            result = await depreciate_bulk(db, "2025-01", "monthly", test_user.id)
+            await db.commit()
+        assert result.created == 1
+        assert result.failed_books == {}
+        assert {"load_assets", "resolve_accounts", "compute", "write", "total"} <= result.timings.keys()
+
+        async with TestSessionLocal() as db:
+            asset = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == sample_asset.id)
+            )).scalar_one()
+            assert float(asset.accumulated_depreciation) == pytest.approx(211.11, abs=0.01)
+            daily = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == daily_asset.id)
+            )).scalar_one()
+            assert float(daily.accumulated_depreciation) == 0
+
+            history = await get_depreciation_history(db, sample_asset.id)
+            assert [h["period"] for h in history] == ["2025-01"]
+            entry = (await db.execute(
+                select(JournalEntry)
+                .options(selectinload(JournalEntry.lines))
+                .where(JournalEntry.id == history[0]["entry_id"])
+            )).scalar_one()
+            assert entry.description == f"折旧 - {asset.name} [{asset.id}] 2025-01"
+            assert sum(float(l.debit_amount) for l in entry.lines) == pytest.approx(211.11, abs=0.01)
+
+            # 同一期再跑：0 条；单个计提也被台账拦截
+            again = await depreciate_bulk(db, "2025-01", "monthly", test_user.id)
+            assert again.created == 0
+            with pytest.raises(AssetError, match="已计提过折旧"):
+                await depreciate_one_period(db, asset, "2025-01", test_user.id)
+
+            count = (await db.execute(
+                select(func.count()).select_from(DepreciationRecord)
+            )).scalar()
+            assert count == 1
+
+    @pytest.mark.asyncio
+    async def test_bulk_isolates_failing_books(self, test_user, monkeypatch):
+        """缺少科目或写入失败的账本被跳过，其他账本照常计提"""
+        from app.services import depreciation_service
+        from app.services.depreciation_service import depreciate_bulk
+
+        ok_book, ok_asset = await self._make_book(test_user.id)
+        broken_book, _ = await self._make_book(test_user.id)
+        no_accounts_book, _ = await self._make_book(test_user.id, with_accounts=False)
+
+        original = depreciation_service.ledger_service.apply_deltas
+
+        async def failing_apply(db, book_id, deltas):
+            if book_id == broken_book:
+                raise RuntimeError("模拟写入失败")
+            return await original(db, book_id, deltas)
+
+        monkeypatch.setattr(depreciation_service.ledger_service, "apply_deltas", failing_apply)
+
+        async with TestSessionLocal() as db:
+            result = await depreciate_bulk(db, "2025-02", "monthly", test_user.id)
+            await db.commit()
+
+        assert result.created == 1
+        assert set(result.failed_books) == {broken_book, no_accounts_book}
+
+        async with TestSessionLocal() as db:
+            entries = (await db.execute(
+                select(JournalEntry.book_id).where(JournalEntry.entry_type == "depreciation")
+            )).scalars().all()
+            assert entries == [ok_book]
+            assert len(await get_depreciation_history(db, ok_asset)) == 1
+
+
+class TestDepreciationCatchUp:
+    """补提缺失期间"""
+
+    @pytest.mark.asyncio
+    async def test_catch_up_posts_missing_periods(self, sample_asset, daily_asset, test_user):
+        """补提已结束的各期，分录日期为期末，跳过已计提期间，重复执行无新增"""
+        from app.services.depreciation_service import depreciate_catch_up
+
+        async with TestSessionLocal() as db:
+            asset = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == sample_asset.id)
+            )).scalar_one()
+            await depreciate_one_period(db, asset, "2025-02", test_user.id)
+            await db.commit()
+
+        async with TestSessionLocal() as db:
+            result = await depreciate_catch_up(db, date(2025, 4, 15), test_user.id)
+            await db.commit()
+        # 月度：2025-01、2025-03（02 已计提，04 未结束）；每日：01-01 ~ 04-15 共 105 天
+        assert result.created == 2 + 105
+        assert result.assets == 2
+        assert result.failed_books == {}
+
+        async with TestSessionLocal() as db:
+            history = await get_depreciation_history(db, sample_asset.id)
+            assert sorted(h["period"] for h in history) == ["2025-01", "2025-02", "2025-03"]
+            dates = (await db.execute(
+                select(JournalEntry.entry_date)
+                .where(JournalEntry.id.in_(
+                    [h["entry_id"] for h in history if h["period"] != "2025-02"]
+                ))
+                .order_by(JournalEntry.entry_date)
+            )).scalars().all()
+            assert dates == [date(2025, 1, 31), date(2025, 3, 31)]
+
+            asset = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == sample_asset.id)
+            )).scalar_one()
+            assert float(asset.accumulated_depreciation) == pytest.approx(211.11 * 3, abs=0.01)
+            daily = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == daily_asset.id)
+            )).scalar_one()
+            assert float(daily.accumulated_depreciation) == pytest.approx(7.04 * 105, abs=0.01)
+
+            again = await depreciate_catch_up(db, date(2025, 4, 15), test_user.id)
+            assert again.created == 0
+            assert again.assets == 0
+
+    @pytest.mark.asyncio
+    async def test_catch_up_stops_at_max_depreciation(self, test_book, fixed_asset_account, test_user):
+        """逐期累计到可折旧总额为止，最后一期不足整期"""
+        from app.services.depreciation_service import depreciate_catch_up
+
+        async with TestSessionLocal() as db:
+            asset = FixedAsset(
+                id=str(uuid.uuid4()), book_id=test_book.id, account_id=fixed_asset_account.id,
+                name="短期资产", purchase_date=date(2025, 1, 10), original_cost=1000.0,
+                residual_rate=0, useful_life_months=3, depreciation_method="straight_line",
+                depreciation_granularity="monthly", accumulated_depreciation=0, status="active",
+            )
+            db.add(asset)
+            await db.commit()
+
+        async with TestSessionLocal() as db:
+            result = await depreciate_catch_up(db, date(2025, 12, 31), test_user.id)
+            await db.commit()
+        assert result.total_amount == pytest.approx(1000.0)
+
+        async with TestSessionLocal() as db:
+            history = await get_depreciation_history(db, asset.id)
+            assert [h["amount"] for h in history] == pytest.approx([333.33, 333.33, 333.33, 0.01])
+            loaded = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == asset.id)
+            )).scalar_one()
+            assert float(loaded.accumulated_depreciation) == pytest.approx(1000.0)
+            assert not can_depreciate(loaded)
+
+    @pytest.mark.asyncio
+    async def test_catch_up_counts_depreciation_outside_ledger(self, sample_asset, test_user):
+        """累计折旧中未记入台账的部分（自由格式期间、期初累计折旧）抵扣最早的期间，不重复计提"""
+        from app.models.asset import DepreciationRecord
+        from app.services.depreciation_service import depreciate_catch_up
+
+        async with TestSessionLocal() as db:
+            asset = await db.get(FixedAsset, sample_asset.id)
+            # 旧版手工折旧：期间标签无法识别为 2025-01
+            await depreciate_one_period(db, asset, "2025年1月", test_user.id)
+            # 另有一期折旧直接体现在期初累计折旧中，没有台账
+            asset.accumulated_depreciation = float(asset.accumulated_depreciation) + 211.11
+            await db.commit()
+
+        async with TestSessionLocal() as db:
+            result = await depreciate_catch_up(db, date(2025, 4, 15), test_user.id)
+            await db.commit()
+        assert (result.created, result.skipped_assets) == (1, {})
+
+        async with TestSessionLocal() as db:
+            labels = (await db.execute(
+                select(DepreciationRecord.period_label)
+                .where(DepreciationRecord.asset_id == sample_asset.id)
+            )).scalars().all()
+            assert sorted(labels) == ["2025-03", "2025年1月"]
+            asset = await db.get(FixedAsset, sample_asset.id)
+            assert float(asset.accumulated_depreciation) == pytest.approx(211.11 * 3, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_catch_up_refuses_unreconciled_asset(self, sample_asset, test_user):
+        """累计折旧与台账对不上（不足整期或少于台账合计）时跳过该资产"""
+        from app.services.depreciation_service import depreciate_catch_up
+
+        for accumulated in (100.0, 0.0):
+            async with TestSessionLocal() as db:
+                asset = await db.get(FixedAsset, sample_asset.id)
+                if accumulated == 0.0:
+                    await depreciate_one_period(db, asset, "2025-01", test_user.id)
+                asset.accumulated_depreciation = accumulated
+                await db.commit()
+
+            async with TestSessionLocal() as db:
+                result = await depreciate_catch_up(db, date(2025, 4, 15), test_user.id)
+                await db.commit()
+            assert result.created == 0
+            assert sample_asset.id in result.skipped_assets
+
+
 class TestDisposeAsset:
     """资产处置测试"""
 
@@ -375,3 +608,72 @@ class TestDepreciationHistory:
         async with TestSessionLocal() as db:
             history = await get_depreciation_history(db, sample_asset.id)
             assert history == []
+
+
+class TestDepreciationRecords:
+    """折旧台账：防重复、删除分录释放期间、旧数据回填"""
+
+    @pytest.mark.asyncio
+    async def test_record_created_and_released_on_entry_delete(self, sample_asset, test_user):
+        from app.models.asset import DepreciationRecord
+        from app.services.entry_service import delete_entry, get_entry_detail
+
+        async with TestSessionLocal() as db:
+            asset = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == sample_asset.id)
+            )).scalar_one()
+            entry = await depreciate_one_period(db, asset, "2025-03", test_user.id)
+            await db.commit()
+
+            records = (await db.execute(
+                select(DepreciationRecord).where(DepreciationRecord.asset_id == asset.id)
+            )).scalars().all()
+            assert [(r.period_label, r.entry_id) for r in records] == [("2025-03", entry.id)]
+            assert float(records[0].amount) == pytest.approx(211.11, abs=0.01)
+
+            # 删除折旧分录后，该期可重新计提
+            await delete_entry(db, await get_entry_detail(db, entry.id))
+            await db.commit()
+            assert await get_depreciation_history(db, asset.id) == []
+
+            await depreciate_one_period(db, asset, "2025-03", test_user.id)
+            await db.commit()
+            assert len(await get_depreciation_history(db, asset.id)) == 1
+
+    @pytest.mark.asyncio
+    async def test_backfill_from_legacy_descriptions(self, sample_asset, test_user):
+        """旧版仅写摘要的折旧分录，迁移后可查历史且防重复生效"""
+        from app.database import _migrate_depreciation_records
+        from tests.conftest import test_engine
+
+        async with TestSessionLocal() as db:
+            for period, day in (("2024-11", date(2024, 11, 30)), ("2024-12", date(2024, 12, 31))):
+                entry = JournalEntry(
+                    book_id=sample_asset.book_id,
+                    user_id=test_user.id,
+                    entry_date=day,
+                    entry_type="depreciation",
+                    description=f"折旧 - {sample_asset.name} [{sample_asset.id}] {period}",
+                )
+                entry.lines = [
+                    JournalLine(account_id=sample_asset.account_id,
+                                debit_amount=Decimal("100"), credit_amount=Decimal("0")),
+                    JournalLine(account_id=sample_asset.account_id,
+                                debit_amount=Decimal("0"), credit_amount=Decimal("100")),
+                ]
+                db.add(entry)
+            await db.commit()
+
+        async with test_engine.begin() as conn:
+            await _migrate_depreciation_records(conn)
+
+        async with TestSessionLocal() as db:
+            history = await get_depreciation_history(db, sample_asset.id)
+            assert [h["period"] for h in history] == ["2024-11", "2024-12"]
+            assert history[-1]["accumulated"] == pytest.approx(200)
+
+            asset = (await db.execute(
+                select(FixedAsset).where(FixedAsset.id == sample_asset.id)
+            )).scalar_one()
+            with pytest.raises(AssetError, match="已计提过折旧"):
+                await depreciate_one_period(db, asset, "2024-12", test_user.id)
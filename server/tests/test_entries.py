@@ -413,6 +413,154 @@ class TestEntryCRUD:
         )
         assert resp.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_list_cursor_pagination(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """游标翻页：顺序与页码分页一致、无重复，末页 next_cursor 为空"""
+        food_id = await _get_account_id(client, test_book.id, "5001", auth_headers)
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        # 同一天多条，验证 (created_at, id) 作为平局键
+        for i, day in enumerate(["2025-06-01", "2025-06-03", "2025-06-03", "2025-06-03", "2025-06-02"]):
+            await client.post(
+                f"/books/{test_book.id}/entries",
+                json={
+                    "entry_type": "expense",
+                    "entry_date": day,
+                    "amount": 10 + i,
+                    "category_account_id": food_id,
+                    "payment_account_id": cash_id,
+                },
+                headers=auth_headers,
+            )
+
+        full = await client.get(
+            f"/books/{test_book.id}/entries?page_size=100", headers=auth_headers
+        )
+        expected = [item["id"] for item in full.json()["items"]]
+        assert full.json()["total"] == 5
+        assert full.json()["next_cursor"] is None
+
+        seen: list[str] = []
+        cursor = None
+        for _ in range(5):
+            url = f"/books/{test_book.id}/entries?page_size=2"
+            if cursor:
+                url += f"&cursor={cursor}"
+            resp = await client.get(url, headers=auth_headers)
+            assert resp.status_code == 200
+            data = resp.json()
+            if cursor:
+                assert data["total"] is None
+            seen += [item["id"] for item in data["items"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        assert seen == expected
+        dates = [item["entry_date"] for item in full.json()["items"]]
+        assert dates == sorted(dates, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_list_cursor_with_account_filter_and_total(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """按科目筛选 + 游标翻页，include_total 时返回总数"""
+        food_id = await _get_account_id(client, test_book.id, "5001", auth_headers)
+        other_id = await _get_account_id(client, test_book.id, "5002", auth_headers)
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        for category in [food_id, other_id, food_id, food_id]:
+            await client.post(
+                f"/books/{test_book.id}/entries",
+                json={
+                    "entry_type": "expense",
+                    "entry_date": "2025-06-10",
+                    "amount": 20,
+                    "category_account_id": category,
+                    "payment_account_id": cash_id,
+                },
+                headers=auth_headers,
+            )
+
+        first = await client.get(
+            f"/books/{test_book.id}/entries?account_id={food_id}&page_size=2",
+            headers=auth_headers,
+        )
+        assert first.json()["total"] == 3
+        assert len(first.json()["items"]) == 2
+        second = await client.get(
+            f"/books/{test_book.id}/entries?account_id={food_id}&page_size=2"
+            f"&cursor={first.json()['next_cursor']}&include_total=true",
+            headers=auth_headers,
+        )
+        data = second.json()
+        assert data["total"] == 3
+        assert len(data["items"]) == 1
+        assert data["next_cursor"] is None
+
+        # 新增分录后缓存的总数随账务版本失效
+        await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "expense",
+                "entry_date": "2025-06-11",
+                "amount": 5,
+                "category_account_id": food_id,
+                "payment_account_id": cash_id,
+            },
+            headers=auth_headers,
+        )
+        again = await client.get(
+            f"/books/{test_book.id}/entries?account_id={food_id}",
+            headers=auth_headers,
+        )
+        assert again.json()["total"] == 4
+
+    @pytest.mark.asyncio
+    async def test_list_total_sees_other_process_writes(
+        self, client: AsyncClient, auth_headers, test_book: Book, test_user
+    ):
+        """总数缓存以数据库中的账务版本号为准：其他进程写入并递增版本号后不返回旧总数"""
+        from datetime import date as _date
+
+        from sqlalchemy import text
+
+        from app.models.journal import JournalEntry
+        from tests.conftest import TestSessionLocal
+
+        url = f"/books/{test_book.id}/entries"
+        assert (await client.get(url, headers=auth_headers)).json()["total"] == 0
+        assert (await client.get(url, headers=auth_headers)).json()["total"] == 0
+
+        # 模拟另一进程：直接写库，只留下持久化的版本号，本进程无任何事件通知
+        async with TestSessionLocal() as db:
+            db.add(JournalEntry(
+                book_id=test_book.id,
+                user_id=test_user.id,
+                entry_date=_date(2025, 6, 1),
+                entry_type="manual",
+                description="其他进程写入",
+            ))
+            await db.execute(
+                text(
+                    "INSERT INTO ledger_versions (book_id, version) VALUES (:b, 1) "
+                    "ON CONFLICT(book_id) DO UPDATE SET version = version + 1"
+                ),
+                {"b": test_book.id},
+            )
+            await db.commit()
+        assert (await client.get(url, headers=auth_headers)).json()["total"] == 1
+
+    @pytest.mark.asyncio
+    async def test_list_invalid_cursor(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        resp = await client.get(
+            f"/books/{test_book.id}/entries?cursor=not-a-cursor",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+        assert "游标" in resp.json()["detail"]
+
     @pytest.mark.asyncio
     async def test_get_entry_detail(
         self, client: AsyncClient, auth_headers, test_book: Book
@@ -0,0 +1,370 @@
+"""对账单文件导入测试：CSV 列映射、OFX 解析、分块提交、重复上传续传、生成分录"""
+
+import io
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.adapters.file_import import FileImportAdapter, FileImportError
+from app.models.book import Book
+from app.models.journal import JournalEntry
+from app.models.sync import ExternalTransaction
+
+from tests.conftest import TestSessionLocal
+from tests.test_matching import _data_source, _expense, _get_account_id
+
+CMB_CSV = """招商银行交易明细
+账号: 6225********1234
+交易日期,摘要,收入,支出,余额,对方户名,流水号
+2025-06-01,星巴克咖啡,,35.50,"1,964.50",星巴克,A001
+2025/06/02,工资,"8,000.00",,"9,964.50",某公司,A002
+2025-06-03,超市,,¥120.00,"9,844.50",永辉,A003
+"""
+
+CMB_CONFIG = {
+    "skip_rows": 2,
+    "columns": {
+        "date": "交易日期",
+        "description": "摘要",
+        "inflow": "收入",
+        "outflow": "支出",
+        "balance": "余额",
+        "counterparty": "对方户名",
+        "external_id": "流水号",
+    },
+}
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+CHARSET:1252
+
+<OFX>
+<CREDITCARDMSGSRSV1><CCSTMTTRNRS><CCSTMTRS>
+<CURDEF>CNY
+<BANKTRANLIST>
+<DTSTART>20250601
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250603120000[+8:CST]
+<TRNAMT>-80.00
+<FITID>F1
+<NAME>中石化 &amp; 加油
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20250605
+<TRNAMT>500.00
+<FITID>F2
+<NAME>还款
+<MEMO>自动还款
+</BANKTRANLIST>
+<LEDGERBAL><BALAMT>-1200.50<DTASOF>20250630</LEDGERBAL>
+</CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1>
+</OFX>
+"""
+
+
+def _adapter(text: str, config=None, filename="statement.csv", encoding="utf-8"):
+    return FileImportAdapter(io.BytesIO(text.encode(encoding)), config, filename)
+
+
+class _LargeCsv(io.RawIOBase):
+    """按需生成的 CSV 文件，不在内存中保留完整内容"""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self.seek(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        assert offset == 0 and whence == 0
+        self._lines = self._generate()
+        self._pending = b""
+        return 0
+
+    def _generate(self):
+        yield b"date,amount,description\n"
+        for i in range(self.rows):
+            yield f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d},-{i % 5000 + 1}.25,merchant {i}\n".encode()
+
+    def readinto(self, buffer):
+        while len(self._pending) < len(buffer):
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._pending += line
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class TestFileImportAdapter:
+
+    @pytest.mark.asyncio
+    async def test_csv_column_mapping(self):
+        adapter = _adapter(CMB_CSV, CMB_CONFIG)
+        rows = list(adapter.iter_transactions())
+        assert adapter.format == "csv"
+        assert [r["amount"] for r in rows] == [Decimal("-35.50"), Decimal("8000.00"), Decimal("-120.00")]
+        assert rows[1]["date"] == date(2025, 6, 2)
+        assert rows[0]["counterparty"] == "星巴克"
+        assert [r["external_id"] for r in rows] == ["A001", "A002", "A003"]
+        assert await adapter.fetch_balance("acc", date(2025, 6, 2)) == Decimal("9964.50")
+        txns = await adapter.fetch_transactions("acc", date(2025, 6, 2), date(2025, 6, 30))
+        assert [t["description"] for t in txns] == ["工资", "超市"]
+
+    def test_csv_without_ids_gets_stable_row_ids(self):
+        text = "date,amount\n2025-06-01,-10\n2025-06-01,-10\n"
+        first = [r["external_id"] for r in _adapter(text).iter_transactions()]
+        second = [r["external_id"] for r in _adapter(text).iter_transactions()]
+        assert first == second
+        # 同日同金额的两笔交易不会被误判为重复
+        assert len(set(first)) == 2
+
+    def test_gbk_and_index_columns(self):
+        text = "2025-06-01;-1.234,00;午餐\n"
+        config = {
+            "encoding": "gbk", "delimiter": ";", "has_header": False,
+            "columns": {"date": 0, "amount": 1, "description": 2},
+        }
+        # 欧式金额格式不做猜测，应报出行号
+        with pytest.raises(FileImportError, match="第 1 行"):
+            list(_adapter(text, config, encoding="gbk").iter_transactions())
+        rows = list(_adapter("2025-06-01;-1234.00;午餐\n", config, encoding="gbk").iter_transactions())
+        assert rows[0]["amount"] == Decimal("-1234.00")
+        assert rows[0]["description"] == "午餐"
+
+    def test_wrong_encoding_and_missing_column(self):
+        with pytest.raises(FileImportError, match="encoding"):
+            list(_adapter("date,amount\n2025-06-01,-1\n", {}, encoding="utf-16").iter_transactions())
+        with pytest.raises(FileImportError, match="缺少列: 金额"):
+            list(_adapter("date,amount\n", {"columns": {"date": "date", "amount": "金额"}}).iter_transactions())
+        with pytest.raises(FileImportError, match="amount"):
+            FileImportAdapter(io.BytesIO(b""), {"columns": {"date": 0}})
+
+    def test_skip_invalid_rows(self):
+        text = "date,amount\n2025-06-01,-10\n合计,-10\n"
+        with pytest.raises(FileImportError, match="第 3 行"):
+            list(_adapter(text).iter_transactions())
+        rows = list(_adapter(text, {"skip_invalid_rows": True}).iter_transactions())
+        assert len(rows) == 1
+
+    @pytest.mark.asyncio
+    async def test_ofx_credit_card(self):
+        adapter = _adapter(OFX_SGML, {}, filename="card.qfx")
+        rows = list(adapter.iter_transactions())
+        assert adapter.format == "ofx"
+        # 信用卡：消费使负债增加，记为正数
+        assert [(r["date"], r["amount"]) for r in rows] == [
+            (date(2025, 6, 3), Decimal("80.00")),
+            (date(2025, 6, 5), Decimal("-500.00")),
+        ]
+        assert rows[0]["description"] == "中石化 & 加油"
+        assert rows[1]["description"] == "自动还款"
+        assert [r["external_id"] for r in rows] == ["F1", "F2"]
+        assert await adapter.fetch_balance("acc", date(2025, 6, 30)) == Decimal("1200.50")
+
+    def test_ofx_xml_detected_by_content(self):
+        xml = (
+            '<?xml version="1.0"?><?OFX OFXHEADER="200"?><OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>'
+            "<BANKTRANLIST><STMTTRN><DTPOSTED>20250601</DTPOSTED><TRNAMT>-12.5</TRNAMT>"
+            "<FITID>X1</FITID><NAME>Lunch</NAME></STMTTRN></BANKTRANLIST></STMTRS>"
+            "</STMTTRNRS></BANKMSGSRSV1></OFX>"
+        )
+        adapter = _adapter(xml, {}, filename=None)
+        assert adapter.format == "ofx"
+        rows = list(adapter.iter_transactions())
+        assert rows[0]["amount"] == Decimal("-12.5")
+        assert rows[0]["external_id"] == "X1"
+
+    def test_large_file_streams_in_constant_memory(self):
+        """10 万行按需生成的文件逐块解析；峰值内存只与分块大小有关"""
+        adapter = FileImportAdapter(_LargeCsv(100_000), {}, "big.csv")
+        sizes = [len(chunk) for chunk in adapter.iter_chunks(1000)]
+        assert (sum(sizes), len(sizes)) == (100_000, 100)
+
+        # 2 万行全部留在内存约需 10MB 以上
+        adapter = FileImportAdapter(_LargeCsv(20_000), {}, "big.csv")
+        tracemalloc.start()
+        try:
+            for _ in adapter.iter_chunks(1000):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 4 * 1024 * 1024
+
+
+class TestFileImportApi:
+
+    async def _upload(self, client, book_id, source_id, headers, content, filename="bank.csv", **params):
+        return await client.post(
+            f"/books/{book_id}/data-sources/{source_id}/import",
+            params=params,
+            files={"file": (filename, content.encode("utf-8") if isinstance(content, str) else content)},
+            headers=headers,
+        )
+
+    async def _configure(self, client, book_id, source_id, headers, config):
+        resp = await client.put(
+            f"/books/{book_id}/data-sources/{source_id}", json={"config": config}, headers=headers
+        )
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    @pytest.mark.asyncio
+    async def test_chunked_import_matches_and_resumes(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        await _expense(client, test_book.id, auth_headers, 35.5, "2025-06-01", "星巴克")
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        await self._configure(client, test_book.id, source_id, auth_headers, CMB_CONFIG)
+
+        resp = await self._upload(client, test_book.id, source_id, auth_headers, CMB_CSV, chunk_size=2)
+        assert resp.status_code == 200, resp.text
+        data = resp.json()
+        assert (data["format"], data["total"], data["imported"], data["chunks"]) == ("csv", 3, 3, 2)
+        assert (data["matched"], data["unmatched"]) == (1, 2)
+
+        # 重复上传：全部按流水号跳过
+        again = (await self._upload(client, test_book.id, source_id, auth_headers, CMB_CSV)).json()
+        assert (again["imported"], again["skipped"]) == (0, 3)
+
+        # 追加新行后上传：只写入新增部分
+        more = CMB_CSV + "2025-06-04,地铁,,4.00,9840.50,地铁,A004\n"
+        resumed = (await self._upload(client, test_book.id, source_id, auth_headers, more)).json()
+        assert (resumed["imported"], resumed["skipped"]) == (1, 3)
+
+        async with TestSessionLocal() as db:
+            count = (await db.execute(
+                select(func.count()).select_from(ExternalTransaction)
+                .where(ExternalTransaction.data_source_id == source_id)
+            )).scalar_one()
+        assert count == 4
+
+    @pytest.mark.asyncio
+    async def test_parse_error_keeps_committed_chunks(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        text = "date,amount\n2025-06-01,-1\n2025-06-02,-2\nbad,-3\n"
+        resp = await self._upload(client, test_book.id, source_id, auth_headers, text, chunk_size=2)
+        assert resp.status_code == 400
+        assert "第 4 行" in resp.json()["detail"]
+        assert "已导入 2 条" in resp.json()["detail"]
+
+        fixed = text.replace("bad", "2025-06-03")
+        data = (await self._upload(client, test_book.id, source_id, auth_headers, fixed)).json()
+        assert (data["imported"], data["skipped"]) == (1, 2)
+
+    @pytest.mark.asyncio
+    async def test_database_error_reports_committed_chunks(
+        self, client: AsyncClient, auth_headers, test_book: Book, monkeypatch
+    ):
+        from sqlalchemy.exc import IntegrityError
+
+        from app.services import statement_import_service
+
+        original = statement_import_service.add_transactions
+        calls = 0
+
+        async def flaky(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise IntegrityError("INSERT INTO external_transactions", {}, Exception("UNIQUE"))
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(statement_import_service, "add_transactions", flaky)
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        text = "date,amount\n2025-06-01,-1\n2025-06-02,-2\n2025-06-03,-3\n"
+        resp = await self._upload(client, test_book.id, source_id, auth_headers, text, chunk_size=2)
+        assert resp.status_code == 500
+        detail = resp.json()["detail"]
+        assert "IntegrityError" in detail
+        assert "已导入 2 条" in detail
+
+    @pytest.mark.asyncio
+    async def test_import_as_entries(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        from tests.test_sync import _assert_rollup_consistent
+
+        expense_id = await _get_account_id(client, test_book.id, "5100", auth_headers)
+        income_id = await _get_account_id(client, test_book.id, "4005", auth_headers)
+        source_id = await _data_source(client, test_book.id, auth_headers, code="2001")
+
+        resp = await self._upload(
+            client, test_book.id, source_id, auth_headers, OFX_SGML, "card.ofx", target="entries"
+        )
+        assert resp.status_code == 400
+        assert "expense_account_id" in resp.json()["detail"]
+
+        await self._configure(client, test_book.id, source_id, auth_headers, {
+            "expense_account_id": expense_id, "income_account_id": income_id,
+        })
+        resp = await self._upload(
+            client, test_book.id, source_id, auth_headers, OFX_SGML, "card.ofx", target="entries"
+        )
+        assert resp.status_code == 200, resp.text
+        assert (resp.json()["imported"], resp.json()["matched"]) == (2, 0)
+        again = await self._upload(
+            client, test_book.id, source_id, auth_headers, OFX_SGML, "card.ofx", target="entries"
+        )
+        assert (again.json()["imported"], again.json()["skipped"]) == (0, 2)
+
+        async with TestSessionLocal() as db:
+            entries = (await db.execute(
+                select(JournalEntry).where(JournalEntry.book_id == test_book.id)
+                .order_by(JournalEntry.entry_date)
+            )).scalars().all()
+        assert [(e.entry_type, e.description) for e in entries] == [
+            ("expense", "中石化 & 加油"), ("income", "自动还款"),
+        ]
+        await _assert_rollup_consistent(test_book.id)
+
+    @pytest.mark.asyncio
+    async def test_entry_error_points_to_file_row_after_zero_rows(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        expense_id = await _get_account_id(client, test_book.id, "5100", auth_headers)
+        # 非末级科目，收入行创建分录时失败
+        parent_id = await _get_account_id(client, test_book.id, "1001-02", auth_headers)
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        await self._configure(client, test_book.id, source_id, auth_headers, {
+            "expense_account_id": expense_id, "income_account_id": parent_id,
+        })
+
+        text = "date,amount\n2025-06-01,0\n2025-06-02,-5\n2025-06-03,0\n2025-06-04,8\n"
+        resp = await self._upload(
+            client, test_book.id, source_id, auth_headers, text, target="entries", chunk_size=2
+        )
+        assert resp.status_code == 400
+        detail = resp.json()["detail"]
+        # 第 1、3 条金额为零被跳过，报错序号仍指向文件中的第 4 条
+        assert "第 4 条" in detail
+        assert "已导入 1 条" in detail
+
+    @pytest.mark.asyncio
+    async def test_invalid_config_rejected(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        resp = await client.put(
+            f"/books/{test_book.id}/data-sources/{source_id}",
+            json={"config": {"columns": {"amount": "金额"}}},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+        assert "date" in resp.json()["detail"]
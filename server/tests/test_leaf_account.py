@@ -620,3 +620,80 @@ class TestAccountTreeIsLeaf:
         food2 = next(e for e in tree2["expense"] if e["code"] == "5001")
         assert food2["is_leaf"] is False
         assert len(food2["children"]) > 0
+
+
+# ═══════════════════ 科目表快照 ═══════════════════
+
+
+class TestChartSnapshot:
+    """同一事务内复用科目表快照，科目变更后失效"""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_reused_within_session(self, test_book: Book):
+        from app.services.account_service import get_chart_snapshot
+
+        async with TestSessionLocal() as db:
+            first = await get_chart_snapshot(db, test_book.id)
+            second = await get_chart_snapshot(db, test_book.id)
+            assert first is second
+
+            food = next(a for a in first.values() if a.code == "5001")
+            assert food.is_leaf is True
+            deposit = next(a for a in first.values() if a.code == "1001")
+            assert deposit.is_leaf is False
+
+    @pytest.mark.asyncio
+    async def test_snapshot_invalidated_on_child_created(self, test_book: Book):
+        """同一事务内新增子科目后，父科目立即变为非末级"""
+        from app.services.account_service import create_custom_account, get_chart_snapshot
+        from app.services.entry_service import EntryError, _get_account
+
+        async with TestSessionLocal() as db:
+            snapshot = await get_chart_snapshot(db, test_book.id)
+            food = next(a for a in snapshot.values() if a.code == "5001")
+            assert (await _get_account(db, food.id, test_book.id)).is_leaf
+
+            await create_custom_account(
+                db, test_book.id, "外卖", "expense", "debit", parent_id=food.id
+            )
+
+            with pytest.raises(EntryError) as exc:
+                await _get_account(db, food.id, test_book.id)
+            assert "非末级科目" in exc.value.detail
+            # 不要求末级时仍可取到
+            meta = await _get_account(db, food.id, test_book.id, require_leaf=False)
+            assert meta.child_count == 1
+
+    @pytest.mark.asyncio
+    async def test_snapshot_discarded_after_commit(self, test_book: Book):
+        from app.services.account_service import _CHART_SNAPSHOT_KEY, get_chart_snapshot
+
+        async with TestSessionLocal() as db:
+            await get_chart_snapshot(db, test_book.id)
+            assert test_book.id in db.info[_CHART_SNAPSHOT_KEY]
+            await db.commit()
+            assert _CHART_SNAPSHOT_KEY not in db.info
+
+    @pytest.mark.asyncio
+    async def test_deactivated_account_rejected(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """停用科目后记账报「不存在或已停用」"""
+        new = await client.post(
+            f"/books/{test_book.id}/accounts",
+            json={"name": "临时科目", "type": "expense", "balance_direction": "debit"},
+            headers=auth_headers,
+        )
+        assert new.status_code == 201, new.text
+        acc_id = new.json()["id"]
+        resp = await client.delete(
+            f"/accounts/{acc_id}", headers=auth_headers
+        )
+        assert resp.status_code == 200, resp.text
+
+        cash = await _get_account_by_code(test_book.id, "1001-01")
+        resp = await _create_expense_entry(
+            client, auth_headers, test_book.id, acc_id, cash.id
+        )
+        assert resp.status_code == 404
+        assert "不存在或已停用" in resp.json()["detail"]
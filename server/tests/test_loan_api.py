@@ -76,6 +76,34 @@ class TestLoanCalculation:
         # 30 年房贷利息应该是可观的
         assert interest > 80000
 
+    @pytest.mark.parametrize("principal, rate, months, method, start", [
+        (1000000, 4.9, 360, "equal_installment", date(2024, 1, 31)),
+        (1234567.89, 3.1, 240, "equal_principal", date(2024, 2, 29)),
+        (12000, 0, 12, "equal_installment", date(2025, 1, 15)),
+        (99999.99, 5.8812, 37, "equal_principal", date(2025, 8, 30)),
+        # 首期利息恰为半分：60 × 4.9% / 12 = 0.245
+        (60, 4.9, 3, "equal_installment", date(2025, 1, 1)),
+        # 本金不是整分，走 Decimal 路径
+        (1000.005, 4.9, 12, "equal_installment", date(2025, 1, 1)),
+    ])
+    def test_amortization_table_matches_decimal(self, principal, rate, months, method, start):
+        """摊还表与逐期 Decimal 计算逐分一致（含日期月末处理）"""
+        from app.services.loan_service import generate_schedule, _generate_schedule_decimal
+        assert generate_schedule(principal, rate, months, method, start, 7) == \
+            _generate_schedule_decimal(principal, rate, months, method, start, 7)
+
+    def test_amortization_table_cached(self):
+        """相同条款复用同一张表，已付利息按累计列读取"""
+        from app.services import amortization
+        from app.services.loan_service import generate_schedule
+
+        table = amortization.table_for(200000, 4.2, 120, "equal_installment", date(2025, 3, 1))
+        assert amortization.table_for(200000.0, 4.2, 120, "equal_installment", date(2025, 3, 1)) is table
+        schedule = generate_schedule(200000, 4.2, 120, "equal_installment", date(2025, 3, 1), 10)
+        paid = sum(item["interest"] for item in schedule if item["is_paid"])
+        assert table.paid_interest_cents(10) / 100 == pytest.approx(paid, abs=0.001)
+        assert amortization.cache_stats()["hits"] >= 2
+
 
 # ═══════════════════════════════════════════
 # API 集成测试
@@ -383,3 +411,170 @@ class TestLoanSummary:
         assert data["total_remaining"] == float(sample_loan.remaining_principal)
         assert data["loan_count"] == 1
         assert data["active_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_summary_interest_paid(
+        self, client: AsyncClient, auth_headers, test_book: Book, sample_loan: Loan,
+        bank_account: Account,
+    ):
+        """已付利息 = 已还各期计划利息之和"""
+        from app.services.loan_service import generate_schedule
+
+        for _ in range(3):
+            resp = await client.post(
+                f"/loans/{sample_loan.id}/repay",
+                json={"payment_account_id": bank_account.id},
+                headers=auth_headers,
+            )
+            assert resp.status_code == 201
+
+        schedule = generate_schedule(
+            float(sample_loan.principal), float(sample_loan.annual_rate),
+            sample_loan.total_months, sample_loan.repayment_method, sample_loan.start_date,
+        )
+        resp = await client.get(f"/books/{test_book.id}/loans/summary", headers=auth_headers)
+        assert resp.json()["total_interest_paid"] == pytest.approx(
+            sum(item["interest"] for item in schedule[:3]), abs=0.001
+        )
+
+
+# ═══════════════════════════════════════════
+# 提前还款模拟
+# ═══════════════════════════════════════════
+
+
+class TestLoanSimulation:
+
+    def test_simulate_without_prepayment_matches_table(self):
+        """无提前还款时模拟结果与缓存的还款计划相同"""
+        from app.services import amortization
+
+        args = (100000000, 49000, 360, "equal_installment", date(2025, 1, 31))
+        table = amortization.get_table(*args)
+        simulated = amortization.simulate(*args)
+        assert simulated.payment == table.payment
+        assert simulated.remaining == table.remaining
+        assert simulated.total_interest_cents == table.total_interest_cents
+
+    def test_strategies(self):
+        """缩短期限：月供不变期数减少；降低月供：期数不变月供下降"""
+        from app.services import amortization
+
+        args = (12000000, 49000, 120, "equal_installment", date(2025, 1, 1))
+        baseline = amortization.get_table(*args)
+        shorter = amortization.simulate(*args, {12: 3000000}, 0, "shorten_term")
+        lower = amortization.simulate(*args, {12: 3000000}, 0, "reduce_payment")
+
+        assert shorter.months < baseline.months
+        assert shorter.payment[13] == baseline.payment[13]
+        assert lower.months == baseline.months
+        assert lower.payment[13] < baseline.payment[13]
+        assert shorter.total_interest_cents < lower.total_interest_cents < baseline.total_interest_cents
+        # 提前还款计入当期本金
+        assert shorter.principal[11] == baseline.principal[11] + 3000000
+        assert shorter.remaining[-1] == 0 and lower.remaining[-1] == 0
+
+    def test_upfront_prepayment_strategies(self):
+        """期次 0（首期之前）提前还款同样区分缩短期限和降低月供，并计入首期还款"""
+        from app.services import amortization
+
+        args = (100000000, 49000, 240, "equal_installment", date(2025, 1, 1))
+        baseline = amortization.get_table(*args)
+        shorter = amortization.simulate(*args, {0: 20000000}, 0, "shorten_term")
+        lower = amortization.simulate(*args, {0: 20000000}, 0, "reduce_payment")
+
+        # 月供不变、期数缩短，与首期后提前还款一致
+        assert shorter.payment[1] == baseline.payment[1]
+        assert shorter.months == 170
+        assert shorter.months <= amortization.simulate(*args, {1: 20000000}, 0, "shorten_term").months
+        assert lower.months == 240
+        assert lower.payment[1] < baseline.payment[1]
+        assert shorter.payment != lower.payment
+        for table in (shorter, lower):
+            assert table.principal[0] >= 20000000
+            assert sum(table.principal) == 100000000
+            assert table.remaining[-1] == 0
+
+    def test_upfront_prepayment_pays_off(self):
+        """期次 0 全额提前还款：只有一期，记为该笔本金"""
+        from app.services import amortization
+
+        args = (12000000, 49000, 120, "equal_installment", date(2025, 1, 1))
+        table = amortization.simulate(*args, {0: 12000000}, 0, "shorten_term")
+        assert (table.months, list(table.principal), list(table.interest)) == (1, [12000000], [0])
+
+    @pytest.mark.asyncio
+    async def test_simulate_endpoint(
+        self, client: AsyncClient, auth_headers, sample_loan: Loan
+    ):
+        """POST /loans/{id}/simulate — 多方案一次比较，不改变贷款"""
+        from app.services.loan_service import calc_total_interest
+
+        resp = await client.post(
+            f"/loans/{sample_loan.id}/simulate",
+            json={
+                "scenarios": [
+                    {"name": "缩短期限", "prepayments": [{"prepay_date": "2025-03-20", "amount": 5000}]},
+                    {"name": "降低月供", "strategy": "reduce_payment",
+                     "prepayments": [{"prepay_date": "2025-03-20", "amount": 5000}]},
+                    {"name": "每月多还", "extra_monthly": 500},
+                    {"name": "不变"},
+                ],
+                "include_schedule": True,
+            },
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        baseline = data["baseline"]
+        assert baseline["periods"] == 12
+        assert baseline["payoff_date"] == "2025-12-15"
+        assert baseline["total_interest"] == pytest.approx(
+            calc_total_interest(12000, 12, 12, "equal_installment", date(2025, 1, 15)), abs=0.001
+        )
+
+        shorter, lower, extra, same = data["scenarios"]
+        assert shorter["periods_saved"] > 0
+        assert shorter["interest_saved"] > 0
+        assert shorter["payoff_date"] < baseline["payoff_date"]
+        # 2025-03-20 的提前还款计入第 3 期
+        assert shorter["schedule"][2]["payment_delta"] == pytest.approx(5000, abs=0.01)
+
+        assert lower["periods_saved"] == 0
+        assert lower["last_payment"] < baseline["first_payment"]
+        assert 0 < lower["interest_saved"] < shorter["interest_saved"]
+        assert extra["interest_saved"] > 0
+        assert same["interest_saved"] == 0
+        assert same["periods"] == 12
+        assert len(same["schedule"]) == 12
+
+        # 模拟不产生副作用
+        loan = (await client.get(f"/loans/{sample_loan.id}", headers=auth_headers)).json()
+        assert loan["remaining_principal"] == 12000
+        assert loan["repaid_months"] == 0
+
+    @pytest.mark.asyncio
+    async def test_simulate_from_current_state(
+        self, client: AsyncClient, auth_headers, sample_loan: Loan, bank_account: Account
+    ):
+        """基准从当前剩余本金和剩余期数开始"""
+        await client.post(
+            f"/loans/{sample_loan.id}/repay",
+            json={"payment_account_id": bank_account.id},
+            headers=auth_headers,
+        )
+        resp = await client.post(
+            f"/loans/{sample_loan.id}/simulate",
+            json={"scenarios": [{}]},
+            headers=auth_headers,
+        )
+        data = resp.json()
+        assert data["baseline"]["periods"] == 11
+        assert data["remaining_principal"] < 12000
+
+    @pytest.mark.asyncio
+    async def test_simulate_errors(self, client: AsyncClient, auth_headers):
+        resp = await client.post(
+            "/loans/nonexistent/simulate", json={"scenarios": [{}]}, headers=auth_headers
+        )
+        assert resp.status_code == 404
@@ -0,0 +1,342 @@
+"""外部交易匹配引擎测试：金额+日期窗口索引配对、摘要打分、差异生成调节分录"""
+
+import random
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.book import Book
+from app.services.matching_service import MatchCandidate, pair_transactions
+
+
+async def _get_account_id(client, book_id, code, headers):
+    resp = await client.get(f"/books/{book_id}/accounts", headers=headers)
+    for group in resp.json().values():
+        for acct in group:
+            if acct["code"] == code:
+                return acct["id"]
+            for child in acct.get("children", []):
+                if child["code"] == code:
+                    return child["id"]
+    return None
+
+
+async def _expense(client, book_id, headers, amount, day, description, payment_code="1001-01"):
+    resp = await client.post(
+        f"/books/{book_id}/entries",
+        json={
+            "entry_type": "expense",
+            "entry_date": day,
+            "amount": amount,
+            "description": description,
+            "category_account_id": await _get_account_id(client, book_id, "5001", headers),
+            "payment_account_id": await _get_account_id(client, book_id, payment_code, headers),
+        },
+        headers=headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["id"]
+
+
+async def _data_source(client, book_id, headers, code="1001-01"):
+    resp = await client.post(
+        f"/books/{book_id}/data-sources",
+        json={
+            "account_id": await _get_account_id(client, book_id, code, headers),
+            "provider_name": "测试银行",
+        },
+        headers=headers,
+    )
+    assert resp.status_code == 201
+    return resp.json()["id"]
+
+
+def _cand(line_id, day, text=""):
+    return MatchCandidate(line_id=line_id, entry_id=f"e-{line_id}", day=day, text=text)
+
+
+class TestPairTransactions:
+
+    def test_amount_and_date_window(self):
+        candidates = [(-3550, _cand("a", 100)), (-3550, _cand("b", 110)), (-12000, _cand("c", 100))]
+        matched = pair_transactions(
+            [("t1", -3550, 101, ""), ("t2", -3550, 105, ""), ("t3", -9900, 100, "")],
+            candidates,
+            date_tolerance_days=3,
+            min_score=0.1,
+        )
+        assert matched["t1"].line_id == "a"
+        # 与 b 相差 5 天，超出窗口
+        assert "t2" not in matched
+        assert "t3" not in matched
+
+    def test_description_breaks_ties_and_lines_used_once(self):
+        candidates = [(-3550, _cand("sbux", 100, "星巴克")), (-3550, _cand("mcd", 100, "麦当劳"))]
+        matched = pair_transactions(
+            [("t1", -3550, 100, "麦当劳北京店"), ("t2", -3550, 100, "星巴克咖啡"), ("t3", -3550, 100, "")],
+            candidates,
+        )
+        assert matched["t1"].line_id == "mcd"
+        assert matched["t2"].line_id == "sbux"
+        assert "t3" not in matched
+
+    def test_min_score(self):
+        candidates = [(100, _cand("a", 100))]
+        # 无摘要、相差 2 天：0.6 × (1 - 2/4) = 0.3
+        assert pair_transactions([("t", 100, 102, "")], candidates) == {}
+        assert "t" in pair_transactions([("t", 100, 102, "")], candidates, min_score=0.3)
+
+    def test_scales_near_linearly(self):
+        """2 万笔交易对 2 万条分录行：索引查找而非两两比较"""
+        rng = random.Random(7)
+        n = 20000
+        candidates, txns = [], []
+        for i in range(n):
+            cents = -rng.randint(100, 200000)
+            day = 738000 + rng.randint(0, 365)
+            candidates.append((cents, _cand(f"l{i}", day, f"商户{i}")))
+            txns.append((f"t{i}", cents, day + rng.randint(-2, 2), f"商户{i}"))
+        started = time.perf_counter()
+        matched = pair_transactions(txns, candidates)
+        elapsed = time.perf_counter() - started
+        assert len(matched) >= n * 0.99
+        assert sum(1 for t, c in matched.items() if c.line_id == "l" + t[1:]) >= n * 0.99
+        assert elapsed < 10
+
+
+class TestMatchingApi:
+
+    @pytest.mark.asyncio
+    async def test_import_matches_and_leaves_residuals(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        sbux = await _expense(client, test_book.id, auth_headers, 35.5, "2025-06-01", "星巴克")
+        mcd = await _expense(client, test_book.id, auth_headers, 35.5, "2025-06-02", "麦当劳")
+        rent = await _expense(client, test_book.id, auth_headers, 120, "2025-06-05", "水电")
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        url = f"/books/{test_book.id}/data-sources/{source_id}/transactions"
+
+        resp = await client.post(url, json={"transactions": [
+            {"transaction_date": "2025-06-02", "amount": -35.5, "description": "麦当劳 北京"},
+            {"transaction_date": "2025-06-01", "amount": -35.5, "description": "星巴克咖啡"},
+            {"transaction_date": "2025-06-06", "amount": -120, "description": "水电"},
+            {"transaction_date": "2025-06-03", "amount": -99, "description": "未记账消费"},
+        ]}, headers=auth_headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert (data["imported"], data["matched"], data["unmatched"]) == (4, 3, 1)
+        assert data["unmatched_amount"] == pytest.approx(-99)
+        assert data["reconciliation_entries"] == 0
+
+        txns = (await client.get(url, headers=auth_headers)).json()
+        by_desc = {t["description"]: t for t in txns}
+        assert by_desc["星巴克咖啡"]["matched_entry_id"] == sbux
+        assert by_desc["麦当劳 北京"]["matched_entry_id"] == mcd
+        assert by_desc["水电"]["matched_entry_id"] == rent
+        assert by_desc["未记账消费"]["match_status"] == "unmatched"
+
+        # 已配对的分录不再参与匹配
+        again = await client.post(url, json={"transactions": [
+            {"transaction_date": "2025-06-01", "amount": -35.5, "description": "星巴克咖啡"},
+        ]}, headers=auth_headers)
+        assert again.json()["matched"] == 0
+
+        # 补记分录后重新匹配
+        await _expense(client, test_book.id, auth_headers, 99, "2025-06-03", "超市")
+        rematch = await client.post(
+            f"/books/{test_book.id}/data-sources/{source_id}/match", json={}, headers=auth_headers
+        )
+        assert rematch.json()["matched"] == 1
+        unmatched = await client.get(url, params={"match_status": "unmatched"}, headers=auth_headers)
+        assert len(unmatched.json()) == 1
+
+    @pytest.mark.asyncio
+    async def test_liability_amount_direction(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """负债科目：余额增加（消费）为正"""
+        entry_id = await _expense(
+            client, test_book.id, auth_headers, 80, "2025-06-03", "加油", payment_code="2001"
+        )
+        source_id = await _data_source(client, test_book.id, auth_headers, code="2001")
+        resp = await client.post(
+            f"/books/{test_book.id}/data-sources/{source_id}/transactions",
+            json={"transactions": [{"transaction_date": "2025-06-03", "amount": 80}]},
+            headers=auth_headers,
+        )
+        assert resp.json()["matched"] == 1
+        txns = (await client.get(
+            f"/books/{test_book.id}/data-sources/{source_id}/transactions", headers=auth_headers
+        )).json()
+        assert txns[0]["matched_entry_id"] == entry_id
+
+    @pytest.mark.asyncio
+    async def test_book_residuals_as_reconciliation_items(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        from tests.test_sync import _assert_rollup_consistent
+
+        await _expense(client, test_book.id, auth_headers, 50, "2025-06-01", "午餐")
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+
+        resp = await client.post(
+            f"/books/{test_book.id}/data-sources/{source_id}/transactions",
+            json={
+                "transactions": [
+                    {"transaction_date": "2025-06-01", "amount": -50, "description": "午餐"},
+                    {"transaction_date": "2025-06-04", "amount": -99, "description": "未知扣款"},
+                    {"transaction_date": "2025-06-05", "amount": 12.3, "description": "利息"},
+                ],
+                "book_residuals": True,
+            },
+            headers=auth_headers,
+        )
+        data = resp.json()
+        assert (data["matched"], data["reconciliation_entries"], data["unmatched"]) == (1, 2, 0)
+
+        pending = (await client.get(
+            f"/books/{test_book.id}/pending-reconciliations", headers=auth_headers
+        )).json()
+        assert len(pending) == 2
+        by_date = {p["entry_date"]: p for p in pending}
+        outflow = {l["account_id"]: l for l in by_date["2025-06-04"]["lines"]}
+        assert outflow[cash_id]["credit_amount"] == pytest.approx(99)
+        inflow = {l["account_id"]: l for l in by_date["2025-06-05"]["lines"]}
+        assert inflow[cash_id]["debit_amount"] == pytest.approx(12.3)
+        await _assert_rollup_consistent(test_book.id)
+
+        txns = (await client.get(
+            f"/books/{test_book.id}/data-sources/{source_id}/transactions",
+            params={"match_status": "reconciled"},
+            headers=auth_headers,
+        )).json()
+        assert {t["matched_entry_id"] for t in txns} == {p["entry_id"] for p in pending}
+
+    @pytest.mark.asyncio
+    async def test_data_source_scoped_to_book(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        resp = await client.post(
+            f"/books/{test_book.id}/data-sources/nonexistent/transactions",
+            json={"transactions": [{"transaction_date": "2025-06-01", "amount": 1}]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 404
+        resp = await client.post(
+            f"/books/{test_book.id}/data-sources",
+            json={"account_id": "nonexistent"},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 404
+        listed = await client.get(f"/books/{test_book.id}/data-sources", headers=auth_headers)
+        assert listed.json() == []
+
+    @pytest.mark.asyncio
+    async def test_transfer_lines_match_independently(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """转账分录的两端分别被两个数据源配对：按分录行记录和排除"""
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        bank_id = await _get_account_id(client, test_book.id, "1002-01", auth_headers)
+        resp = await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "transfer",
+                "entry_date": "2025-06-01",
+                "amount": 200,
+                "from_account_id": bank_id,
+                "to_account_id": cash_id,
+            },
+            headers=auth_headers,
+        )
+        assert resp.status_code == 201, resp.text
+        entry = resp.json()
+        line_ids = {l["account_id"]: l["id"] for l in entry["lines"]}
+
+        cash_source = await _data_source(client, test_book.id, auth_headers, code="1001-01")
+        bank_source = await _data_source(client, test_book.id, auth_headers, code="1002-01")
+        for source_id, amount in ((cash_source, 200), (bank_source, -200)):
+            resp = await client.post(
+                f"/books/{test_book.id}/data-sources/{source_id}/transactions",
+                json={"transactions": [{"transaction_date": "2025-06-01", "amount": amount}]},
+                headers=auth_headers,
+            )
+            assert resp.json()["matched"] == 1
+
+        for source_id, account_id in ((cash_source, cash_id), (bank_source, bank_id)):
+            txn = (await client.get(
+                f"/books/{test_book.id}/data-sources/{source_id}/transactions", headers=auth_headers
+            )).json()[0]
+            assert txn["matched_entry_id"] == entry["id"]
+            assert txn["matched_line_id"] == line_ids[account_id]
+
+        # 同一分录行不再被第二笔交易配对
+        again = await client.post(
+            f"/books/{test_book.id}/data-sources/{cash_source}/transactions",
+            json={"transactions": [{"transaction_date": "2025-06-01", "amount": 200}]},
+            headers=auth_headers,
+        )
+        assert again.json()["matched"] == 0
+
+    @pytest.mark.asyncio
+    async def test_editing_entry_releases_match(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """分录行重建后，配对的外部交易恢复为未匹配，重新匹配到新的分录行"""
+        entry_id = await _expense(client, test_book.id, auth_headers, 35.5, "2025-06-01", "星巴克")
+        source_id = await _data_source(client, test_book.id, auth_headers)
+        url = f"/books/{test_book.id}/data-sources/{source_id}/transactions"
+        edit = {
+            "amount": 40,
+            "category_account_id": await _get_account_id(client, test_book.id, "5001", auth_headers),
+            "payment_account_id": await _get_account_id(client, test_book.id, "1001-01", auth_headers),
+        }
+        await client.post(url, json={"transactions": [
+            {"transaction_date": "2025-06-01", "amount": -40, "description": "星巴克"},
+        ]}, headers=auth_headers)
+        assert (await client.get(url, headers=auth_headers)).json()[0]["match_status"] == "unmatched"
+
+        # 改金额后与流水一致，重新匹配
+        resp = await client.put(
+            f"/entries/{entry_id}", json=edit, headers=auth_headers
+        )
+        assert resp.status_code == 200, resp.text
+        rematch = await client.post(
+            f"/books/{test_book.id}/data-sources/{source_id}/match", json={}, headers=auth_headers
+        )
+        assert rematch.json()["matched"] == 1
+        first_line = (await client.get(url, headers=auth_headers)).json()[0]["matched_line_id"]
+
+        # 再次编辑金额：旧分录行被删除重建，配对随之释放
+        resp = await client.put(
+            f"/entries/{entry_id}", json=edit, headers=auth_headers
+        )
+        assert resp.status_code == 200
+        txn = (await client.get(url, headers=auth_headers)).json()[0]
+        assert (txn["match_status"], txn["matched_line_id"]) == ("unmatched", None)
+        rematch = await client.post(
+            f"/books/{test_book.id}/data-sources/{source_id}/match", json={}, headers=auth_headers
+        )
+        assert rematch.json()["matched"] == 1
+        txn = (await client.get(url, headers=auth_headers)).json()[0]
+        assert txn["matched_line_id"] not in (None, first_line)
+
+    @pytest.mark.asyncio
+    async def test_candidate_query_uses_journal_indexes(self, test_book: Book):
+        from sqlalchemy import text
+
+        from tests.conftest import TestSessionLocal
+
+        async with TestSessionLocal() as db:
+            plan = " ".join(
+                row[3] for row in (await db.execute(text(
+                    "EXPLAIN QUERY PLAN SELECT jl.id FROM journal_lines jl "
+                    "JOIN journal_entries je ON je.id = jl.entry_id "
+                    "WHERE jl.account_id = :a AND je.book_id = :b "
+                    "AND je.entry_date BETWEEN :s AND :e AND je.entry_type != 'reconciliation'"
+                ), {"a": "x", "b": test_book.id, "s": "2025-01-01", "e": "2025-02-01"})).all()
+            )
+        assert "ix_journal_entries_book_date_type" in plan
+        assert "ix_journal_lines_account_entry" in plan
@@ -2,8 +2,8 @@
 
 覆盖场景：
 1. MCP Tools 通过 HTTP 调用 FastAPI 后端的完整链路
-   - 查询类：list_accounts, list_entries, get_entry, get_balance_sheet, get_income_statement, get_dashboard
-   - 写入类：create_entries, delete_entry, sync_balance
+   - 查询类：list_accounts, list_entries, get_entry, get_balance_sheet, get_income_statement, get_dashboard, get_budget_history
+   - 写入类：create_entries, delete_entry, sync_balance, sync_balances
    - 管理类：list_plugins
 2. 错误场景：缺少 book_id、JSON 解析失败、无效 entry_id
 3. _ensure_mcp_plugin 自动注册 mcp-agent 插件
@@ -142,6 +142,13 @@ class TestMCPQueryTools:
         assert isinstance(result, dict)
         assert "net_asset" in result
 
+    @pytest.mark.asyncio
+    async def test_get_budget_history(self, mcp_client, test_book):
+        """get_budget_history 经 API Key 返回预算执行矩阵"""
+        result = await mcp_client.get_budget_history(test_book.id, months=3)
+        assert len(result["periods"]) == 3
+        assert result["rows"] == []
+
     @pytest.mark.asyncio
     async def test_list_plugins_empty(self, mcp_client):
         """list_plugins 初始为空"""
@@ -261,6 +268,16 @@ class TestMCPWriteTools:
         result = await mcp_client.submit_snapshot(bank_id, 10000.0, "2025-06-01")
         assert isinstance(result, dict)
 
+    @pytest.mark.asyncio
+    async def test_sync_balances_batch(self, mcp_client, test_book, accounts):
+        """sync_balances 一次提交多个科目快照"""
+        result = await mcp_client.submit_snapshots_batch(test_book.id, [
+            {"account_id": accounts["1002-01"], "external_balance": 500.0, "snapshot_date": "2025-06-01"},
+            {"account_id": accounts["1002-02"], "external_balance": 0},
+        ])
+        assert result["created"] == 2
+        assert result["pending"] == 1
+
 
 # ──────────── MCP Tool 函数直接测试 ────────────
 
@@ -303,8 +320,8 @@ class TestMCPToolFunctions:
         assert "list_entries" in tool_names
 
     @pytest.mark.asyncio
-    async def test_all_10_tools_registered(self, mcp_client):
-        """验证 10 个 MCP Tools 全部注册"""
+    async def test_all_tools_registered(self, mcp_client):
+        """验证 12 个 MCP Tools 全部注册"""
         from mcp_server.__main__ import mcp
 
         tools = await mcp.list_tools()
@@ -312,7 +329,7 @@ class TestMCPToolFunctions:
         expected = {
             "create_entries", "list_entries", "get_entry", "delete_entry",
             "get_balance_sheet", "get_income_statement", "get_dashboard",
-            "sync_balance", "list_accounts", "list_plugins",
+            "get_budget_history", "sync_balance", "sync_balances", "list_accounts", "list_plugins",
         }
         assert expected == tool_names
 
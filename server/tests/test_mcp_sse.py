@@ -63,14 +63,14 @@ class TestSSEAppStructure:
 
     @pytest.mark.asyncio
     async def test_all_tools_available(self):
-        """10 个 Tools 全部注册"""
+        """12 个 Tools 全部注册"""
         tools = await mcp.list_tools()
-        assert len(tools) == 10
+        assert len(tools) == 12
         tool_names = {t.name for t in tools}
         expected = {
             "create_entries", "list_entries", "get_entry", "delete_entry",
             "get_balance_sheet", "get_income_statement", "get_dashboard",
-            "sync_balance", "list_accounts", "list_plugins",
+            "get_budget_history", "sync_balance", "sync_balances", "list_accounts", "list_plugins",
         }
         assert expected == tool_names
 
@@ -142,10 +142,10 @@ class TestSSEProtocol:
                     expected = {
                         "create_entries", "list_entries", "get_entry", "delete_entry",
                         "get_balance_sheet", "get_income_statement", "get_dashboard",
-                        "sync_balance", "list_accounts", "list_plugins",
+                        "get_budget_history", "sync_balance", "sync_balances", "list_accounts", "list_plugins",
                     }
                     assert expected == tool_names
-                    assert len(tools_result.tools) == 10
+                    assert len(tools_result.tools) == 12
 
                     # 验证每个 tool 都有 description
                     for tool in tools_result.tools:
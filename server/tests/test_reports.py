@@ -106,6 +106,37 @@ class TestBalanceSheet:
         )
         assert resp.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_balance_sheet_rollup_and_depth(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """父科目返回子树合计；depth 折叠深层科目，合计不变"""
+        await _create_income(client, test_book.id, 10000, auth_headers)
+        await _create_expense(client, test_book.id, 200, auth_headers)
+
+        full = (await client.get(
+            f"/books/{test_book.id}/balance-sheet", headers=auth_headers
+        )).json()
+        by_code = {a["account_code"]: a for a in full["assets"]}
+        assert by_code["1001"]["level"] == 1
+        assert by_code["1001"]["is_leaf"] is False
+        assert by_code["1001-01"]["is_leaf"] is True
+        assert by_code["1001-0201"]["level"] == 3
+        assert by_code["1001"]["balance"] == 0
+        assert by_code["1001"]["rollup_balance"] == pytest.approx(-200)
+        assert by_code["1002"]["rollup_balance"] == pytest.approx(10000)
+
+        resp = await client.get(
+            f"/books/{test_book.id}/balance-sheet?depth=1", headers=auth_headers
+        )
+        assert resp.status_code == 200
+        collapsed = resp.json()
+        assert all(a["level"] == 1 for a in collapsed["assets"])
+        assert sum(a["rollup_balance"] for a in collapsed["assets"]) == pytest.approx(
+            full["total_asset"]
+        )
+        assert collapsed["total_asset"] == full["total_asset"]
+
     @pytest.mark.asyncio
     async def test_balance_sheet_forbidden(self, client: AsyncClient, auth_headers):
         resp = await client.get(
@@ -190,6 +221,51 @@ class TestDashboard:
         assert data["net_asset"] > 0
         assert len(data["recent_entries"]) >= 2
 
+    @pytest.mark.asyncio
+    async def test_dashboard_matches_reports(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """仪表盘合计与资产负债表/损益表一致，影响额按分录计算"""
+        from datetime import date, timedelta
+
+        today = date.today()
+        last_month = today.replace(day=1) - timedelta(days=1)
+        salary_id = await _get_account_id(client, test_book.id, "4001", auth_headers)
+        food_id = await _get_account_id(client, test_book.id, "5001", auth_headers)
+        bank_id = await _get_account_id(client, test_book.id, "1002-01", auth_headers)
+        for entry_type, day, amount, category in (
+            ("income", last_month, 5000, salary_id),
+            ("income", today, 3000, salary_id),
+            ("expense", today, 120.5, food_id),
+        ):
+            await client.post(
+                f"/books/{test_book.id}/entries",
+                json={
+                    "entry_type": entry_type,
+                    "entry_date": day.isoformat(),
+                    "amount": amount,
+                    "category_account_id": category,
+                    "payment_account_id": bank_id,
+                },
+                headers=auth_headers,
+            )
+
+        data = (await client.get(
+            f"/books/{test_book.id}/dashboard", headers=auth_headers
+        )).json()
+        assert data["prev_net_asset"] == pytest.approx(5000)
+        assert data["net_asset"] == pytest.approx(7879.5)
+        assert data["net_asset_change"] == pytest.approx(2879.5)
+        assert data["month_income"] == pytest.approx(3000)
+        assert data["month_expense"] == pytest.approx(120.5)
+        bs = (await client.get(
+            f"/books/{test_book.id}/balance-sheet", headers=auth_headers
+        )).json()
+        assert data["total_asset"] == pytest.approx(bs["total_asset"])
+        assert data["total_liability"] == pytest.approx(bs["total_liability"])
+        impacts = sorted(e["net_worth_impact"] for e in data["recent_entries"])
+        assert impacts == [-120.5, 3000, 5000]
+
 
 class TestNetWorthTrend:
 
@@ -218,6 +294,69 @@ class TestNetWorthTrend:
         assert resp.status_code == 200
         assert len(resp.json()) <= 3
 
+    @pytest.mark.asyncio
+    async def test_net_worth_trend_matches_balance_sheet(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """按周粒度的每个点与对应日期的资产负债表一致"""
+        await _create_income(client, test_book.id, 10000, auth_headers)
+        await _create_expense(client, test_book.id, 200, auth_headers)
+
+        resp = await client.get(
+            f"/books/{test_book.id}/net-worth-trend"
+            "?granularity=week&start=2025-05-20&end=2025-06-20",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data[0]["label"] == "2025-W21"
+        assert data[-1]["date"] == "2025-06-20"
+        for point in data:
+            bs = (await client.get(
+                f"/books/{test_book.id}/balance-sheet?date={point['date']}",
+                headers=auth_headers,
+            )).json()
+            assert point["net_asset"] == pytest.approx(bs["adjusted_equity"])
+            assert point["total_asset"] == pytest.approx(bs["total_asset"])
+            assert point["total_liability"] == pytest.approx(bs["total_liability"])
+        assert data[-1]["net_asset"] == pytest.approx(9800)
+
+    @pytest.mark.asyncio
+    async def test_net_worth_trend_quarter(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """季度粒度：期初余额计入首个点"""
+        await _create_income(client, test_book.id, 10000, auth_headers)
+
+        resp = await client.get(
+            f"/books/{test_book.id}/net-worth-trend"
+            "?granularity=quarter&start=2025-07-01&end=2025-12-31",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [p["label"] for p in data] == ["2025-Q3", "2025-Q4"]
+        assert [p["date"] for p in data] == ["2025-09-30", "2025-12-31"]
+        assert all(p["net_asset"] == pytest.approx(10000) for p in data)
+
+    @pytest.mark.asyncio
+    async def test_net_worth_trend_invalid_range(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """开始日期晚于结束日期 / 数据点过多"""
+        resp = await client.get(
+            f"/books/{test_book.id}/net-worth-trend?start=2025-06-01&end=2025-01-01",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+
+        resp = await client.get(
+            f"/books/{test_book.id}/net-worth-trend"
+            "?granularity=day&start=2000-01-01&end=2025-01-01",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+
 
 class TestExpenseBreakdown:
 
@@ -267,3 +406,169 @@ class TestAssetAllocation:
         )
         assert resp.status_code == 200
         assert isinstance(resp.json(), list)
+
+
+class TestDailyBalanceRollup:
+
+    @staticmethod
+    async def _rollup_rows(book_id):
+        from sqlalchemy import select
+        from app.models.balance import AccountDailyBalance
+        from tests.conftest import TestSessionLocal
+
+        async with TestSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    AccountDailyBalance.account_id,
+                    AccountDailyBalance.balance_date,
+                    AccountDailyBalance.debit_total,
+                    AccountDailyBalance.credit_total,
+                ).where(AccountDailyBalance.book_id == book_id)
+            )
+            return {
+                (r[0], r[1]): (float(r[2]), float(r[3])) for r in result.all()
+            }
+
+    @pytest.mark.asyncio
+    async def test_rollup_follows_create_update_delete(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """新增/编辑/删除分录时同步维护日发生额汇总"""
+        resp = await _create_expense(client, test_book.id, 200, auth_headers)
+        entry_id = resp.json()["id"]
+        rows = await self._rollup_rows(test_book.id)
+        assert len(rows) == 2
+        assert sum(d for d, _ in rows.values()) == pytest.approx(200)
+
+        # 改金额和日期：旧日期的汇总被冲出
+        food_id = await _get_account_id(client, test_book.id, "5001", auth_headers)
+        bank_id = await _get_account_id(client, test_book.id, "1002-01", auth_headers)
+        resp = await client.put(
+            f"/entries/{entry_id}",
+            json={
+                "entry_date": "2025-07-01",
+                "amount": 350,
+                "category_account_id": food_id,
+                "payment_account_id": bank_id,
+            },
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        rows = await self._rollup_rows(test_book.id)
+        assert {str(day) for _, day in rows} == {"2025-07-01"}
+        assert sum(c for _, c in rows.values()) == pytest.approx(350)
+
+        resp = await client.delete(f"/entries/{entry_id}", headers=auth_headers)
+        assert resp.status_code in (200, 204)
+        assert await self._rollup_rows(test_book.id) == {}
+
+    @pytest.mark.asyncio
+    async def test_rebuild_matches_incremental(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """全量重建结果与增量维护一致"""
+        from app.services.ledger_service import rebuild_daily_balances
+        from tests.conftest import TestSessionLocal
+
+        await _create_income(client, test_book.id, 10000, auth_headers)
+        await _create_expense(client, test_book.id, 200, auth_headers)
+        await _create_expense(client, test_book.id, 55.5, auth_headers)
+        incremental = await self._rollup_rows(test_book.id)
+
+        async with TestSessionLocal() as db:
+            count = await rebuild_daily_balances(db, test_book.id)
+            await db.commit()
+        assert count == len(incremental)
+        assert await self._rollup_rows(test_book.id) == incremental
+
+
+class TestReportCache:
+
+    @pytest.mark.asyncio
+    async def test_etag_not_modified_and_invalidation(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """相同账务版本返回 304；记账后 ETag 变化并返回新数据"""
+        from app.services.report_cache import report_cache
+
+        url = f"/books/{test_book.id}/dashboard"
+        first = await client.get(url, headers=auth_headers)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+
+        hits = report_cache.hits
+        again = await client.get(url, headers=auth_headers)
+        assert again.headers["etag"] == etag
+        assert again.json() == first.json()
+        assert report_cache.hits == hits + 1
+
+        resp = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+        await _create_income(client, test_book.id, 1000, auth_headers)
+        resp = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+        assert len(resp.json()["recent_entries"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_version_persisted_across_processes(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """版本号读自数据库：其他进程提交的写入同样使本进程的缓存和 ETag 失效"""
+        from sqlalchemy import select
+
+        from app.models.balance import LedgerVersion
+        from app.services import ledger_service
+        from tests.conftest import TestSessionLocal
+
+        await _create_income(client, test_book.id, 1000, auth_headers)
+        async with TestSessionLocal() as db:
+            version = await ledger_service.get_ledger_version(db, test_book.id)
+            assert version == (await db.execute(
+                select(LedgerVersion.version).where(LedgerVersion.book_id == test_book.id)
+            )).scalar_one()
+
+        url = f"/books/{test_book.id}/dashboard"
+        first = await client.get(url, headers=auth_headers)
+        etag = first.headers["etag"]
+
+        # 模拟另一进程：只通过数据库递增版本号，本进程内存无任何通知
+        async with TestSessionLocal() as db:
+            ledger_service.mark_dirty(db, test_book.id)
+            await db.commit()
+        resp = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+
+        # 回滚的事务不递增版本号
+        async with TestSessionLocal() as db:
+            ledger_service.mark_dirty(db, None)
+            await db.rollback()
+            assert await ledger_service.get_ledger_version(db, test_book.id) == version + 1
+
+        # 全量重建递增全部账本的版本号
+        async with TestSessionLocal() as db:
+            ledger_service.mark_dirty(db, None)
+            await db.commit()
+            assert await ledger_service.get_ledger_version(db, test_book.id) == version + 2
+
+    @pytest.mark.asyncio
+    async def test_cache_stats_on_health(self, client: AsyncClient):
+        resp = await client.get("/health")
+        stats = resp.json()["report_cache"]
+        assert {"hits", "misses", "bytes", "max_bytes", "evictions"} <= set(stats)
+
+    def test_lru_eviction_respects_byte_cap(self):
+        from app.services.report_cache import ReportCache
+
+        cache = ReportCache(max_bytes=10)
+        cache.put(("b", "k", (1,)), 1, b"12345")
+        cache.put(("b", "k", (2,)), 1, b"12345")
+        assert cache.get(("b", "k", (1,)), 1) == b"12345"  # 1 变为最近使用
+        cache.put(("b", "k", (3,)), 1, b"12345")
+        assert cache.get(("b", "k", (2,)), 1) is None
+        assert cache.get(("b", "k", (1,)), 1) == b"12345"
+        assert cache.get(("b", "k", (1,)), 2) is None  # 版本变化即失效
+        assert cache.stats()["evictions"] == 1
@@ -0,0 +1,184 @@
+"""内置定时任务调度器测试：cron 解析、到期执行、单执行者锁、失败记录"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models.job import ScheduledJob
+from app.services.scheduler import JobScheduler, JobSpec
+from app.utils.cron import CronError, CronExpr
+
+from tests.conftest import TestSessionLocal
+
+
+class TestCronExpr:
+
+    def test_daily_and_monthly(self):
+        daily = CronExpr.parse("10 0 * * *")
+        assert daily.next_after(datetime(2026, 1, 1, 0, 10)) == datetime(2026, 1, 2, 0, 10)
+        assert daily.next_after(datetime(2026, 1, 1, 0, 9, 59)) == datetime(2026, 1, 1, 0, 10)
+
+        monthly = CronExpr.parse("30 0 1 * *")
+        assert monthly.next_after(datetime(2026, 12, 15)) == datetime(2027, 1, 1, 0, 30)
+
+    def test_ranges_steps_and_weekdays(self):
+        expr = CronExpr.parse("*/15 9-17 * * 1-5")
+        # 2026-01-02 是周五，17:50 之后的下一次是周一 09:00
+        assert expr.next_after(datetime(2026, 1, 2, 17, 50)) == datetime(2026, 1, 5, 9, 0)
+        assert expr.next_after(datetime(2026, 1, 5, 9, 0)) == datetime(2026, 1, 5, 9, 15)
+        # 周日可写作 0 或 7
+        assert CronExpr.parse("0 8 * * 7").weekdays == CronExpr.parse("0 8 * * 0").weekdays
+
+    def test_day_or_weekday(self):
+        """日和周同时受限时满足其一即触发"""
+        expr = CronExpr.parse("0 0 13 * 5")
+        # 2026-01-09 周五（非 13 日）
+        assert expr.next_after(datetime(2026, 1, 6)) == datetime(2026, 1, 9)
+        assert expr.next_after(datetime(2026, 1, 10)) == datetime(2026, 1, 13)
+
+    @pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "*/0 * * * *", "a * * * *", "0 0 31 2 *"])
+    def test_invalid(self, expr):
+        with pytest.raises(CronError):
+            CronExpr.parse(expr).next_after(datetime(2026, 1, 1))
+
+
+class TestJobScheduler:
+
+    @staticmethod
+    def _scheduler(**kwargs) -> JobScheduler:
+        return JobScheduler(TestSessionLocal, jitter_seconds=0, **kwargs)
+
+    @staticmethod
+    async def _make_due(name: str) -> None:
+        async with TestSessionLocal() as db:
+            await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.name == name)
+                .values(next_run_at=datetime.now() - timedelta(minutes=1))
+            )
+            await db.commit()
+
+    @staticmethod
+    async def _load(name: str) -> ScheduledJob:
+        async with TestSessionLocal() as db:
+            return (await db.execute(
+                select(ScheduledJob).where(ScheduledJob.name == name)
+            )).scalar_one()
+
+    @pytest.mark.asyncio
+    async def test_runs_due_job_and_records_state(self):
+        calls = []
+
+        async def job():
+            calls.append(1)
+
+        scheduler = self._scheduler()
+        scheduler.register(JobSpec("demo", "0 3 * * *", job))
+        await scheduler.sync_jobs()
+
+        # 未到期不执行
+        assert await scheduler.run_due() == []
+        await self._make_due("demo")
+        assert await scheduler.run_due() == ["demo"]
+        assert await scheduler.run_due() == []
+        assert calls == [1]
+
+        row = await self._load("demo")
+        assert row.last_status == "success"
+        assert row.run_count == 1
+        assert row.locked_by is None
+        assert row.next_run_at > datetime.now()
+        assert (row.next_run_at.hour, row.next_run_at.minute) == (3, 0)
+        assert scheduler.stats()["jobs"]["demo"]["runs"] == 1
+
+    @pytest.mark.asyncio
+    async def test_single_runner_lock(self):
+        """任务执行期间，其他 worker 看到锁被持有而跳过"""
+        other = self._scheduler()
+        calls = []
+
+        async def job():
+            calls.append("a")
+            # 持锁期间另一个 worker 轮询同一任务
+            assert await other.run_due() == []
+
+        first = self._scheduler()
+        first.register(JobSpec("locked", "0 3 * * *", job))
+        other.register(JobSpec("locked", "0 3 * * *", job))
+        await first.sync_jobs()
+        await other.sync_jobs()
+        await self._make_due("locked")
+
+        assert await first.run_due() == ["locked"]
+        assert calls == ["a"]
+        assert other.metrics["locked"].skipped == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_taken_over(self):
+        calls = []
+
+        async def job():
+            calls.append(1)
+
+        scheduler = self._scheduler()
+        scheduler.register(JobSpec("stale", "0 3 * * *", job))
+        await scheduler.sync_jobs()
+        async with TestSessionLocal() as db:
+            await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.name == "stale")
+                .values(
+                    next_run_at=datetime.now() - timedelta(hours=2),
+                    locked_by="crashed-worker",
+                    locked_until=datetime.now() - timedelta(hours=1),
+                )
+            )
+            await db.commit()
+
+        assert await scheduler.run_due() == ["stale"]
+        assert calls == [1]
+
+    @pytest.mark.asyncio
+    async def test_failure_is_recorded_and_lock_released(self):
+        async def job():
+            raise RuntimeError("boom")
+
+        scheduler = self._scheduler()
+        scheduler.register(JobSpec("broken", "*/5 * * * *", job))
+        await scheduler.sync_jobs()
+        await self._make_due("broken")
+
+        assert await scheduler.run_due() == ["broken"]
+        row = await self._load("broken")
+        assert row.last_status == "failed"
+        assert "boom" in row.last_error
+        assert row.failure_count == 1
+        assert row.locked_by is None
+        assert scheduler.stats()["jobs"]["broken"]["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_schedule_change_resets_next_run(self):
+        async def job():
+            pass
+
+        scheduler = self._scheduler()
+        scheduler.register(JobSpec("changing", "0 3 1 1 *", job))
+        await scheduler.sync_jobs()
+        before = (await self._load("changing")).next_run_at
+
+        scheduler.register(JobSpec("changing", "*/5 * * * *", job))
+        await scheduler.sync_jobs()
+        row = await self._load("changing")
+        assert row.schedule == "*/5 * * * *"
+        assert row.next_run_at < before
+        assert row.next_run_at <= datetime.now() + timedelta(minutes=5)
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        scheduler = self._scheduler(poll_seconds=0.01)
+        scheduler.register(JobSpec("idle", "0 3 * * *", lambda: None))
+        await scheduler.start()
+        assert scheduler.stats()["running"] is True
+        await scheduler.stop()
+        assert scheduler.stats()["running"] is False
@@ -2,10 +2,13 @@
 
 覆盖端点：
 - POST /accounts/{account_id}/snapshot — 提交余额快照
+- POST /books/{book_id}/snapshots/batch — 批量提交余额快照
 - GET /books/{book_id}/pending-reconciliations — 待处理队列
 - GET /books/{book_id}/pending-count — 待处理数量
 - PUT /entries/{entry_id}/confirm — 确认调节分录
 - POST /entries/{entry_id}/split — 拆分调节分录
+- POST /books/{book_id}/reconciliations/confirm — 批量确认
+- POST /books/{book_id}/reconciliations/split — 批量拆分
 """
 
 import pytest
@@ -27,6 +30,48 @@ async def _get_account_id(client, book_id, code, headers):
     return None
 
 
+async def _make_pending(client, book_id, account_id, headers, count):
+    """按日期递增生成 count 条差异各为 100 的调节分录，返回分录 ID（按日期升序）"""
+    entry_ids = []
+    for i in range(count):
+        resp = await client.post(
+            f"/accounts/{account_id}/snapshot",
+            json={"external_balance": (i + 1) * 100, "snapshot_date": f"2025-01-{i + 1:02d}"},
+            headers=headers,
+        )
+        entry_ids.append(resp.json()["reconciliation_entry_id"])
+    return entry_ids
+
+
+async def _rollup_rows(book_id):
+    from sqlalchemy import select
+    from app.models.balance import AccountDailyBalance
+    from tests.conftest import TestSessionLocal
+
+    async with TestSessionLocal() as db:
+        result = await db.execute(
+            select(
+                AccountDailyBalance.account_id,
+                AccountDailyBalance.balance_date,
+                AccountDailyBalance.debit_total,
+                AccountDailyBalance.credit_total,
+            ).where(AccountDailyBalance.book_id == book_id)
+        )
+        return {(r[0], r[1]): (float(r[2]), float(r[3])) for r in result.all()}
+
+
+async def _assert_rollup_consistent(book_id):
+    """增量维护的日发生额与全量重建一致"""
+    from app.services.ledger_service import rebuild_daily_balances
+    from tests.conftest import TestSessionLocal
+
+    incremental = await _rollup_rows(book_id)
+    async with TestSessionLocal() as db:
+        await rebuild_daily_balances(db, book_id)
+        await db.commit()
+    assert await _rollup_rows(book_id) == incremental
+
+
 class TestSnapshot:
 
     @pytest.mark.asyncio
@@ -92,6 +137,144 @@ class TestSnapshot:
         assert resp.status_code == 404
 
 
+class TestSnapshotBatch:
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single_semantics(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """批量结果与逐个提交一致：按各自日期计算账本余额，负债科目按贷方余额"""
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        fund_id = await _get_account_id(client, test_book.id, "1002-01", auth_headers)
+        bond_id = await _get_account_id(client, test_book.id, "1002-02", auth_headers)
+        card_id = await _get_account_id(client, test_book.id, "2001", auth_headers)
+        salary_id = await _get_account_id(client, test_book.id, "4001", auth_headers)
+        food_id = await _get_account_id(client, test_book.id, "5001", auth_headers)
+        await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "income",
+                "entry_date": "2025-06-01",
+                "amount": 1000,
+                "category_account_id": salary_id,
+                "payment_account_id": cash_id,
+            },
+            headers=auth_headers,
+        )
+        await client.post(
+            f"/books/{test_book.id}/entries",
+            json={
+                "entry_type": "expense",
+                "entry_date": "2025-06-03",
+                "amount": 80,
+                "category_account_id": food_id,
+                "payment_account_id": card_id,
+            },
+            headers=auth_headers,
+        )
+
+        resp = await client.post(
+            f"/books/{test_book.id}/snapshots/batch",
+            json={"items": [
+                {"account_id": cash_id, "external_balance": 1000, "snapshot_date": "2025-06-30"},
+                {"account_id": fund_id, "external_balance": 250.5, "snapshot_date": "2025-06-30"},
+                {"account_id": bond_id, "external_balance": 0},
+                # 截至 06-02 信用卡尚无消费
+                {"account_id": card_id, "external_balance": 30, "snapshot_date": "2025-06-02"},
+            ]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 201
+        data = resp.json()
+        assert data["created"] == 4
+        assert data["pending"] == 2
+        cash, fund, bond, card = data["items"]
+        assert (cash["book_balance"], cash["status"]) == (pytest.approx(1000), "balanced")
+        assert cash["reconciliation_entry_id"] is None
+        assert fund["difference"] == pytest.approx(250.5)
+        assert fund["reconciliation_entry_id"] is not None
+        assert bond["status"] == "balanced"
+        assert card["book_balance"] == pytest.approx(0)
+        assert card["difference"] == pytest.approx(30)
+
+        pending = (await client.get(
+            f"/books/{test_book.id}/pending-reconciliations", headers=auth_headers
+        )).json()
+        assert {i["entry_id"] for i in pending} == {
+            fund["reconciliation_entry_id"], card["reconciliation_entry_id"]
+        }
+        await _assert_rollup_consistent(test_book.id)
+
+        # 调节分录已计入余额：同样的外部余额再提交一次即平衡
+        again = await client.post(
+            f"/accounts/{fund_id}/snapshot",
+            json={"external_balance": 250.5, "snapshot_date": "2025-06-30"},
+            headers=auth_headers,
+        )
+        assert again.json()["status"] == "balanced"
+
+    @pytest.mark.asyncio
+    async def test_batch_statement_count_is_constant(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """SQL 语句数不随科目数增加"""
+        from sqlalchemy import event
+        from tests.conftest import test_engine
+
+        codes = ["1001-01", "1002-01", "1002-02", "2001"]
+        ids = [await _get_account_id(client, test_book.id, c, auth_headers) for c in codes]
+
+        async def count_statements(account_ids, balance):
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+            try:
+                resp = await client.post(
+                    f"/books/{test_book.id}/snapshots/batch",
+                    json={"items": [
+                        {"account_id": a, "external_balance": balance, "snapshot_date": "2025-03-01"}
+                        for a in account_ids
+                    ]},
+                    headers=auth_headers,
+                )
+            finally:
+                event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+            assert resp.status_code == 201
+            return len(statements)
+
+        # 首次提交会创建数据源，两组都先预热
+        await count_statements(ids[:1], 0)
+        await count_statements(ids, 0)
+        assert await count_statements(ids[:1], 10) == await count_statements(ids, 20)
+
+    @pytest.mark.asyncio
+    async def test_batch_validation_is_all_or_nothing(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        url = f"/books/{test_book.id}/snapshots/batch"
+
+        resp = await client.post(url, json={"items": [
+            {"account_id": cash_id, "external_balance": 100},
+            {"account_id": "nonexistent", "external_balance": 100},
+        ]}, headers=auth_headers)
+        assert resp.status_code == 404
+        assert "nonexistent" in resp.json()["detail"]
+
+        resp = await client.post(url, json={"items": [
+            {"account_id": cash_id, "external_balance": 100},
+            {"account_id": cash_id, "external_balance": 200},
+        ]}, headers=auth_headers)
+        assert resp.status_code == 400
+
+        assert (await client.post(url, json={"items": []}, headers=auth_headers)).status_code == 422
+        count = await client.get(f"/books/{test_book.id}/pending-count", headers=auth_headers)
+        assert count.json()["count"] == 0
+
+
 class TestPendingReconciliations:
 
     @pytest.mark.asyncio
@@ -137,6 +320,72 @@ class TestPendingReconciliations:
         )
         assert resp.json()["count"] >= 1
 
+    @pytest.mark.asyncio
+    async def test_pending_cursor_pagination(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """limit + cursor 翻页，结果与一次取全部相同"""
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        entry_ids = await _make_pending(client, test_book.id, cash_id, auth_headers, 5)
+        url = f"/books/{test_book.id}/pending-reconciliations"
+
+        full = (await client.get(url, headers=auth_headers)).json()
+        assert [i["entry_id"] for i in full] == entry_ids[::-1]
+        assert all(len(i["lines"]) == 2 and i["snapshot"] for i in full)
+        assert full[0]["snapshot"]["difference"] == pytest.approx(100)
+
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            resp = await client.get(url, params=params, headers=auth_headers)
+            assert resp.status_code == 200
+            pages.append(resp.json())
+            cursor = resp.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        assert [len(p) for p in pages] == [2, 2, 1]
+        assert [i for p in pages for i in p] == full
+
+    @pytest.mark.asyncio
+    async def test_pending_single_query(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """队列由一条连接查询取回，不随条目数增加查询"""
+        from sqlalchemy import event
+        from tests.conftest import test_engine
+
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        await _make_pending(client, test_book.id, cash_id, auth_headers, 4)
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            resp = await client.get(
+                f"/books/{test_book.id}/pending-reconciliations",
+                params={"limit": 3},
+                headers=auth_headers,
+            )
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+        assert len(resp.json()) == 3
+        assert len([s for s in statements if "balance_snapshots" in s]) == 1
+        assert len([s for s in statements if "journal_lines" in s]) == 1
+
+    @pytest.mark.asyncio
+    async def test_pending_invalid_cursor(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        resp = await client.get(
+            f"/books/{test_book.id}/pending-reconciliations",
+            params={"limit": 2, "cursor": "garbage"},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+
 
 class TestConfirmReconciliation:
 
@@ -232,3 +481,116 @@ class TestSplitReconciliation:
         data = resp.json()
         assert data["reconciliation_status"] == "confirmed"
         assert data["splits_count"] == 2
+
+
+class TestBulkReconciliation:
+
+    @pytest.mark.asyncio
+    async def test_bulk_confirm(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """一次确认多条，队列清空、快照标记已调节、汇总与重建一致"""
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        income_id = await _get_account_id(client, test_book.id, "4005", auth_headers)
+        salary_id = await _get_account_id(client, test_book.id, "4001", auth_headers)
+        entry_ids = await _make_pending(client, test_book.id, cash_id, auth_headers, 3)
+
+        resp = await client.post(
+            f"/books/{test_book.id}/reconciliations/confirm",
+            json={"items": [
+                {"entry_id": entry_ids[0], "target_account_id": income_id},
+                {"entry_id": entry_ids[1], "target_account_id": salary_id},
+                {"entry_id": entry_ids[2], "target_account_id": income_id},
+            ]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["confirmed"] == 3
+        assert {i["target_account_id"] for i in data["items"]} == {income_id, salary_id}
+
+        count = await client.get(f"/books/{test_book.id}/pending-count", headers=auth_headers)
+        assert count.json()["count"] == 0
+
+        detail = (await client.get(f"/entries/{entry_ids[1]}", headers=auth_headers)).json()
+        assert salary_id in {l["account_id"] for l in detail["lines"]}
+        await _assert_rollup_consistent(test_book.id)
+
+    @pytest.mark.asyncio
+    async def test_bulk_split(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        income_id = await _get_account_id(client, test_book.id, "4005", auth_headers)
+        salary_id = await _get_account_id(client, test_book.id, "4001", auth_headers)
+        entry_ids = await _make_pending(client, test_book.id, cash_id, auth_headers, 2)
+
+        resp = await client.post(
+            f"/books/{test_book.id}/reconciliations/split",
+            json={"items": [
+                {"entry_id": entry_ids[0], "splits": [
+                    {"account_id": income_id, "amount": 40},
+                    {"account_id": salary_id, "amount": 60},
+                ]},
+                {"entry_id": entry_ids[1], "splits": [
+                    {"account_id": salary_id, "amount": 100},
+                ]},
+            ]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        assert [i["splits_count"] for i in resp.json()["items"]] == [2, 1]
+
+        detail = (await client.get(f"/entries/{entry_ids[0]}", headers=auth_headers)).json()
+        assert len(detail["lines"]) == 3
+        await _assert_rollup_consistent(test_book.id)
+
+    @pytest.mark.asyncio
+    async def test_bulk_is_all_or_nothing(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        """任一条目失败时整批回滚"""
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        income_id = await _get_account_id(client, test_book.id, "4005", auth_headers)
+        entry_ids = await _make_pending(client, test_book.id, cash_id, auth_headers, 2)
+        before = await _rollup_rows(test_book.id)
+
+        resp = await client.post(
+            f"/books/{test_book.id}/reconciliations/split",
+            json={"items": [
+                {"entry_id": entry_ids[0], "splits": [{"account_id": income_id, "amount": 100}]},
+                {"entry_id": entry_ids[1], "splits": [{"account_id": income_id, "amount": 99}]},
+            ]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 400
+        assert entry_ids[1] in resp.json()["detail"]
+
+        resp = await client.post(
+            f"/books/{test_book.id}/reconciliations/confirm",
+            json={"items": [
+                {"entry_id": entry_ids[0], "target_account_id": income_id},
+                {"entry_id": "nonexistent", "target_account_id": income_id},
+            ]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 404
+
+        count = await client.get(f"/books/{test_book.id}/pending-count", headers=auth_headers)
+        assert count.json()["count"] == 2
+        assert await _rollup_rows(test_book.id) == before
+
+    @pytest.mark.asyncio
+    async def test_bulk_rejects_processed_and_duplicate(
+        self, client: AsyncClient, auth_headers, test_book: Book
+    ):
+        cash_id = await _get_account_id(client, test_book.id, "1001-01", auth_headers)
+        income_id = await _get_account_id(client, test_book.id, "4005", auth_headers)
+        entry_ids = await _make_pending(client, test_book.id, cash_id, auth_headers, 1)
+        url = f"/books/{test_book.id}/reconciliations/confirm"
+        item = {"entry_id": entry_ids[0], "target_account_id": income_id}
+
+        resp = await client.post(url, json={"items": [item, item]}, headers=auth_headers)
+        assert resp.status_code == 400
+        assert (await client.post(url, json={"items": [item]}, headers=auth_headers)).status_code == 200
+        assert (await client.post(url, json={"items": [item]}, headers=auth_headers)).status_code == 400